@@ -12,5 +12,7 @@ CLICKHOUSE_SECURE = os.getenv("CLICKHOUSE_SECURE", "true").lower() in ("1", "tru
 ADMIN_API_KEY = os.getenv("ADMIN_API_KEY", "admin-key")
 CREDITS_PER_100_RECORDS = int(os.getenv("CREDITS_PER_100_RECORDS", "1"))
 MAX_LIMIT = int(os.getenv("MAX_LIMIT", "1000"))
+# "binary" once master_records holds FixedString(16) keys (loader --migrate-binary-keys)
+CANONICAL_KEY_FORMAT = os.getenv("CANONICAL_KEY_FORMAT", "hex").lower()
 
 print(CLICKHOUSE_USER)
\ No newline at end of file
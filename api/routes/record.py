@@ -3,13 +3,18 @@ from api.deps.auth import get_current_user
 from api.deps.clickhouse import get_clickhouse_client
 from api.db.postgres import AsyncSessionLocal
 from api.services.credit_service import deduct_credits, log_usage
-from api.services.clickhouse_service import estimate_credits_for_limit
+from api.services.clickhouse_service import estimate_credits_for_limit, hex_binary_values, key_condition
 import time
 
 router = APIRouter()
 
 @router.get("/record/{canonical_key}")
 async def get_record(canonical_key: str, current_user = Depends(get_current_user)):
+    condition = key_condition(canonical_key)
+    if condition is None:
+        raise HTTPException(status_code=400, detail="Invalid canonical_key")
+    where, key_param = condition
+
     # single record fetch costs at least 1 credit
     credits_needed = estimate_credits_for_limit(1)
 
@@ -21,8 +26,8 @@ async def get_record(canonical_key: str, current_user = Depends(get_current_user
 
         start = time.time()
         client = get_clickhouse_client()
-        sql = "SELECT * FROM master_records WHERE canonical_key = %s LIMIT 1"
-        query_result = client.query(sql, parameters=[canonical_key])
+        sql = f"SELECT * FROM master_records WHERE {where} LIMIT 1"
+        query_result = client.query(sql, parameters=[key_param])
         result = query_result.result_rows
         columns = query_result.column_names
         duration_ms = int((time.time() - start) * 1000)
@@ -38,5 +43,5 @@ async def get_record(canonical_key: str, current_user = Depends(get_current_user
     if not result:
         raise HTTPException(status_code=404, detail="Not found")
     # column mapping
-    row = dict(zip(columns, result[0]))
+    row = hex_binary_values(dict(zip(columns, result[0])))
     return {"data": row, "metadata": {"credits_used": credits_needed, "response_time_ms": duration_ms}}
@@ -1,6 +1,8 @@
 import time
 from api.deps.clickhouse import get_clickhouse_client
-from api.config import MAX_LIMIT, CREDITS_PER_100_RECORDS
+from api.config import MAX_LIMIT, CREDITS_PER_100_RECORDS, CANONICAL_KEY_FORMAT
+from api.utils import keys
+from api.utils.keys import hex_binary_values
 
 client = get_clickhouse_client()
 
@@ -15,7 +17,11 @@ def count_query(sql: str, params=None):
 def execute_query(sql: str, params=None):
     result = client.query(sql, parameters=params)
     columns = result.column_names
-    return [dict(zip(columns, row)) for row in result.result_rows]
+    return [hex_binary_values(dict(zip(columns, row))) for row in result.result_rows]
+
+def key_condition(canonical_key: str):
+    """WHERE condition and parameter for a canonical_key from a URL, or None if it is no key."""
+    return keys.key_condition(canonical_key, CANONICAL_KEY_FORMAT)
 
 def build_filter_clause(filters: dict):
     # Very small helper to build WHERE clauses; avoid SQL injection by using parameters
@@ -0,0 +1,19 @@
+import re
+
+# 32 hex chars for a binary key; 64 for a hex SHA-256 key from before the migration
+HEX_KEY_RE = re.compile(r"[0-9a-fA-F]{32}(?:[0-9a-fA-F]{32})?")
+
+
+def hex_binary_values(row: dict) -> dict:
+    # Binary keys (FixedString(16)) leave the API as hex, like the original keys
+    return {k: v.hex() if isinstance(v, (bytes, bytearray)) else v for k, v in row.items()}
+
+
+def key_condition(canonical_key: str, key_format: str = "hex"):
+    """WHERE condition and parameter looking up a canonical_key given as text, or None if it is no key."""
+    if key_format != "binary":
+        return "canonical_key = %s", canonical_key
+    if not HEX_KEY_RE.fullmatch(canonical_key):
+        return None
+    # sha256-128 keys are the first half of the hex SHA-256 keys, so old links keep working
+    return "canonical_key = unhex(%s)", canonical_key[:32].lower()
@@ -0,0 +1,127 @@
+"""
+Benchmark: shuffle and storage cost of each canonical_key format.
+
+For every format in KEY_FORMATS, keys synthetic records (name/email/phone/dob,
+with a share of duplicates) and measures:
+- key: the time to compute the keys (noop write),
+- shuffle: the bytes dropDuplicates writes to the shuffle, from the stage
+  metrics of Spark's REST API,
+- parquet: the compressed size of the canonical_key column in Parquet,
+- index: ClickHouse's primary index, one key per 8192-row granule
+  (String: the hex key plus its length byte; FixedString(16): 16 bytes).
+
+Usage (from src/benchmarks/):
+    python bench_binary_keys.py --rows 5000000
+"""
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import tempfile
+import urllib.request
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "ingestion"))
+
+import pyarrow.parquet as pq
+from pyspark.sql import SparkSession
+from pyspark.sql import functions as F
+
+from key_strategies import KEY_BYTES, KEY_COLUMN, KEY_FORMATS, is_binary_format, key_column
+
+INDEX_GRANULARITY = 8192
+
+
+def synthetic_records(spark, rows: int, duplicate_share: float):
+    """rows identity records, of which about duplicate_share repeat an earlier one."""
+    distinct = max(1, int(rows * (1 - duplicate_share)))
+    n = F.col("id") % distinct
+    return spark.range(rows).select(
+        F.concat(F.lit("Person "), n.cast("string")).alias("name"),
+        F.concat(F.lit("user"), n.cast("string"), F.lit("@example.com")).alias("email"),
+        F.concat(F.lit("+1999"), F.lpad(n.cast("string"), 7, "0")).alias("phone"),
+        F.date_add(F.lit("1950-01-01").cast("date"), (n % 20000).cast("int")).cast("string").alias("dob"),
+    )
+
+
+def shuffle_write_bytes(spark) -> int:
+    """Shuffle bytes written by all completed stages so far."""
+    sc = spark.sparkContext
+    url = f"{sc.uiWebUrl}/api/v1/applications/{sc.applicationId}/stages?status=complete"
+    with urllib.request.urlopen(url) as response:
+        return sum(stage.get("shuffleWriteBytes", 0) for stage in json.load(response))
+
+
+def parquet_column_bytes(path: str, column: str) -> int:
+    """Compressed bytes of one column over every file of a Parquet directory."""
+    total = 0
+    for name in os.listdir(path):
+        if not name.endswith(".parquet"):
+            continue
+        metadata = pq.ParquetFile(os.path.join(path, name)).metadata
+        for i in range(metadata.num_row_groups):
+            row_group = metadata.row_group(i)
+            for j in range(row_group.num_columns):
+                if row_group.column(j).path_in_schema == column:
+                    total += row_group.column(j).total_compressed_size
+    return total
+
+
+def index_bytes(rows: int, key_format: str) -> int:
+    granules = -(-rows // INDEX_GRANULARITY)
+    return granules * (KEY_BYTES if is_binary_format(key_format) else 64 + 1)
+
+
+def measure(spark, records, key_format: str, rows: int, directory: str):
+    keyed = records.withColumn(KEY_COLUMN, key_column(records, {"key_format": key_format}))
+
+    started = time.perf_counter()
+    keyed.write.format("noop").mode("overwrite").save()
+    key_seconds = time.perf_counter() - started
+
+    before = shuffle_write_bytes(spark)
+    keyed.dropDuplicates([KEY_COLUMN]).write.format("noop").mode("overwrite").save()
+    # The REST API lags the job by a moment
+    time.sleep(1)
+    shuffle = shuffle_write_bytes(spark) - before
+
+    path = os.path.join(directory, key_format)
+    keyed.select(KEY_COLUMN).write.mode("overwrite").option("compression", "zstd").parquet(path)
+    return {"key": key_seconds, "shuffle": shuffle, "parquet": parquet_column_bytes(path, KEY_COLUMN),
+            "index": index_bytes(rows, key_format)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=5000000)
+    parser.add_argument("--duplicates", type=float, default=0.2, help="Share of rows repeating another")
+    parser.add_argument("--cores", type=int, default=4)
+    args = parser.parse_args()
+
+    spark = SparkSession.builder.appName("BenchBinaryKeys").master(f"local[{args.cores}]") \
+        .config("spark.sql.shuffle.partitions", str(args.cores)) \
+        .config("spark.sql.adaptive.enabled", "false").getOrCreate()
+    spark.sparkContext.setLogLevel("ERROR")
+    records = synthetic_records(spark, args.rows, args.duplicates).repartition(args.cores).cache()
+    records.count()
+
+    directory = tempfile.mkdtemp(prefix="bench_binary_keys_")
+    try:
+        results = {fmt: measure(spark, records, fmt, args.rows, directory) for fmt in KEY_FORMATS}
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+        spark.stop()
+
+    baseline = results["hex"]
+    mb = 1024 * 1024
+    print(f"{'format':>11} {'key s':>7} {'shuffle MB':>11} {'parquet MB':>11} {'index KB':>9} "
+          f"{'shuffle saved':>14} {'parquet saved':>14}")
+    for fmt, r in results.items():
+        print(f"{fmt:>11} {r['key']:>7.2f} {r['shuffle'] / mb:>11.1f} {r['parquet'] / mb:>11.1f} "
+              f"{r['index'] / 1024:>9.1f} {1 - r['shuffle'] / baseline['shuffle']:>13.0%} "
+              f"{1 - r['parquet'] / baseline['parquet']:>13.0%}")
+
+
+if __name__ == "__main__":
+    main()
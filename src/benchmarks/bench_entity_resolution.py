@@ -0,0 +1,79 @@
+"""
+Benchmark: entity resolution throughput against input size.
+
+Generates synthetic people where a share of records are near-duplicates of
+another (typo in the name, reformatted phone, plus-tagged email) and times
+resolve_entities end to end. Reports records/s, linked pairs and recall of
+the planted duplicates.
+
+Usage (from src/benchmarks/):
+    python bench_entity_resolution.py --rows 10000 100000 1000000
+"""
+import os
+import sys
+import time
+import argparse
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "ingestion"))
+
+from pyspark.sql import SparkSession
+from pyspark.sql import functions as F
+
+from entity_resolution import ENTITY_COLUMN, resolve_entities
+
+
+def synthetic_people(spark, rows: int, duplicate_share: float):
+    """rows people; every record with id % (1 / duplicate_share) == 1 copies the record before it."""
+    every = max(2, int(round(1 / duplicate_share)))
+    base = spark.range(rows).withColumn("person", F.when(F.col("id") % every == 1, F.col("id") - 1)
+                                        .otherwise(F.col("id")))
+    is_copy = F.col("id") != F.col("person")
+    first = F.concat(F.lit("name"), F.col("person").cast("string"))
+    return base.select(
+        F.sha2(F.col("id").cast("string"), 256).alias("canonical_key"),
+        F.col("person"),
+        # Copies drop the last letter of the first name
+        F.when(is_copy, F.expr("substring(concat('name', cast(person as string)), 1, "
+                                "length(concat('name', cast(person as string))) - 1)"))
+        .otherwise(first).alias("first_name"),
+        F.lit("smith").alias("last_name"),
+        F.when(is_copy, F.concat(F.lit("+1 "), F.lpad(F.col("person").cast("string"), 10, "5")))
+        .otherwise(F.lpad(F.col("person").cast("string"), 10, "5")).alias("phone"),
+        F.when(is_copy, F.concat(first, F.lit("+news@example.com")))
+        .otherwise(F.concat(first, F.lit("@example.com"))).alias("email"),
+        F.lit("1990-01-01").alias("dob"),
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, nargs="+", default=[10000, 100000])
+    parser.add_argument("--duplicate-share", type=float, default=0.2)
+    parser.add_argument("--threshold", type=float, default=0.7)
+    args = parser.parse_args()
+
+    spark = SparkSession.builder.appName("BenchEntityResolution").master("local[*]").getOrCreate()
+    spark.sparkContext.setLogLevel("ERROR")
+
+    print(f"{'rows':>10} {'seconds':>9} {'rows/s':>10} {'pairs':>8} {'recall':>7}")
+    for rows in args.rows:
+        df = synthetic_people(spark, rows, args.duplicate_share).cache()
+        df.count()
+        started = time.perf_counter()
+        resolved, stats = resolve_entities(df, threshold=args.threshold)
+        # Records of one planted person should share an entity_id
+        groups = resolved.groupBy("person").agg(F.countDistinct(ENTITY_COLUMN).alias("entities"),
+                                                F.count("*").alias("records"))
+        planted = groups.where(F.col("records") > 1)
+        found = planted.where(F.col("entities") == 1).count()
+        total = planted.count()
+        seconds = time.perf_counter() - started
+        recall = found / total if total else 1.0
+        print(f"{rows:>10} {seconds:>9.2f} {rows / seconds:>10.0f} {stats['matched_pairs']:>8} {recall:>7.1%}")
+        df.unpersist()
+
+    spark.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,118 @@
+"""
+Benchmark: identifier normalization throughput in rows/s per core.
+
+Compares normalize_identifiers (native Spark expressions) with the same
+phone/email normalization as a row-at-a-time Python UDF, on synthetic
+records in mixed formats. Each run forces the projection with a noop write,
+so only generation and normalization are timed.
+
+Usage (from src/benchmarks/):
+    python bench_identifiers.py --rows 1000000 --cores 1 4
+"""
+import os
+import re
+import sys
+import time
+import argparse
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "ingestion"))
+
+from pyspark.sql import SparkSession
+from pyspark.sql import functions as F
+from pyspark.sql.types import StringType
+
+from identifiers import normalize_identifiers
+
+PHONE_FORMATS = ["+1 (999) {a}-{b}", "999{a}{b}", "1-999-{a}-{b}", "(999) {a} {b} x12"]
+EMAIL_FORMATS = ["User{n}@Example.com", "user{n}+promo@example.com", " USER{n}@EXAMPLE.COM "]
+DOB_FORMATS = ["1990-03-{d:02d}", "03/{d}/1990", "{d}.03.1990", "Mar {d}, 1990", "199003{d:02d}"]
+
+
+def synthetic_identifiers(spark, rows: int):
+    """rows records cycling through the formats above."""
+    n = F.col("id")
+    a = F.lpad((n % 1000).cast("string"), 3, "0")
+    b = F.lpad((n % 10000).cast("string"), 4, "0")
+    day = (n % 28 + 1).cast("string")
+
+    def pick(formats, render):
+        return F.element_at(F.array(*[render(f) for f in formats]), (n % len(formats) + 1).cast("int"))
+
+    def phone(fmt):
+        head, _, rest = fmt.partition("{a}")
+        middle, _, tail = rest.partition("{b}")
+        return F.concat(F.lit(head), a, F.lit(middle), b, F.lit(tail))
+
+    def email(fmt):
+        head, _, tail = fmt.partition("{n}")
+        return F.concat(F.lit(head), n.cast("string"), F.lit(tail))
+
+    def dob(fmt):
+        padded = "{d:02d}" in fmt
+        head, _, tail = fmt.replace("{d:02d}", "{d}").partition("{d}")
+        return F.concat(F.lit(head), F.lpad(day, 2, "0") if padded else day, F.lit(tail))
+
+    return spark.range(rows).select(
+        pick(PHONE_FORMATS, phone).alias("phone"),
+        pick(EMAIL_FORMATS, email).alias("email"),
+        pick(DOB_FORMATS, dob).alias("dob"),
+    )
+
+
+def _python_phone(value):
+    if value is None:
+        return None
+    value = re.sub(r"(?i)\s*(?:ext\.?|extension|x|#)\s*\d+\s*$", "", value.strip().lower())
+    digits = re.sub(r"\D", "", value)
+    if value.startswith("+"):
+        return "+" + digits
+    if len(digits) == 10:
+        return "+1" + digits
+    if len(digits) == 11 and digits.startswith("1"):
+        return "+" + digits
+    return value
+
+
+def _python_email(value):
+    if value is None:
+        return None
+    return re.sub(r"\+[^@]*@", "@", value.strip().lower())
+
+
+def python_udf_normalize(df):
+    """The row-at-a-time baseline: every value crosses into a Python worker and back."""
+    phone = F.udf(_python_phone, StringType())
+    email = F.udf(_python_email, StringType())
+    return df.select(phone("phone").alias("phone"), email("email").alias("email"), F.col("dob"))
+
+
+def time_run(df) -> float:
+    started = time.perf_counter()
+    df.write.format("noop").mode("overwrite").save()
+    return time.perf_counter() - started
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=1000000)
+    parser.add_argument("--cores", type=int, nargs="+", default=[1, 4])
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    print(f"{'cores':>6} {'native rows/s/core':>19} {'python udf rows/s/core':>23} {'speedup':>8}")
+    for cores in args.cores:
+        spark = SparkSession.builder.appName("BenchIdentifiers").master(f"local[{cores}]") \
+            .config("spark.sql.shuffle.partitions", str(cores)).getOrCreate()
+        spark.sparkContext.setLogLevel("ERROR")
+        df = synthetic_identifiers(spark, args.rows).repartition(cores).cache()
+        df.count()
+
+        native = min(time_run(normalize_identifiers(df)) for _ in range(args.repeat))
+        python = min(time_run(python_udf_normalize(df)) for _ in range(args.repeat))
+        print(f"{cores:>6} {args.rows / native / cores:>19,.0f} {args.rows / python / cores:>23,.0f} "
+              f"{python / native:>7.1f}x")
+        spark.stop()
+
+
+if __name__ == "__main__":
+    main()
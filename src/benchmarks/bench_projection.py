@@ -0,0 +1,76 @@
+"""
+Benchmark: planning time of read_file's cleaning step against column count.
+
+Compares the old chained-withColumn approach with the single-select projection
+builder. Only planning is measured (building the DataFrame plus producing the
+executed plan); no data is processed.
+
+Usage (from src/benchmarks/):
+    python bench_projection.py --columns 10 50 100 200 400
+"""
+import os
+import sys
+import time
+import argparse
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "ingestion"))
+
+from pyspark.sql import SparkSession
+from pyspark.sql.functions import col, isnan, lit, when
+from pyspark.sql.types import DoubleType, FloatType
+
+from projection import apply_cleaning_projection
+
+
+def legacy_cleaning(df):
+    """The per-column withColumn loop that read_file used to run."""
+    for col_name in df.columns:
+        df = df.withColumn(col_name, when(col(col_name).isNull(), lit("")).otherwise(col(col_name)))
+        field = next((f for f in df.schema.fields if f.name == col_name), None)
+        if field and isinstance(field.dataType, (DoubleType, FloatType)):
+            df = df.withColumn(col_name, when(isnan(col(col_name)), lit("")).otherwise(col(col_name)))
+    return df
+
+
+def wide_frame(spark, columns: int):
+    """A small frame with a mix of string, long and double columns."""
+    exprs = []
+    for i in range(columns):
+        kind = i % 3
+        if kind == 0:
+            exprs.append(col("id").cast("string").alias(f"s_{i}"))
+        elif kind == 1:
+            exprs.append(col("id").alias(f"l_{i}"))
+        else:
+            exprs.append((col("id") / 3).cast("double").alias(f"d_{i}"))
+    return spark.range(100).select(*exprs)
+
+
+def time_planning(build, df) -> float:
+    started = time.perf_counter()
+    result = build(df)
+    result._jdf.queryExecution().executedPlan()
+    return time.perf_counter() - started
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--columns", type=int, nargs="+", default=[10, 50, 100, 200, 400])
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    spark = SparkSession.builder.appName("BenchProjection").master("local[2]").getOrCreate()
+    spark.sparkContext.setLogLevel("ERROR")
+
+    print(f"{'columns':>8} {'withColumn s':>14} {'select s':>10} {'speedup':>8}")
+    for columns in args.columns:
+        df = wide_frame(spark, columns)
+        legacy = min(time_planning(legacy_cleaning, df) for _ in range(args.repeat))
+        single = min(time_planning(apply_cleaning_projection, df) for _ in range(args.repeat))
+        print(f"{columns:>8} {legacy:>14.3f} {single:>10.3f} {legacy / single:>7.1f}x")
+
+    spark.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,86 @@
+"""
+Benchmark: SQL dump parsing throughput in MB/s on one core.
+
+Writes a synthetic mysqldump-style file (extended INSERTs of --rows-per-insert
+rows with ints, NULLs, dates and quoted text holding escapes and separators)
+and times, on a single process:
+- rows: iter_dump_rows, the tokenizer yielding Python values per row,
+- batches: iter_dump_batches, the Arrow batches written to Parquet,
+- parquet: dump_to_parquet end to end with workers=1.
+
+Usage (from src/benchmarks/):
+    python bench_sql_dump.py --mb 100 --rows-per-insert 1000
+"""
+import os
+import sys
+import time
+import shutil
+import argparse
+import tempfile
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "ingestion"))
+
+from sql_dump import dump_to_parquet, iter_dump_batches, iter_dump_rows, iter_text_chunks
+
+NOTES = ["plain note", "it\\'s quoted", "comma, and ),( inside", "line\\nbreak", "semi;colon", "o''clock"]
+
+
+def write_dump(path: str, megabytes: int, rows_per_insert: int):
+    """A dump of about megabytes MB: a CREATE TABLE, then INSERTs of rows_per_insert rows."""
+    target = megabytes * 1024 * 1024
+    n = 0
+    with open(path, "w", encoding="utf-8") as f:
+        f.write("CREATE TABLE `users` (\n  `id` int NOT NULL,\n  `name` varchar(64),\n  `email` varchar(64),\n"
+                "  `age` int,\n  `created` datetime,\n  `score` decimal(8,2),\n  `note` text,\n"
+                "  PRIMARY KEY (`id`)\n);\n")
+        while f.tell() < target:
+            rows = []
+            for _ in range(rows_per_insert):
+                n += 1
+                age = "NULL" if n % 7 == 0 else str(18 + n % 60)
+                rows.append(f"({n},'User {n}','user{n}@example.com',{age},'2024-01-{n % 28 + 1:02d} 10:00:00',"
+                            f"{n % 1000}.{n % 100:02d},'{NOTES[n % len(NOTES)]}')")
+            f.write("INSERT INTO `users` VALUES " + ",".join(rows) + ";\n")
+
+
+def timed(run) -> float:
+    started = time.perf_counter()
+    run()
+    return time.perf_counter() - started
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--mb", type=int, default=100)
+    parser.add_argument("--rows-per-insert", type=int, default=1000)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="bench_sql_dump_")
+    try:
+        path = os.path.join(workdir, "dump.sql")
+        write_dump(path, args.mb, args.rows_per_insert)
+        size_mb = os.path.getsize(path) / 1024 / 1024
+        output_dir = os.path.join(workdir, "parquet")
+
+        def parquet():
+            shutil.rmtree(output_dir, ignore_errors=True)
+            os.makedirs(output_dir)
+            dump_to_parquet(path, output_dir, workers=1)
+
+        runs = {
+            "rows": lambda: sum(1 for _ in iter_dump_rows(iter_text_chunks(path))),
+            "batches": lambda: sum(batch.num_rows for batch in iter_dump_batches(path)),
+            "parquet": parquet,
+        }
+        print(f"{size_mb:.0f} MB dump, {args.rows_per_insert} rows per INSERT")
+        print(f"{'stage':>8} {'seconds':>8} {'MB/s':>7}")
+        for name, run in runs.items():
+            seconds = min(timed(run) for _ in range(args.repeat))
+            print(f"{name:>8} {seconds:>8.2f} {size_mb / seconds:>7.1f}")
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,118 @@
+"""
+Columnar hand-off from driver-side parsers to Spark.
+
+The XML, Excel and SQL parsers produce Arrow RecordBatches with an explicit
+schema instead of lists of dicts. ArrowSpillWriter buffers those batches and,
+whenever the buffered size passes a memory threshold, spills them to a
+Parquet part file that Spark then reads directly. Driver memory is bounded by
+the threshold rather than by the size of the input.
+
+Batches with different columns (e.g. XML records with optional elements, or
+several tables in one SQL dump) are padded to a common schema per part file;
+Spark reconciles part files with mergeSchema.
+"""
+import json
+import os
+from typing import Dict, Iterable, List, Optional
+
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+DEFAULT_BATCH_ROWS = 10000
+# Buffered Arrow bytes that trigger a spill to a part file
+DEFAULT_SPILL_BYTES = 64 * 1024 * 1024
+
+
+def _cell_text(value) -> Optional[str]:
+    if value is None or isinstance(value, str):
+        return value
+    if isinstance(value, (list, dict)):
+        return json.dumps(value, default=str)
+    return str(value)
+
+
+def records_to_batch(records: List[Dict]) -> pa.RecordBatch:
+    """Transpose dict records into a string RecordBatch; columns in first-seen order."""
+    names = list(dict.fromkeys(key for record in records for key in record))
+    arrays = [pa.array([_cell_text(record.get(name)) for record in records], type=pa.string())
+              for name in names]
+    return pa.RecordBatch.from_arrays(arrays, schema=pa.schema([pa.field(name, pa.string()) for name in names]))
+
+
+def _conform(batch: pa.RecordBatch, schema: pa.Schema) -> pa.RecordBatch:
+    """Reorder a batch to schema, filling columns it lacks with nulls."""
+    if batch.schema.equals(schema):
+        return batch
+    arrays = [batch.column(field.name) if field.name in batch.schema.names else pa.nulls(batch.num_rows, field.type)
+              for field in schema]
+    return pa.RecordBatch.from_arrays(arrays, schema=schema)
+
+
+class ArrowSpillWriter:
+    """
+    Buffer RecordBatches and spill them to Parquet part files in output_dir.
+
+    Use as a context manager (or call close()); files lists the part files
+    written. Part files are named <prefix>-NNNNN.parquet so several writers
+    can share one directory.
+    """
+
+    def __init__(self, output_dir: str, prefix: str = "part", batch_rows: int = DEFAULT_BATCH_ROWS,
+                 spill_bytes: int = DEFAULT_SPILL_BYTES):
+        self.output_dir = output_dir
+        self.prefix = prefix
+        self.batch_rows = batch_rows
+        self.spill_bytes = spill_bytes
+        self.rows = 0
+        self.files: List[str] = []
+        self._buffered: List[pa.RecordBatch] = []
+        self._buffered_bytes = 0
+
+    def write_batch(self, batch: pa.RecordBatch):
+        if batch.num_rows == 0:
+            return
+        self._buffered.append(batch)
+        self._buffered_bytes += batch.nbytes
+        self.rows += batch.num_rows
+        if self._buffered_bytes >= self.spill_bytes:
+            self.flush()
+
+    def write_records(self, records: Iterable[Dict]):
+        """Convert dict records to batches of batch_rows and buffer them."""
+        pending: List[Dict] = []
+        for record in records:
+            pending.append(record)
+            if len(pending) >= self.batch_rows:
+                self.write_batch(records_to_batch(pending))
+                pending = []
+        if pending:
+            self.write_batch(records_to_batch(pending))
+
+    def flush(self):
+        """Spill buffered batches to a new part file."""
+        if not self._buffered:
+            return
+        fields = {}
+        for batch in self._buffered:
+            for field in batch.schema:
+                fields.setdefault(field.name, field)
+        schema = pa.schema(list(fields.values()))
+
+        path = os.path.join(self.output_dir, f"{self.prefix}-{len(self.files):05d}.parquet")
+        with pq.ParquetWriter(path, schema) as writer:
+            for batch in self._buffered:
+                writer.write_batch(_conform(batch, schema))
+        self.files.append(path)
+        self._buffered = []
+        self._buffered_bytes = 0
+
+    def close(self) -> List[str]:
+        self.flush()
+        return self.files
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.close()
@@ -0,0 +1,149 @@
+"""
+Compressed raw inputs: gzip, bzip2, zstd and xz.
+
+Driver-side parsers read compressed files through open_compressed, a
+streaming decompressor, so nothing is decompressed to disk first. Spark
+reads .gz and .bz2 files itself, but a gzip file cannot be split: one large
+.gz would become a single task. rechunk_text streams such files (and zstd/xz
+files, which Spark cannot read out of the box) into plain part files cut at
+line boundaries, each of which Spark splits and reads in parallel. Only
+content with one record per line (CSV without multi-line fields, JSON Lines)
+is cut; anything else, such as a JSON array, is decompressed into one part.
+
+zstd support needs the optional zstandard package.
+"""
+import io
+import os
+import json
+import bz2
+import gzip
+import lzma
+import shutil
+from typing import BinaryIO, List, Optional
+
+try:
+    import zstandard
+except ImportError:  # optional, see module docstring
+    zstandard = None
+
+COMPRESSION_EXTENSIONS = {
+    ".gz": "gzip",
+    ".gzip": "gzip",
+    ".bz2": "bz2",
+    ".zst": "zstd",
+    ".zstd": "zstd",
+    ".xz": "xz",
+}
+# Extensions Spark's text sources decompress on their own (Hadoop's codecs know
+# .gz, not .gzip or .GZ, so those would be read as compressed bytes)
+SPARK_CODEC_EXTENSIONS = {".gz": "gzip", ".bz2": "bz2"}
+# Codecs whose files Spark can split across tasks
+SPLITTABLE_CODECS = {"bz2"}
+# gzip files at least this big are re-chunked instead of read as one task
+GZIP_RECHUNK_BYTES = 128 * 1024 * 1024
+# Uncompressed size of each re-chunked part file
+DEFAULT_CHUNK_BYTES = 128 * 1024 * 1024
+COPY_BLOCK_BYTES = 4 * 1024 * 1024
+# First line read to tell JSON Lines from other JSON
+JSON_LINE_PROBE_BYTES = 1024 * 1024
+
+
+def split_compression_extension(path: str):
+    """'data.csv.gz' -> ('data.csv', 'gzip'); ('data.csv', None) when not compressed."""
+    root, ext = os.path.splitext(path)
+    compression = COMPRESSION_EXTENSIONS.get(ext.lower())
+    return (root, compression) if compression else (path, None)
+
+
+def open_compressed(file_path: str, compression: Optional[str]) -> BinaryIO:
+    """Open a file for binary reading, decompressing on the fly."""
+    if compression is None:
+        return open(file_path, "rb")
+    if compression == "gzip":
+        return gzip.open(file_path, "rb")
+    if compression == "bz2":
+        return bz2.open(file_path, "rb")
+    if compression == "xz":
+        return lzma.open(file_path, "rb")
+    if compression == "zstd":
+        if zstandard is None:
+            raise ImportError("reading .zst files needs the zstandard package")
+        reader = zstandard.ZstdDecompressor().stream_reader(open(file_path, "rb"), read_across_frames=True,
+                                                            closefd=True)
+        return io.BufferedReader(reader)
+    raise ValueError(f"Unsupported compression: {compression}")
+
+
+def decompress_to(file_path: str, compression: str, target_path: str) -> str:
+    """Stream-decompress a whole file to target_path (for readers that need a real file)."""
+    with open_compressed(file_path, compression) as src, open(target_path, "wb") as out:
+        shutil.copyfileobj(src, out, COPY_BLOCK_BYTES)
+    return target_path
+
+
+def spark_reads_directly(file_path: str, compression: Optional[str], size: int) -> bool:
+    """Whether Spark should read this (possibly compressed) text file as-is."""
+    if compression is None:
+        return True
+    # Spark picks the codec from the extension, so it has to match the content
+    if SPARK_CODEC_EXTENSIONS.get(os.path.splitext(file_path)[1]) != compression:
+        return False
+    return compression in SPLITTABLE_CODECS or size < GZIP_RECHUNK_BYTES
+
+
+def is_json_lines(file_path: str, compression: Optional[str]) -> bool:
+    """Whether a JSON file holds one object per line (JSON Lines), so it can be cut between lines."""
+    with open_compressed(file_path, compression) as f:
+        line = f.readline(JSON_LINE_PROBE_BYTES)
+    try:
+        return isinstance(json.loads(line.decode("utf-8-sig")), dict)
+    except ValueError:
+        # A JSON array, a pretty-printed object, a first line too long to check
+        return False
+
+
+def rechunk_text(file_path: str, compression: Optional[str], output_dir: str, suffix: str,
+                 repeat_header: bool = False, split: bool = True,
+                 chunk_bytes: int = DEFAULT_CHUNK_BYTES) -> List[str]:
+    """
+    Decompress a text file into plain part files of about chunk_bytes each.
+
+    Parts are cut just after a newline, so this only splits content with one
+    record per line. With repeat_header the first line (a CSV header) is
+    written at the top of every part. split=False writes a single part, for
+    content that must not be cut between lines (multi-line CSV records, JSON
+    that is not JSON Lines such as an array, UTF-16 text).
+    """
+    parts: List[str] = []
+
+    def new_part(header: bytes):
+        path = os.path.join(output_dir, f"part-{len(parts):05d}{suffix}")
+        parts.append(path)
+        out = open(path, "wb")
+        out.write(header)
+        return out
+
+    with open_compressed(file_path, compression) as src:
+        header = src.readline() if repeat_header else b""
+        out = new_part(header)
+        written = len(header)
+        try:
+            for block in iter(lambda: src.read(COPY_BLOCK_BYTES), b""):
+                while block:
+                    cut = block.find(b"\n", max(0, chunk_bytes - written)) if split else -1
+                    if written + len(block) < chunk_bytes or cut < 0:
+                        out.write(block)
+                        written += len(block)
+                        break
+                    out.write(block[:cut + 1])
+                    out.close()
+                    out = new_part(header)
+                    written = len(header)
+                    block = block[cut + 1:]
+        finally:
+            out.close()
+
+    # A cut on the very last newline leaves a part with nothing but the header
+    if len(parts) > 1 and os.path.getsize(parts[-1]) == len(header):
+        os.remove(parts.pop())
+    return parts
@@ -0,0 +1,120 @@
+"""
+Delta Lake output for the master dataset.
+
+Plain Parquet output is replaced file by file: a reader can see a
+half-written directory, and records are only ever appended. In Delta mode
+each run is one atomic MERGE into the master table on canonical_key:
+
+- new keys are inserted,
+- known keys are updated, but only when a field actually changed, so
+  re-ingesting an unchanged file rewrites nothing,
+- columns that appear in a later run are added to the table schema.
+
+The table is created with the change data feed enabled. Every run is a
+table version, and the loader reads "changes since version N" from the
+transaction log instead of reloading everything. optimize_table runs
+OPTIMIZE ... ZORDER BY the key columns, so lookups by key skip most files.
+
+Needs the delta-spark package; the session must be built with
+configure_delta.
+"""
+import os
+from typing import Any, Dict, List, Optional
+
+from pyspark.sql import DataFrame, SparkSession
+
+DELTA_PATH = "../../data_processed/master_delta/"
+KEY_COLUMN = "canonical_key"
+DEFAULT_ZORDER_COLUMNS = [KEY_COLUMN]
+# Refreshed on every run, so it does not count as a change
+VOLATILE_COLUMNS = {"ingest_timestamp"}
+
+
+def configure_delta(builder: SparkSession.Builder) -> SparkSession.Builder:
+    """Add the Delta Lake SQL extension, catalog and package to a session builder."""
+    from delta import configure_spark_with_delta_pip
+    builder = builder \
+        .config("spark.sql.extensions", "io.delta.sql.DeltaSparkSessionExtension") \
+        .config("spark.sql.catalog.spark_catalog", "org.apache.spark.sql.delta.catalog.DeltaCatalog")
+    return configure_spark_with_delta_pip(builder)
+
+
+def _absolute(path: str) -> str:
+    return os.path.abspath(path)
+
+
+def _create_table(spark: SparkSession, df: DataFrame, path: str):
+    from delta.tables import DeltaTable
+    DeltaTable.createIfNotExists(spark) \
+        .location(_absolute(path)) \
+        .addColumns(df.schema) \
+        .property("delta.enableChangeDataFeed", "true") \
+        .execute()
+
+
+def _changed(columns: List[str]) -> str:
+    """Merge condition: true when any non-volatile column differs (null-safe)."""
+    compared = [c for c in columns if c != KEY_COLUMN and c not in VOLATILE_COLUMNS]
+    if not compared:
+        return "false"
+    return " OR ".join(f"NOT (t.`{c}` <=> s.`{c}`)" for c in compared)
+
+
+def _last_operation(table) -> Dict[str, Any]:
+    last = table.history(1).select("version", "operation", "operationMetrics").first()
+    metrics = last["operationMetrics"] or {}
+    return {
+        "version": last["version"],
+        "operation": last["operation"],
+        "inserted": int(metrics.get("numTargetRowsInserted", metrics.get("numOutputRows", 0))),
+        "updated": int(metrics.get("numTargetRowsUpdated", 0)),
+    }
+
+
+def merge_into_delta(spark: SparkSession, df: DataFrame, path: str = DELTA_PATH,
+                     full_refresh: bool = False) -> Dict[str, Any]:
+    """
+    Upsert df (one row per canonical_key) into the Delta table at path, or
+    replace the table's contents with full_refresh. Returns the new table
+    version and the inserted/updated row counts.
+    """
+    from delta.tables import DeltaTable
+
+    # MERGE adds columns the table does not have yet instead of failing
+    spark.conf.set("spark.databricks.delta.schema.autoMerge.enabled", "true")
+    _create_table(spark, df, path)
+    table = DeltaTable.forPath(spark, _absolute(path))
+
+    if full_refresh:
+        # Still one atomic commit; the previous contents stay reachable by time travel
+        df.write.format("delta").mode("overwrite").option("overwriteSchema", "true").save(_absolute(path))
+        return _last_operation(table)
+
+    shared = [c for c in df.columns if c in table.toDF().columns]
+    table.alias("t") \
+        .merge(df.alias("s"), f"t.`{KEY_COLUMN}` = s.`{KEY_COLUMN}`") \
+        .whenMatchedUpdateAll(condition=_changed(shared)) \
+        .whenNotMatchedInsertAll() \
+        .execute()
+    return _last_operation(table)
+
+
+def optimize_table(spark: SparkSession, path: str = DELTA_PATH,
+                   zorder_by: Optional[List[str]] = None) -> Dict[str, Any]:
+    """Compact the table's files and Z-order them by the key columns."""
+    from delta.tables import DeltaTable
+    table = DeltaTable.forPath(spark, _absolute(path))
+    columns = [c for c in (zorder_by or DEFAULT_ZORDER_COLUMNS) if c in table.toDF().columns]
+    print(f"🗜 OPTIMIZE {path} ZORDER BY ({', '.join(columns)})")
+    metrics = table.optimize().executeZOrderBy(*columns).first()["metrics"]
+    return {"files_removed": metrics["numFilesRemoved"], "files_added": metrics["numFilesAdded"],
+            "zorder_by": columns}
+
+
+def read_changes(spark: SparkSession, since_version: int, path: str = DELTA_PATH) -> DataFrame:
+    """Rows inserted or updated after table version since_version (from the change data feed)."""
+    return spark.read.format("delta") \
+        .option("readChangeFeed", "true") \
+        .option("startingVersion", since_version + 1) \
+        .load(_absolute(path)) \
+        .where("_change_type IN ('insert', 'update_postimage')")
@@ -0,0 +1,176 @@
+"""
+Blocked fuzzy entity resolution.
+
+canonical_key only merges records that agree exactly on name, email, phone
+and dob. This stage links near-duplicates ("Jon Doe" / "John Doe" with the
+same phone) and assigns every record an entity_id:
+
+1. Blocking: each record gets a few blocking keys (normalized phone, email
+   local part, soundex of first and last name plus dob). Only records that
+   share a key are compared, and blocks above max_block_size are skipped, so
+   the number of candidate pairs grows linearly with the input rather than
+   quadratically.
+2. Scoring: candidate pairs are scored with native Spark expressions
+   (levenshtein similarity on names, exact matches on phone, email and dob),
+   evaluated column-wise in generated code rather than row by row in Python.
+   Fields missing on either side are left out of the weighted score.
+3. Clustering: pairs at or above the threshold are edges of a graph whose
+   connected components are found by iterative min-label propagation. The
+   smallest canonical_key in a component becomes its entity_id. Propagation
+   stops after max_iterations; the stats say whether it converged, since a
+   component wider than that may be left split.
+
+Records are identified by canonical_key, so run this after dropDuplicates.
+Only the records passed in are compared: a near-duplicate of a record
+published by an earlier run is not linked to it.
+"""
+from typing import Any, Dict, Tuple
+
+from pyspark import StorageLevel
+from pyspark.sql import DataFrame
+from pyspark.sql import functions as F
+
+KEY_COLUMN = "canonical_key"
+ENTITY_COLUMN = "entity_id"
+DEFAULT_THRESHOLD = 0.7
+# Blocks larger than this (e.g. a placeholder phone shared by thousands of rows) are not compared
+DEFAULT_MAX_BLOCK_SIZE = 1000
+DEFAULT_MAX_ITERATIONS = 20
+
+# Field -> weight in the match score
+WEIGHTS = {"name": 0.35, "phone": 0.3, "email": 0.25, "dob": 0.1}
+
+
+def _text(df: DataFrame, column: str):
+    return F.lower(F.trim(F.col(column).cast("string"))) if column in df.columns else F.lit("")
+
+
+def match_features(df: DataFrame) -> DataFrame:
+    """Per-record comparison fields: name, phone digits, email local part, dob."""
+    if "name" in df.columns:
+        name = _text(df, "name")
+    else:
+        name = F.trim(F.concat_ws(" ", _text(df, "first_name"), _text(df, "last_name")))
+    digits = F.regexp_replace(_text(df, "phone"), r"\D", "")
+    # Last 10 digits, so "+1 555..." and "555..." agree
+    phone = F.when(F.length(digits) >= 7, F.substring(digits, -10, 10)).otherwise(F.lit(""))
+    # Case and plus-tags do not change the mailbox
+    local = F.regexp_replace(F.split(_text(df, "email"), "@").getItem(0), r"\+.*$", "")
+    tokens = F.split(name, r"\s+")
+    return df.select(
+        F.col(KEY_COLUMN),
+        name.alias("name"),
+        phone.alias("phone"),
+        F.coalesce(local, F.lit("")).alias("email"),
+        _text(df, "dob").alias("dob"),
+        F.soundex(tokens.getItem(0)).alias("first_sx"),
+        F.soundex(F.element_at(tokens, -1)).alias("last_sx"),
+    )
+
+
+def blocking_keys(features: DataFrame) -> DataFrame:
+    """(canonical_key, block) rows; a record lands in one block per usable key."""
+    keys = F.array(
+        F.when(F.col("phone") != "", F.concat(F.lit("p:"), F.col("phone"))),
+        F.when(F.length("email") >= 3, F.concat(F.lit("e:"), F.col("email"))),
+        F.when((F.col("name") != "") & (F.col("dob") != ""),
+               F.concat_ws(":", F.lit("n"), F.col("first_sx"), F.col("last_sx"), F.col("dob"))),
+    )
+    return features.select(KEY_COLUMN, F.explode(keys).alias("block")).where(F.col("block").isNotNull())
+
+
+def candidate_pairs(blocks: DataFrame, max_block_size: int = DEFAULT_MAX_BLOCK_SIZE) -> DataFrame:
+    """Distinct (key_a, key_b) pairs with key_a < key_b sharing at least one block."""
+    sizes = blocks.groupBy("block").count().where((F.col("count") > 1) & (F.col("count") <= max_block_size))
+    usable = blocks.join(sizes.select("block"), "block")
+    left = usable.select("block", F.col(KEY_COLUMN).alias("key_a"))
+    right = usable.select("block", F.col(KEY_COLUMN).alias("key_b"))
+    return left.join(right, "block").where(F.col("key_a") < F.col("key_b")).select("key_a", "key_b").distinct()
+
+
+def score_pairs(pairs: DataFrame, features: DataFrame) -> DataFrame:
+    """Add a 0..1 score: weighted similarity over the fields both records have."""
+    a = features.select([F.col(c).alias(f"{c}_a") for c in features.columns])
+    b = features.select([F.col(c).alias(f"{c}_b") for c in features.columns])
+    joined = pairs.join(a, pairs.key_a == a[f"{KEY_COLUMN}_a"]).join(b, pairs.key_b == b[f"{KEY_COLUMN}_b"])
+
+    weighted, total, compared = F.lit(0.0), F.lit(0.0), F.lit(0)
+    for field, weight in WEIGHTS.items():
+        left, right = F.col(f"{field}_a"), F.col(f"{field}_b")
+        present = (left != "") & (right != "")
+        if field == "name":
+            similarity = 1 - F.levenshtein(left, right) / F.greatest(F.length(left), F.length(right))
+        else:
+            similarity = F.when(left == right, 1.0).otherwise(0.0)
+        weighted = weighted + F.when(present, similarity * weight).otherwise(0.0)
+        total = total + F.when(present, weight).otherwise(0.0)
+        compared = compared + F.when(present, 1).otherwise(0)
+
+    # A single shared field (e.g. only a phone) is not enough evidence
+    score = F.when(compared >= 2, weighted / total).otherwise(0.0)
+    return joined.select("key_a", "key_b", score.alias("score"))
+
+
+def connected_components(edges: DataFrame,
+                         max_iterations: int = DEFAULT_MAX_ITERATIONS) -> Tuple[DataFrame, int, bool]:
+    """
+    Label every vertex of an undirected edge list (key_a, key_b) with the
+    smallest key in its component. Returns (key, label) rows, the number of
+    iterations used and whether the labels converged; if not, a component
+    may still carry more than one label.
+    """
+    both = edges.select(F.col("key_a").alias("src"), F.col("key_b").alias("dst")) \
+        .union(edges.select(F.col("key_b").alias("src"), F.col("key_a").alias("dst"))) \
+        .persist(StorageLevel.MEMORY_AND_DISK)
+    labels = both.select(F.col("src").alias("key")).distinct().withColumn("label", F.col("key")).localCheckpoint()
+
+    iterations = 0
+    converged = False
+    for iterations in range(1, max_iterations + 1):
+        proposed = both.join(labels, both.src == labels.key) \
+            .groupBy("dst").agg(F.min("label").alias("proposed"))
+        updated = labels.join(proposed, labels.key == proposed.dst, "left") \
+            .select("key",
+                    F.least("label", F.coalesce("proposed", "label")).alias("new_label"),
+                    F.col("label").alias("previous")) \
+            .withColumnRenamed("new_label", "label") \
+            .localCheckpoint()
+        labels = updated.select("key", "label")
+        # Lineage is cut by the checkpoint, so this count only scans the new labels
+        if updated.where(F.col("label") != F.col("previous")).count() == 0:
+            converged = True
+            break
+    both.unpersist()
+    return labels, iterations, converged
+
+
+def resolve_entities(df: DataFrame, threshold: float = DEFAULT_THRESHOLD,
+                     max_block_size: int = DEFAULT_MAX_BLOCK_SIZE,
+                     max_iterations: int = DEFAULT_MAX_ITERATIONS) -> Tuple[DataFrame, Dict[str, Any]]:
+    """
+    Add entity_id to every record. Records matching nothing keep their own
+    canonical_key as entity_id. Returns the DataFrame and stats for the run report.
+
+    df is read twice (for matching and for the final join), so the caller
+    should pass it persisted and unpersist it once the result is written.
+    """
+    features = match_features(df).persist(StorageLevel.MEMORY_AND_DISK)
+    pairs = candidate_pairs(blocking_keys(features), max_block_size)
+    edges = score_pairs(pairs, features).where(F.col("score") >= threshold) \
+        .select("key_a", "key_b").persist(StorageLevel.MEMORY_AND_DISK)
+
+    matched_pairs = edges.count()
+    iterations = 0
+    converged = True
+    if matched_pairs:
+        labels, iterations, converged = connected_components(edges, max_iterations)
+        df = df.join(labels.withColumnRenamed("key", KEY_COLUMN), KEY_COLUMN, "left") \
+            .withColumn(ENTITY_COLUMN, F.coalesce(F.col("label"), F.col(KEY_COLUMN))) \
+            .drop("label")
+    else:
+        df = df.withColumn(ENTITY_COLUMN, F.col(KEY_COLUMN))
+    features.unpersist()
+    edges.unpersist()
+
+    return df, {"matched_pairs": matched_pairs, "iterations": iterations, "converged": converged,
+                "threshold": threshold}
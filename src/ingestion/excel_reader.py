@@ -0,0 +1,149 @@
+"""
+Streaming, columnar Excel reader.
+
+Sheets are read row by row and turned straight into Arrow RecordBatches, so
+no pandas DataFrame or per-row dict is ever built. Each sheet is converted in
+its own worker process and spilled to Parquet part files (see arrow_spill)
+that Spark reads directly.
+
+The Rust-based python-calamine reader is used when it is installed (an order
+of magnitude faster on large sheets); otherwise openpyxl in read-only
+streaming mode.
+
+Row tuples are buffered and transposed per batch. All cells are emitted as
+strings (None for empty cells): read_file stringifies every non-Parquet
+column anyway, and a fixed string schema keeps batches of a sheet compatible
+no matter how its cell types mix.
+"""
+import os
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from typing import Iterator, List, Optional
+
+import pyarrow as pa
+from openpyxl import load_workbook
+
+from arrow_spill import ArrowSpillWriter
+
+try:
+    from python_calamine import CalamineWorkbook
+except ImportError:  # optional, see module docstring
+    CalamineWorkbook = None
+
+DEFAULT_BATCH_SIZE = 50000
+DEFAULT_WORKERS = os.cpu_count() or 1
+
+
+def list_sheets(file_path: str) -> List[str]:
+    if CalamineWorkbook is not None:
+        return list(CalamineWorkbook.from_path(file_path).sheet_names)
+    workbook = load_workbook(file_path, read_only=True)
+    try:
+        return list(workbook.sheetnames)
+    finally:
+        workbook.close()
+
+
+def _header_names(header_row) -> List[str]:
+    """Name columns like pandas does: blanks become 'Unnamed: i', repeats get '.n' suffixes."""
+    names = []
+    seen = {}
+    for i, value in enumerate(header_row):
+        name = str(value).strip() if value is not None and str(value).strip() else f"Unnamed: {i}"
+        if name in seen:
+            seen[name] += 1
+            name = f"{name}.{seen[name]}"
+        else:
+            seen[name] = 0
+        names.append(name)
+    return names
+
+
+def _cell_str(value) -> Optional[str]:
+    """Render a cell as text; empty cells are None and integral numbers drop their '.0'."""
+    if value is None or value == "":
+        return None
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return str(value)
+
+
+def _to_batch(rows: List[tuple], width: int, schema: pa.Schema) -> pa.RecordBatch:
+    """Transpose buffered row tuples into string columns (zip runs in C)."""
+    padded = [row[:width] if len(row) >= width else tuple(row) + (None,) * (width - len(row)) for row in rows]
+    columns = zip(*padded)
+    arrays = [pa.array([_cell_str(value) for value in column], type=pa.string()) for column in columns]
+    return pa.RecordBatch.from_arrays(arrays, schema=schema)
+
+
+def _is_blank(row) -> bool:
+    return row is None or all(value is None or value == "" for value in row)
+
+
+def _iter_rows(file_path: str, sheet_name: str) -> Iterator[tuple]:
+    """Yield raw row tuples of a sheet, header first."""
+    if CalamineWorkbook is not None:
+        sheet = CalamineWorkbook.from_path(file_path).get_sheet_by_name(sheet_name)
+        yield from sheet.iter_rows()
+        return
+    workbook = load_workbook(file_path, read_only=True, data_only=True)
+    try:
+        yield from workbook[sheet_name].iter_rows(values_only=True)
+    finally:
+        workbook.close()
+
+
+def iter_sheet_batches(file_path: str, sheet_name: str,
+                       batch_size: int = DEFAULT_BATCH_SIZE) -> Iterator[pa.RecordBatch]:
+    """Stream one sheet as Arrow RecordBatches; the first row is the header."""
+    rows = _iter_rows(file_path, sheet_name)
+    header = next(rows, None)
+    if header is None:
+        return
+    names = _header_names([None if value == "" else value for value in header])
+    width = len(names)
+    schema = pa.schema([pa.field(name, pa.string()) for name in names])
+
+    buffered: List[tuple] = []
+    for row in rows:
+        if _is_blank(row):
+            continue
+        buffered.append(row)
+        if len(buffered) >= batch_size:
+            yield _to_batch(buffered, width, schema)
+            buffered = []
+    if buffered:
+        yield _to_batch(buffered, width, schema)
+
+
+def sheet_to_parquet(file_path: str, sheet_name: str, output_dir: str, prefix: str,
+                     batch_size: int = DEFAULT_BATCH_SIZE) -> List[str]:
+    """Convert one sheet to Parquet part files in output_dir. Returns the files (none for an empty sheet)."""
+    with ArrowSpillWriter(output_dir, prefix=prefix) as sink:
+        for batch in iter_sheet_batches(file_path, sheet_name, batch_size):
+            sink.write_batch(batch)
+    return sink.files
+
+
+def excel_to_parquet(file_path: str, output_dir: str, workers: int = DEFAULT_WORKERS,
+                     batch_size: int = DEFAULT_BATCH_SIZE) -> List[str]:
+    """
+    Convert every sheet of a workbook to Parquet, one worker process per sheet.
+
+    Returns the Parquet files written (empty sheets produce none).
+    """
+    sheets = list_sheets(file_path)
+    prefixes = [f"sheet-{i:04d}" for i in range(len(sheets))]
+
+    if workers <= 1 or len(sheets) <= 1:
+        written = [sheet_to_parquet(file_path, sheet, output_dir, prefix, batch_size)
+                   for sheet, prefix in zip(sheets, prefixes)]
+    else:
+        # spawn, not fork: the driver process holds JVM gateway threads
+        context = multiprocessing.get_context("spawn")
+        with ProcessPoolExecutor(max_workers=min(workers, len(sheets)), mp_context=context) as executor:
+            futures = [executor.submit(sheet_to_parquet, file_path, sheet, output_dir, prefix, batch_size)
+                       for sheet, prefix in zip(sheets, prefixes)]
+            written = [future.result() for future in futures]
+
+    return [path for files in written for path in files]
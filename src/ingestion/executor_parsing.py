@@ -0,0 +1,198 @@
+"""
+Executor-side parsing of XML, Excel and SQL dumps.
+
+The batch pipeline parses these formats in Python on the driver, one file at
+a time. Here the files are turned into a file-path RDD instead and the same
+parsers run inside mapPartitions on the executors, so a directory of many
+XML files (or one big dump split into byte ranges) is parsed with the
+parallelism of the whole cluster.
+
+Executors open the files by path, so the raw data directory must be on a
+filesystem every executor can see (local mode, NFS, a mounted volume). The
+ingestion modules are shipped to executors with addPyFile.
+
+Parsed records travel as JSON strings into spark.read.json. The string RDD
+is persisted so schema inference and the actual read share one parse. A file
+that fails to parse becomes a single _corrupt_record row, so it is dropped
+and counted like any other corrupt input.
+"""
+import os
+import json
+import time
+import tempfile
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from pyspark import StorageLevel
+from pyspark.sql import DataFrame, SparkSession
+
+from compressed_io import decompress_to, open_compressed
+from file_probe import FileProber, probe_file
+from key_strategies import KeyStrategies
+from normalization import flatten_dict, generate_canonical_key, normalize_columns
+from projection import apply_cleaning_projection
+from run_stats import CORRUPT_COLUMN, IngestionStats
+from sql_dump import scan_table_columns, split_ranges
+
+EXECUTOR_FORMATS = ("xml", "excel", "sql")
+# SQL dumps are split into byte ranges of about this size, one task each
+DEFAULT_SQL_RANGE_BYTES = 128 * 1024 * 1024
+# Upper bound on tasks per core when spreading files over partitions
+TASKS_PER_CORE = 4
+
+INGESTION_DIR = os.path.dirname(os.path.abspath(__file__))
+_shipped_contexts = set()
+
+# One unit of executor work: {"format", "path", "encoding", "compression", "start", "end",
+# "table_columns"}; start/end/table_columns only matter for SQL byte ranges
+Task = Dict[str, Any]
+
+
+def _ship_modules(spark: SparkSession):
+    """Make the ingestion modules importable on executors (once per SparkContext)."""
+    sc = spark.sparkContext
+    if id(sc) in _shipped_contexts:
+        return
+    for name in sorted(os.listdir(INGESTION_DIR)):
+        if name.endswith(".py"):
+            sc.addPyFile(os.path.join(INGESTION_DIR, name))
+    _shipped_contexts.add(id(sc))
+
+
+def _probe(file_path: str, probes: Optional[FileProber]) -> Dict[str, Any]:
+    return probes.get(file_path) if probes is not None else probe_file(file_path)
+
+
+def plan_tasks(file_paths: List[str], probes: Optional[FileProber] = None,
+               sql_range_bytes: int = DEFAULT_SQL_RANGE_BYTES) -> List[Task]:
+    """One task per XML/Excel file; SQL dumps get one task per byte range."""
+    tasks: List[Task] = []
+    for path in file_paths:
+        probe = _probe(path, probes)
+        task = {"format": probe["format"], "path": path, "encoding": probe["encoding"] or "utf-8",
+                "compression": probe["compression"], "start": 0, "end": None, "table_columns": None}
+        if task["format"] == "sql" and task["compression"] is None:
+            parts = max(1, probe["size"] // sql_range_bytes)
+            ranges = split_ranges(path, parts, min_range_bytes=sql_range_bytes)
+            # INSERTs without a column list need CREATE TABLEs that may sit in another range
+            table_columns = scan_table_columns(path, task["encoding"]) if len(ranges) > 1 else None
+            tasks.extend(dict(task, start=start, end=end, table_columns=table_columns) for start, end in ranges)
+        elif task["format"] in EXECUTOR_FORMATS:
+            # Compressed dumps cannot be entered mid-stream, so they stay one task
+            tasks.append(task)
+    return tasks
+
+
+def _parse_task(task: Task, xml_record_path: Optional[str]) -> Iterator[Dict[str, Any]]:
+    """Run the driver-side parser for one task. Executes on an executor."""
+    from xml_reader import iter_xml_records
+    from excel_reader import iter_sheet_batches, list_sheets
+    from sql_dump import iter_dump_records
+
+    fmt, path, compression = task["format"], task["path"], task["compression"]
+    if fmt == "xml":
+        with open_compressed(path, compression) as source:
+            for record in iter_xml_records(source, xml_record_path):
+                yield flatten_dict(record)
+    elif fmt == "excel":
+        with tempfile.TemporaryDirectory() as tmp:
+            # Workbook readers need a seekable file, so compressed workbooks are unpacked locally
+            workbook = decompress_to(path, compression, os.path.join(tmp, "workbook")) if compression else path
+            for sheet_name in list_sheets(workbook):
+                for batch in iter_sheet_batches(workbook, sheet_name):
+                    yield from batch.to_pylist()
+    elif fmt == "sql":
+        yield from iter_dump_records(path, task["encoding"], task["start"], task["end"], task["table_columns"],
+                                     compression=compression)
+
+
+def _parse_partition(tasks: Iterator[Task], xml_record_path: Optional[str]) -> Iterator[str]:
+    for task in tasks:
+        try:
+            for record in _parse_task(task, xml_record_path):
+                yield json.dumps(record, default=str)
+        except Exception as e:
+            print(f"⚠ Could not parse {task['path']} on executor: {e}")
+            yield json.dumps({CORRUPT_COLUMN: f"{os.path.basename(task['path'])}: {e}"})
+
+
+def read_on_executors(spark: SparkSession, file_paths: List[str], fmt: str,
+                      xml_record_path: Optional[str] = None,
+                      probes: Optional[FileProber] = None) -> Optional[DataFrame]:
+    """
+    Parse all files of one format on the executors.
+
+    Returns the raw parsed DataFrame (string columns, possibly with a
+    _corrupt_record column), or None if the files held no records.
+    """
+    tasks = plan_tasks(file_paths, probes)
+    if not tasks:
+        return None
+    _ship_modules(spark)
+
+    sc = spark.sparkContext
+    slices = max(1, min(len(tasks), sc.defaultParallelism * TASKS_PER_CORE))
+    lines = sc.parallelize(tasks, slices) \
+        .mapPartitions(lambda part: _parse_partition(part, xml_record_path)) \
+        .persist(StorageLevel.MEMORY_AND_DISK)
+
+    df = spark.read.option("primitivesAsString", "true").json(lines)
+    if not df.columns:
+        lines.unpersist()
+        return None
+    return df
+
+
+def ingest_on_executors(spark: SparkSession, file_paths: List[str], stats: Optional[IngestionStats] = None,
+                        xml_record_path: Optional[str] = None, probes: Optional[FileProber] = None,
+                        key_strategies: Optional[KeyStrategies] = None) -> List[Dict[str, Any]]:
+    """
+    Executor-side counterpart of ingest_files for XML, Excel and SQL files.
+
+    Files are grouped by format (and declared key strategy) and each group
+    becomes one distributed read, cleaned, normalized and keyed like
+    process_file output. Returns one result per group; "paths" lists the
+    files the group covers.
+    """
+    by_format: Dict[Tuple[str, Optional[str]], List[str]] = {}
+    for path in file_paths:
+        pattern = key_strategies.resolve(path)["pattern"] if key_strategies is not None else None
+        by_format.setdefault((_probe(path, probes)["format"], pattern), []).append(path)
+
+    results = []
+    for (fmt, pattern), paths in by_format.items():
+        label = f"{len(paths)} {fmt} file(s) on executors"
+        if pattern is not None:
+            label += f" ({pattern})"
+        print(f"📥 Parsing {label}...")
+        started = time.time()
+        try:
+            df = read_on_executors(spark, paths, fmt, xml_record_path, probes)
+            error = None
+        except Exception as e:
+            df, error = None, str(e)
+
+        if df is not None:
+            if stats is not None:
+                df = stats.observe_source(df, label, fmt)
+            if CORRUPT_COLUMN in df.columns:
+                df = df.filter(df[CORRUPT_COLUMN].isNull()).drop(CORRUPT_COLUMN)
+            df = apply_cleaning_projection(df, fmt)
+            df = normalize_columns(df)
+            df = generate_canonical_key(df, key_strategies.resolve(paths[0]) if key_strategies is not None else None)
+        else:
+            print(f"❌ Could not read: {label}")
+
+        result = {
+            "file": label,
+            "path": label,
+            "paths": paths,
+            "df": df,
+            "seconds": time.time() - started,
+            "pool": "executors",
+            "error": error,
+        }
+        if stats is not None:
+            stats.record_file(label, read_seconds=round(result["seconds"], 3), pool="executors",
+                              error=error, ok=df is not None, files=[os.path.basename(p) for p in paths])
+        results.append(result)
+    return results
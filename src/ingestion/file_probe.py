@@ -0,0 +1,357 @@
+"""
+File probe: everything the readers need to know about a raw file, found by
+opening it once.
+
+A probe reads the first block of a file and records:
+- size and compression (gzip/bz2/xz/zstd magic bytes),
+- format: magic bytes of a binary format (parquet, Excel) win over the
+  extension; the leading text (XML, JSON, SQL) only decides when the
+  extension is unknown, so a CSV header such as "Begin Date,..." stays CSV,
+- encoding and chardet confidence (byte-order marks win outright),
+- for delimited text: the dialect (delimiter, quote and escape characters,
+  whether quoted fields span lines), header row and line terminator.
+
+Probes are plain dicts, cached per content fingerprint in probe_cache.json so
+an unchanged file is never sniffed twice, and shared by every reader through
+FileProber. A large drop is probed in a process pool.
+"""
+import os
+import re
+import io
+import csv
+import json
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Dict, List, Optional
+
+import chardet
+
+from compressed_io import open_compressed, split_compression_extension
+from manifest import file_sha256
+
+PROBE_CACHE_PATH = "../../data_processed/probe_cache.json"
+# Bump when the probe layout changes so stale cache entries are ignored
+PROBE_VERSION = 4
+SAMPLE_BYTES = 64 * 1024
+# Leading text checked for XML/JSON/SQL content (room for a dump's comment header)
+CONTENT_SAMPLE_BYTES = 4096
+# chardet only sees this much of the sample; it gets slow on large inputs
+ENCODING_SAMPLE_BYTES = 10000
+DEFAULT_WORKERS = os.cpu_count() or 1
+# Below this many files the process pool costs more to start than it saves
+MIN_POOL_FILES = 8
+
+CANDIDATE_DELIMITERS = ",;\t|"
+CANDIDATE_QUOTES = "\"'"
+# Lines of the sample used to score candidate dialects
+SNIFF_LINES = 200
+BINARY_FORMATS = {"parquet", "excel"}
+
+EXTENSION_FORMATS = {
+    ".csv": "csv",
+    ".json": "json",
+    ".jsonl": "json",
+    ".parquet": "parquet",
+    ".xml": "xml",
+    ".xlsx": "excel",
+    ".xls": "excel",
+    ".sql": "sql",
+    ".dump": "sql",
+}
+
+_COMPRESSION_MAGIC = [
+    (b"\x1f\x8b", "gzip"),
+    (b"BZh", "bz2"),
+    (b"\xfd7zXZ\x00", "xz"),
+    (b"\x28\xb5\x2f\xfd", "zstd"),
+]
+
+_BOMS = [
+    (b"\xef\xbb\xbf", "utf-8-sig"),
+    (b"\xff\xfe", "utf-16"),
+    (b"\xfe\xff", "utf-16"),
+]
+# Comments (MySQL's "/*!...*/;" included) and blank lines a dump may open with
+_SQL_PREAMBLE_RE = re.compile(r"(?:\s+|;|--[^\n]*(?:\n|$)|#[^\n]*(?:\n|$)|/\*.*?\*/)*", re.S)
+# A first statement only SQL starts with: keyword plus the syntax that follows it. The short
+# statements must end their line, so a ";"-delimited header such as "Use case;Set value" is no match
+_SQL_STATEMENT_RE = re.compile(
+    r"(?:INSERT\s+INTO\s|REPLACE\s+INTO\s|CREATE\s+(?:TEMPORARY\s+)?(?:TABLE|DATABASE|SCHEMA)\s"
+    r"|DROP\s+(?:TABLE|DATABASE|SCHEMA)\s|LOCK\s+TABLES\s|SET\s+NAMES\s"
+    r"|(?:SET\s+[@\w.]+\s*=[^;\n]*|USE\s+[`\"\w]+[`\"]?\s*|BEGIN\s*|START\s+TRANSACTION\s*);[ \t]*(?:\r?\n|$))",
+    re.I)
+
+
+def format_from_extension(path: str) -> Optional[str]:
+    """Format implied by the file extension alone; compression suffixes (.gz, .zst, ...) are looked through."""
+    root, _ = split_compression_extension(path.lower())
+    return EXTENSION_FORMATS.get(os.path.splitext(root)[1])
+
+
+def _compression(head: bytes) -> Optional[str]:
+    for magic, name in _COMPRESSION_MAGIC:
+        if head.startswith(magic):
+            return name
+    return None
+
+
+def _content_format(head: bytes, text: str) -> Optional[str]:
+    """
+    Format from magic bytes or leading content; None when it looks like plain
+    delimited text. Only magic bytes are conclusive; the text checks are
+    heuristics for files whose extension says nothing.
+    """
+    if head.startswith(b"PAR1"):
+        return "parquet"
+    if head.startswith(b"\xd0\xcf\x11\xe0\xa1\xb1\x1a\xe1"):
+        return "excel"
+    if head.startswith(b"PK\x03\x04"):
+        # xlsx is a zip archive with an xl/ folder
+        return "excel" if b"xl/" in head else None
+    stripped = text.lstrip("\ufeff \t\r\n")
+    if stripped.startswith("<"):
+        return "xml"
+    if stripped.startswith(("{", "[")):
+        return "json"
+    if _SQL_STATEMENT_RE.match(stripped, _SQL_PREAMBLE_RE.match(stripped).end()):
+        return "sql"
+    return None
+
+
+def _detect_encoding(sample: bytes) -> Dict[str, Any]:
+    for bom, name in _BOMS:
+        if sample.startswith(bom):
+            return {"encoding": name, "confidence": 1.0}
+    result = chardet.detect(sample[:ENCODING_SAMPLE_BYTES])
+    encoding = result.get("encoding")
+    confidence = result.get("confidence") or 0.0
+    # ASCII is a subset of UTF-8, which copes with anything past the sample
+    if encoding is None or encoding.lower() in ("ascii", "us-ascii"):
+        encoding = "utf-8"
+    return {"encoding": encoding, "confidence": round(confidence, 3)}
+
+
+def _line_terminator(text: str) -> str:
+    if "\r\n" in text:
+        return "\r\n"
+    if "\r" in text:
+        return "\r"
+    return "\n"
+
+
+def _complete_lines(text: str) -> List[str]:
+    """Lines of the sample, dropping a last line that may have been cut off."""
+    lines = text.splitlines()
+    if len(lines) > 1 and not text.endswith(("\n", "\r")):
+        lines = lines[:-1]
+    return lines
+
+
+def _quote_char(text: str, delimiter: str) -> str:
+    """The candidate quote that most often opens a field."""
+    hits = {
+        quote: len(re.findall(rf"(?:^|{re.escape(delimiter)}) *{re.escape(quote)}", text, re.M))
+        for quote in CANDIDATE_QUOTES
+    }
+    best = max(CANDIDATE_QUOTES, key=lambda quote: hits[quote])
+    return best if hits[best] else '"'
+
+
+def _field_counts(text: str, delimiter: str, quote: str, escape: Optional[str]) -> List[int]:
+    reader = csv.reader(io.StringIO(text), delimiter=delimiter, quotechar=quote,
+                        escapechar=escape, doublequote=escape is None)
+    return [len(row) for row in reader if row]
+
+
+def sniff_dialect(text: str) -> Optional[Dict[str, Any]]:
+    """
+    Infer the CSV dialect of a sample: delimiter, quote, escape and multiline.
+
+    Each candidate delimiter is scored by how consistently it splits the
+    sample's rows into the same number (> 1) of fields; the most consistent
+    wins, ties going to the wider split. Returns None if no candidate splits
+    the rows at all.
+    """
+    best, best_score = None, (0.0, 0)
+    for delimiter in CANDIDATE_DELIMITERS:
+        if delimiter not in text:
+            continue
+        quote = _quote_char(text, delimiter)
+        # Backslash-escaped quotes, otherwise RFC 4180 doubled quotes
+        escape = "\\" if "\\" + quote in text else None
+        try:
+            counts = _field_counts(text, delimiter, quote, escape)
+        except csv.Error:
+            continue
+        if not counts:
+            continue
+        width = max(set(counts), key=counts.count)
+        score = (counts.count(width) / len(counts), width)
+        if width > 1 and score > best_score:
+            best, best_score = {"delimiter": delimiter, "quote": quote, "escape": escape}, score
+
+    if best is None:
+        return None
+    reader = csv.reader(io.StringIO(text), delimiter=best["delimiter"], quotechar=best["quote"],
+                        escapechar=best["escape"], doublequote=best["escape"] is None)
+    best["multiline"] = any("\n" in field or "\r" in field for row in reader for field in row)
+    return best
+
+
+def _sniff_delimited(text: str) -> Dict[str, Any]:
+    """Dialect and header of a delimited text sample."""
+    lines = _complete_lines(text)
+    dialect = sniff_dialect("\n".join(lines[:SNIFF_LINES]) + "\n") if lines else None
+    if dialect is None:
+        return {"delimiter": None, "has_header": False, "header": []}
+    sample = "\n".join(lines[:50])
+    try:
+        has_header = csv.Sniffer().has_header(sample) if len(lines) > 1 else True
+    except csv.Error:
+        has_header = True
+    header = next(csv.reader([lines[0]], delimiter=dialect["delimiter"], quotechar=dialect["quote"],
+                             escapechar=dialect["escape"]), [])
+    return {**dialect, "has_header": has_header, "header": header}
+
+
+def probe_file(file_path: str, sample_bytes: int = SAMPLE_BYTES) -> Dict[str, Any]:
+    """Open a file once and describe it. Never raises; unreadable files get an "error"."""
+    probe: Dict[str, Any] = {
+        "path": file_path,
+        "size": None,
+        "compression": None,
+        "format": format_from_extension(file_path),
+        "extension_format": format_from_extension(file_path),
+        "content_format": None,
+        "encoding": None,
+        "confidence": None,
+        "delimiter": None,
+        "quote": None,
+        "escape": None,
+        "multiline": None,
+        "has_header": None,
+        "header": [],
+        "line_terminator": None,
+        "version": PROBE_VERSION,
+    }
+    try:
+        probe["size"] = os.path.getsize(file_path)
+        with open(file_path, "rb") as f:
+            head = f.read(sample_bytes)
+        probe["compression"] = _compression(head)
+        if probe["compression"] is not None:
+            # Sniff the decompressed content, not the compressed bytes
+            with open_compressed(file_path, probe["compression"]) as f:
+                head = f.read(sample_bytes)
+
+        probe["content_format"] = _content_format(head, head[:CONTENT_SAMPLE_BYTES].decode("latin-1"))
+        if probe["content_format"] in BINARY_FORMATS or (probe["format"] is None and probe["content_format"]):
+            probe["format"] = probe["content_format"]
+        if probe["format"] in BINARY_FORMATS:
+            return probe
+
+        probe.update(_detect_encoding(head))
+        text = head.decode(probe["encoding"], errors="ignore")
+        probe["line_terminator"] = _line_terminator(text)
+        if probe["format"] == "csv":
+            probe.update(_sniff_delimited(text))
+    except Exception as e:
+        probe["error"] = str(e)
+    return probe
+
+
+def probe_files(file_paths: List[str], workers: int = DEFAULT_WORKERS) -> List[Dict[str, Any]]:
+    """Probe files in a process pool (inline for a handful of files)."""
+    if workers <= 1 or len(file_paths) < MIN_POOL_FILES:
+        return [probe_file(path) for path in file_paths]
+    # spawn, not fork: the driver process holds JVM gateway threads
+    context = multiprocessing.get_context("spawn")
+    with ProcessPoolExecutor(max_workers=min(workers, len(file_paths)), mp_context=context) as executor:
+        return list(executor.map(probe_file, file_paths, chunksize=16))
+
+
+class FileProber:
+    """Probes for the files of a run, cached per content fingerprint."""
+
+    def __init__(self, cache_path: str = PROBE_CACHE_PATH, use_cache: bool = True):
+        self.cache_path = cache_path
+        self.use_cache = use_cache
+        self.cache: Dict[str, Dict[str, Any]] = {}
+        self.probes: Dict[str, Dict[str, Any]] = {}
+        self._fingerprints: Dict[str, str] = {}
+        self._lock = threading.Lock()
+        self._load()
+
+    def _load(self):
+        if not self.use_cache or not os.path.exists(self.cache_path):
+            return
+        try:
+            with open(self.cache_path, "r", encoding="utf-8") as f:
+                self.cache = json.load(f).get("files", {})
+        except (OSError, ValueError) as e:
+            print(f"⚠ Could not read probe cache {self.cache_path}, starting fresh: {e}")
+
+    def save(self):
+        """Atomically persist the probe cache."""
+        os.makedirs(os.path.dirname(os.path.abspath(self.cache_path)), exist_ok=True)
+        tmp_path = f"{self.cache_path}.tmp"
+        with self._lock, open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"version": PROBE_VERSION, "files": self.cache}, f, indent=2, sort_keys=True)
+        os.replace(tmp_path, self.cache_path)
+
+    def seed_fingerprints(self, fingerprints: Dict[str, Optional[str]]):
+        """Reuse content hashes already computed elsewhere (e.g. by the manifest)."""
+        with self._lock:
+            for path, digest in fingerprints.items():
+                if digest:
+                    self._fingerprints[os.path.abspath(path)] = digest
+
+    def _fingerprint(self, file_path: str) -> str:
+        key = os.path.abspath(file_path)
+        with self._lock:
+            digest = self._fingerprints.get(key)
+        if digest is None:
+            digest = file_sha256(file_path)
+            with self._lock:
+                self._fingerprints[key] = digest
+        return digest
+
+    def _cached(self, file_path: str) -> Optional[Dict[str, Any]]:
+        if not self.use_cache:
+            return None
+        cached = self.cache.get(self._fingerprint(file_path))
+        if cached is None or cached.get("version") != PROBE_VERSION:
+            return None
+        return dict(cached, path=file_path)
+
+    def _store(self, probe: Dict[str, Any]):
+        with self._lock:
+            self.probes[probe["path"]] = probe
+        if "error" not in probe:
+            digest = self._fingerprint(probe["path"])
+            with self._lock:
+                self.cache[digest] = {k: v for k, v in probe.items() if k != "path"}
+
+    def probe_all(self, file_paths: List[str], workers: int = DEFAULT_WORKERS) -> Dict[str, Dict[str, Any]]:
+        """Probe every file not already cached, in parallel; returns probes by path."""
+        missing = []
+        for path in file_paths:
+            cached = self._cached(path)
+            if cached is not None:
+                with self._lock:
+                    self.probes[path] = cached
+            else:
+                missing.append(path)
+        for probe in probe_files(missing, workers):
+            self._store(probe)
+        return {path: self.probes[path] for path in file_paths}
+
+    def get(self, file_path: str) -> Dict[str, Any]:
+        """Probe of one file, probing it now if probe_all did not cover it."""
+        with self._lock:
+            probe = self.probes.get(file_path)
+        if probe is None:
+            probe = self._cached(file_path) or probe_file(file_path)
+            self._store(probe)
+        return probe
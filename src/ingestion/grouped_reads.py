@@ -0,0 +1,194 @@
+"""
+Format-grouped reads of CSV and JSON files, and balanced unions.
+
+Reading every small file on its own means one scan (plus one inference pass)
+per file and a union chain as deep as the number of files; with thousands
+of files the analyzer spends longer on the plan than Spark does on the data.
+Here files are grouped by everything a single reader call has to agree on:
+
+- CSV: encoding, delimiter, quote, escape, multi-line records and header,
+- JSON: encoding,
+
+and each group is read with one multi-path spark.read, so it is one scan and
+one inference pass. Files that need special handling (compressed files that
+are re-chunked, probe errors, no delimiter found) still go through read_file.
+
+union_balanced combines the remaining DataFrames pairwise, level by level,
+so the union is log2(N) deep instead of N, and cuts the lineage with a local
+checkpoint every few levels when there are many inputs.
+"""
+import os
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+from pyspark.sql import DataFrame, SparkSession
+
+from compressed_io import spark_reads_directly
+from file_probe import FileProber, probe_file
+from key_strategies import KeyStrategies
+from normalization import csv_dialect, generate_canonical_key, normalize_columns
+from projection import apply_cleaning_projection
+from run_stats import CORRUPT_COLUMN, IngestionStats
+from schema_registry import SchemaRegistry
+
+GROUPED_FORMATS = ("csv", "json")
+# Smaller groups gain nothing over per-file reads
+MIN_GROUP_FILES = 2
+# Local checkpoint after this many union levels (2^6 = 64 inputs per checkpointed subtree)
+CHECKPOINT_LEVELS = 6
+
+
+def group_key(probe: Dict[str, Any]) -> Optional[Tuple]:
+    """Reader settings a file shares with its group, or None if it must be read on its own."""
+    fmt = probe.get("format")
+    if fmt not in GROUPED_FORMATS or "error" in probe:
+        return None
+    if not spark_reads_directly(probe["path"], probe["compression"], probe["size"] or 0):
+        return None
+    encoding = (probe["encoding"] or "utf-8").lower()
+    if fmt == "json":
+        # Files that do not look like JSON are skipped by read_file
+        return (fmt, encoding) if probe["content_format"] == "json" else None
+    if probe["delimiter"] is None:
+        return None
+    dialect = csv_dialect(probe)
+    # Spark takes the column names of a multi-path CSV read from one file's header
+    return (fmt, encoding, dialect["delimiter"], dialect["quote"], dialect["escape"], dialect["multiline"],
+            tuple(h.strip() for h in probe["header"]))
+
+
+def plan_groups(file_paths: List[str], probes: Optional[FileProber] = None,
+                key_strategies: Optional[KeyStrategies] = None) -> Tuple[List[List[str]], List[str]]:
+    """Split files into groups read together and files read one by one."""
+    groups: Dict[Tuple, List[str]] = {}
+    singles = []
+    for path in file_paths:
+        probe = probes.get(path) if probes is not None else probe_file(path)
+        key = group_key(probe)
+        if key is None:
+            singles.append(path)
+            continue
+        if key_strategies is not None:
+            # A group is keyed with one strategy, so sources keyed differently are never mixed
+            key += (key_strategies.resolve(path)["pattern"],)
+        groups.setdefault(key, []).append(path)
+
+    grouped = []
+    for paths in groups.values():
+        if len(paths) >= MIN_GROUP_FILES:
+            grouped.append(paths)
+        else:
+            singles.extend(paths)
+    return grouped, singles
+
+
+def _group_schema(paths: List[str], fmt: str, schemas: Optional[SchemaRegistry], header: List[str]):
+    """The registered schema every file of the group resolves to, or None to infer one."""
+    if schemas is None:
+        return None
+    resolved = [schemas.resolve(path, fmt) for path in paths]
+    first = resolved[0]
+    if first is None or any(schema is None or schema.json() != first.json() for schema in resolved[1:]):
+        return None
+    if fmt == "csv" and not schemas.check_header(paths[0], first, header):
+        return None
+    return first
+
+
+def read_group(spark: SparkSession, paths: List[str], probes: Optional[FileProber] = None,
+               schemas: Optional[SchemaRegistry] = None) -> DataFrame:
+    """One multi-path read for a group of CSV or JSON files with the same reader settings."""
+    probe = probes.get(paths[0]) if probes is not None else probe_file(paths[0])
+    fmt = probe["format"]
+    schema = _group_schema(paths, fmt, schemas, probe["header"])
+    reader = spark.read.option("mode", "PERMISSIVE").option("columnNameOfCorruptRecord", CORRUPT_COLUMN)
+    reader = reader.schema(schema) if schema is not None else reader.option("inferSchema", "true")
+
+    if fmt == "csv":
+        dialect = csv_dialect(probe)
+        df = reader.option("header", "true") \
+            .option("encoding", probe["encoding"] or "utf-8") \
+            .option("sep", dialect["delimiter"]) \
+            .option("quote", dialect["quote"]) \
+            .option("escape", dialect["escape"]) \
+            .option("multiLine", str(dialect["multiline"]).lower()) \
+            .csv(paths)
+    else:
+        df = reader.json(paths)
+
+    if schemas is not None and schema is None:
+        for path in paths:
+            schemas.register(path, fmt, df.schema)
+    return df
+
+
+def ingest_groups(spark: SparkSession, groups: List[List[str]], stats: Optional[IngestionStats] = None,
+                  probes: Optional[FileProber] = None, schemas: Optional[SchemaRegistry] = None,
+                  key_strategies: Optional[KeyStrategies] = None) -> List[Dict[str, Any]]:
+    """
+    Read each group with a single spark.read, cleaned, normalized and keyed
+    like process_file output. Returns one result per group; "paths" lists
+    the files the group covers.
+    """
+    results = []
+    for paths in groups:
+        probe = probes.get(paths[0]) if probes is not None else probe_file(paths[0])
+        fmt = probe["format"]
+        # A file belongs to one group per run, so the first file names it (and its staged output)
+        label = f"{len(paths)} {fmt} files from {os.path.basename(paths[0])}"
+        if stats is not None and fmt == "csv":
+            # Every member is read with the group's dialect (group_key matched it)
+            dialect = csv_dialect(probe)
+            for path in paths:
+                stats.record_file(path, dialect=dialect)
+        print(f"📥 Reading {label} in one pass...")
+        started = time.time()
+        try:
+            df = read_group(spark, paths, probes, schemas)
+            if stats is not None:
+                df = stats.observe_source(df, label, fmt, member_paths=paths)
+            if CORRUPT_COLUMN in df.columns:
+                df = df.filter(df[CORRUPT_COLUMN].isNull()).drop(CORRUPT_COLUMN)
+            df = apply_cleaning_projection(df, fmt)
+            df = normalize_columns(df)
+            df = generate_canonical_key(df, key_strategies.resolve(paths[0]) if key_strategies is not None else None)
+            error = None
+        except Exception as e:
+            print(f"❌ Could not read: {label}")
+            df, error = None, str(e)
+            if stats is not None:
+                stats.forget(label)
+
+        result = {
+            "file": label,
+            "path": label,
+            "paths": paths,
+            "df": df,
+            "seconds": time.time() - started,
+            "pool": "grouped",
+            "error": error,
+        }
+        if stats is not None:
+            stats.record_file(label, read_seconds=round(result["seconds"], 3), pool="grouped",
+                              error=error, ok=df is not None, files=[os.path.basename(p) for p in paths])
+        results.append(result)
+    return results
+
+
+def union_balanced(dfs: List[DataFrame], checkpoint_levels: Optional[int] = None) -> DataFrame:
+    """
+    unionByName (missing columns allowed) as a balanced tree. Every
+    checkpoint_levels levels (CHECKPOINT_LEVELS by default, 0 never), the
+    partial unions are local-checkpointed so the plan never grows past that depth.
+    """
+    if checkpoint_levels is None:
+        checkpoint_levels = CHECKPOINT_LEVELS
+    level = 0
+    while len(dfs) > 1:
+        dfs = [dfs[i].unionByName(dfs[i + 1], allowMissingColumns=True) if i + 1 < len(dfs) else dfs[i]
+               for i in range(0, len(dfs), 2)]
+        level += 1
+        if checkpoint_levels and level % checkpoint_levels == 0 and len(dfs) > 1:
+            print(f"✂  Checkpointing {len(dfs)} partial unions after {level} levels")
+            dfs = [df.localCheckpoint() for df in dfs]
+    return dfs[0]
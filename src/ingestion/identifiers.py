@@ -0,0 +1,144 @@
+"""
+Canonical forms for identifier fields, so formatting differences do not
+produce different canonical_key hashes:
+
+- phone: E.164 ("+1 (999) 111-2222" and "9991112222" -> "+19991112222"),
+- email: lower case, plus-tag removed ("John+news@X.com" -> "john@x.com"),
+- dob: ISO date from ISO, US, European, compact and month-name formats
+  ("03/14/1990", "14.03.1990", "Mar 14, 1990" -> "1990-03-14").
+
+Everything is built from native Spark expressions (regexp_extract, make_date,
+...), so normalization runs in generated code on whole columns instead of
+calling back into Python per row. Values that cannot be normalized are kept
+as written (lower-cased and trimmed), never blanked. Every cast and make_date
+is guarded by a when(), so unmatched or impossible dates fall through to that
+instead of raising under spark.sql.ansi.enabled (the default from Spark 4).
+"""
+from pyspark.sql import Column, DataFrame
+from pyspark.sql.functions import (coalesce, col, concat, create_map, current_date, date_format, dayofmonth,
+                                   last_day, length, lit, lower, make_date, regexp_extract, regexp_replace,
+                                   substring, trim, when)
+from pyspark.sql.functions import year as year_of
+
+from projection import quote_identifier
+
+# Country calling code given to national numbers
+DEFAULT_COUNTRY_CODE = "1"
+# Digits in a national number for DEFAULT_COUNTRY_CODE (NANP: 10)
+NATIONAL_DIGITS = 10
+# E.164 allows at most 15 digits; fewer than 8 is no usable number
+MIN_PHONE_DIGITS = 8
+MAX_PHONE_DIGITS = 15
+
+# "ext. 12", "x12", "#12" at the end of a phone number
+_EXTENSION_RE = r"(?i)\s*(?:ext\.?|extension|x|#)\s*\d+\s*$"
+_ISO_DATE_RE = r"^(\d{4})[-/.](\d{1,2})[-/.](\d{1,2})(?:$|[t ])"
+_COMPACT_DATE_RE = r"^(\d{4})(\d{2})(\d{2})$"
+_NUMERIC_DATE_RE = r"^(\d{1,2})([-/.])(\d{1,2})[-/.](\d{2}|\d{4})$"
+_DAY_MONTH_NAME_RE = r"^(\d{1,2})(?:st|nd|rd|th)?[ -]([a-z]{3})[a-z]*\.?,?[ -](\d{4})$"
+_MONTH_NAME_DAY_RE = r"^([a-z]{3})[a-z]*\.?[ -](\d{1,2})(?:st|nd|rd|th)?,?[ -](\d{4})$"
+_MONTHS = ("jan", "feb", "mar", "apr", "may", "jun", "jul", "aug", "sep", "oct", "nov", "dec")
+
+
+def _text(c: Column) -> Column:
+    return trim(lower(c.cast("string")))
+
+
+def normalize_phone(c: Column, country_code: str = DEFAULT_COUNTRY_CODE) -> Column:
+    """Phone number in E.164; numbers without a country code get country_code."""
+    value = regexp_replace(_text(c), _EXTENSION_RE, "")
+    digits = regexp_replace(value, r"\D", "")
+    international = value.startswith("+")
+    # 00 is the international call prefix in most of the world
+    dialled = value.startswith("00")
+    national = length(digits) == NATIONAL_DIGITS
+    # Country code written without the "+", e.g. "1 999 111 2222"
+    with_code = (length(digits) == NATIONAL_DIGITS + len(country_code)) & digits.startswith(country_code)
+    e164 = when(international, concat(lit("+"), digits)) \
+        .when(dialled, concat(lit("+"), substring(digits, 3, MAX_PHONE_DIGITS))) \
+        .when(national, concat(lit("+" + country_code), digits)) \
+        .when(with_code, concat(lit("+"), digits))
+    usable = length(e164).between(MIN_PHONE_DIGITS + 1, MAX_PHONE_DIGITS + 1)
+    return when(usable, e164).otherwise(_text(c))
+
+
+def normalize_email(c: Column) -> Column:
+    """Lower-cased email with the plus-tag of the local part removed."""
+    value = _text(c)
+    tagged = value.rlike(r"^[^@\s]+\+[^@\s]*@[^@\s]+$")
+    return when(tagged, regexp_replace(value, r"\+[^@]*@", "@")).otherwise(value)
+
+
+def _month_number(abbreviation: Column) -> Column:
+    """'jan' -> 1 ... 'dec' -> 12; null for anything else."""
+    return create_map(*[lit(v) for number, name in enumerate(_MONTHS, 1) for v in (name, number)])[abbreviation]
+
+
+def _int(digits: Column) -> Column:
+    """Integer value of a string of digits; null for "" (no regex match) or anything else."""
+    text = digits.cast("string")
+    return when(text.rlike(r"^\d{1,9}$"), text.cast("int"))
+
+
+def _year(two_or_four: Column) -> Column:
+    """Four-digit year; two-digit years are taken as 19xx unless that is over a century ago."""
+    year = _int(two_or_four)
+    century = when(year > year_of(current_date()) % 100, 1900).otherwise(2000)
+    return when(length(two_or_four) == 2, year + century).otherwise(year)
+
+
+def _iso(year: Column, month: Column, day: Column) -> Column:
+    """yyyy-MM-dd, or null for missing parts and impossible dates such as 1990-02-30."""
+    year, month, day = _int(year), _int(month), _int(day)
+    # Nested so make_date only ever sees a real month, and then a real day of it
+    month_length = when(year.between(1, 9999) & month.between(1, 12),
+                        dayofmonth(last_day(make_date(year, month, lit(1)))))
+    return when(day.between(1, month_length), date_format(make_date(year, month, day), "yyyy-MM-dd"))
+
+
+def normalize_dob(c: Column, day_first: bool = False) -> Column:
+    """
+    ISO date (yyyy-MM-dd) from the common written forms of a date.
+
+    Numeric dates with "." are read day first (14.03.1990); with "/" or "-"
+    month first (03/14/1990) unless day_first is set, or the first number
+    cannot be a month.
+    """
+    value = _text(c)
+    iso = _iso(regexp_extract(value, _ISO_DATE_RE, 1), regexp_extract(value, _ISO_DATE_RE, 2),
+               regexp_extract(value, _ISO_DATE_RE, 3))
+    compact = _iso(regexp_extract(value, _COMPACT_DATE_RE, 1), regexp_extract(value, _COMPACT_DATE_RE, 2),
+                   regexp_extract(value, _COMPACT_DATE_RE, 3))
+
+    first = regexp_extract(value, _NUMERIC_DATE_RE, 1)
+    separator = regexp_extract(value, _NUMERIC_DATE_RE, 2)
+    second = regexp_extract(value, _NUMERIC_DATE_RE, 3)
+    year = _year(regexp_extract(value, _NUMERIC_DATE_RE, 4))
+    dmy = (separator == ".") | (_int(first) > 12) | lit(day_first)
+    numeric = when(first != "", when(dmy, _iso(year, second, first)).otherwise(_iso(year, first, second)))
+
+    day_month = _iso(regexp_extract(value, _DAY_MONTH_NAME_RE, 3),
+                     _month_number(regexp_extract(value, _DAY_MONTH_NAME_RE, 2)),
+                     regexp_extract(value, _DAY_MONTH_NAME_RE, 1))
+    month_day = _iso(regexp_extract(value, _MONTH_NAME_DAY_RE, 3),
+                     _month_number(regexp_extract(value, _MONTH_NAME_DAY_RE, 1)),
+                     regexp_extract(value, _MONTH_NAME_DAY_RE, 2))
+    return coalesce(iso, compact, numeric, day_month, month_day, value)
+
+
+NORMALIZERS = {
+    "phone": normalize_phone,
+    "email": normalize_email,
+    "dob": normalize_dob,
+}
+
+
+def normalize_identifiers(df: DataFrame) -> DataFrame:
+    """Replace the phone, email and dob columns present in df with their canonical forms (one projection)."""
+    if not any(name in df.columns for name in NORMALIZERS):
+        return df
+    return df.select([
+        NORMALIZERS[name](col(quote_identifier(name))).alias(name) if name in NORMALIZERS
+        else col(quote_identifier(name))
+        for name in df.columns
+    ])
@@ -1,13 +1,37 @@
 import os
 import json
 import re
+import time
+import argparse
+import shutil
+import tempfile
+import threading
 import chardet
+from concurrent.futures import ThreadPoolExecutor, as_completed
 import xml.etree.ElementTree as ET
 from typing import Dict, List, Any, Optional
+from pyspark import StorageLevel
 from pyspark.sql import SparkSession
-from pyspark.sql.functions import col, trim, lower, sha2, concat_ws, lit, current_timestamp, when, isnan, isnull
-from pyspark.sql.types import StructType, StructField, StringType, DoubleType, FloatType, NumericType
-import pandas as pd
+from pyspark.sql.types import StructType
+from manifest import MANIFEST_PATH, FileManifest, new_run_id
+from run_stats import IngestionStats
+from projection import apply_cleaning_projection
+from schema_registry import SchemaRegistry
+from xml_reader import iter_xml_batches, iter_xml_records
+from excel_reader import excel_to_parquet, iter_sheet_batches, list_sheets
+from sql_dump import dump_to_parquet, iter_dump_records
+from arrow_spill import ArrowSpillWriter
+from file_probe import FileProber, format_from_extension, probe_file
+from key_index import KeyIndex
+from normalization import csv_dialect, flatten_dict, generate_canonical_key, normalize_columns
+from key_strategies import DEFAULT_KEY_FORMAT, KEY_FORMATS, SURROGATE_COLUMN, KeyStrategies, effective_strategy
+from key_migration import check_key_format, finish_parquet_migration, migrate_keys, parquet_key_format
+from parquet_writer import MB, commit_files, compact_dataset, dataset_files, plan_commit, write_dataset
+from run_journal import COMMITTING, PUBLISHED, PUBLISHING, RunJournal
+from streaming import STREAM_CHECKPOINT_PATH, run_streaming
+from session_planner import PROFILES, DEFAULT_PROFILE, describe, input_bytes, parse_conf_overrides, plan_session
+from compressed_io import (decompress_to, is_json_lines, open_compressed, rechunk_text, spark_reads_directly,
+                           split_compression_extension)
 
 # Utility functions for data quality
 def detect_encoding_safe(file_path: str, sample_size: int = 10000) -> str:
@@ -41,14 +65,44 @@ def sanitize_for_storage(value: Any, max_length: int = 10000) -> str:
 
 RAW_DATA_PATH = "../../data_raw/"
 OUTPUT_PATH = "../../data_processed/master_dataset/"
-
-def create_spark_session():
-    spark = SparkSession.builder \
+# Driver-side parsers spill their records here so Spark reads them from disk
+STAGING_PATH = "../../data_processed/_staging/"
+DEFAULT_XML_BATCH_SIZE = 10000
+DEFAULT_EXCEL_WORKERS = os.cpu_count() or 1
+DEFAULT_SQL_WORKERS = os.cpu_count() or 1
+DEFAULT_PROBE_WORKERS = os.cpu_count() or 1
+
+_staged_dirs: List[str] = []
+_staging_lock = threading.Lock()
+
+# Number of files ingested concurrently; 1 keeps the original sequential behaviour
+DEFAULT_PARALLELISM = 1
+FAIR_SCHEDULER_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fairscheduler.xml")
+SCHEDULER_POOL_PREFIX = "ingest"
+
+def create_spark_session(parallelism: int = DEFAULT_PARALLELISM, delta: bool = False,
+                         conf: Optional[Dict[str, str]] = None):
+    """Build the session; conf (from session_planner.plan_session) is applied on top of the fixed settings."""
+    builder = SparkSession.builder \
         .appName("UnifiedIngestionPipeline") \
         .config("spark.sql.session.timeZone", "UTC") \
         .config("spark.sql.adaptive.enabled", "true") \
-        .config("spark.sql.adaptive.coalescePartitions.enabled", "true") \
-        .getOrCreate()
+        .config("spark.sql.adaptive.coalescePartitions.enabled", "true")
+
+    for key, value in (conf or {}).items():
+        builder = builder.config(key, value)
+
+    if parallelism > 1:
+        # Concurrent per-file jobs share the cluster through FAIR scheduler pools
+        builder = builder.config("spark.scheduler.mode", "FAIR")
+        if os.path.exists(FAIR_SCHEDULER_FILE):
+            builder = builder.config("spark.scheduler.allocation.file", FAIR_SCHEDULER_FILE)
+
+    if delta:
+        from delta_output import configure_delta
+        builder = configure_delta(builder)
+
+    spark = builder.getOrCreate()
     return spark
 
 def detect_encoding(file_path: str) -> str:
@@ -57,73 +111,15 @@ def detect_encoding(file_path: str) -> str:
 
 def detect_format(path: str) -> Optional[str]:
     """Detect file format based on extension."""
-    path_lower = path.lower()
-    if path_lower.endswith(".csv"):
-        return "csv"
-    if path_lower.endswith(".json") or path_lower.endswith(".jsonl"):
-        return "json"
-    if path_lower.endswith(".parquet"):
-        return "parquet"
-    if path_lower.endswith(".xml"):
-        return "xml"
-    if path_lower.endswith((".xlsx", ".xls")):
-        return "excel"
-    if path_lower.endswith((".sql", ".dump")):
-        return "sql"
-    return None
-
-def flatten_dict(d: Dict, parent_key: str = '', sep: str = '_') -> Dict:
-    """Flatten nested dictionary structures."""
-    items = []
-    for k, v in d.items():
-        new_key = f"{parent_key}{sep}{k}" if parent_key else k
-        if isinstance(v, dict):
-            items.extend(flatten_dict(v, new_key, sep=sep).items())
-        elif isinstance(v, list):
-            # Handle lists by converting to string or taking first element
-            if len(v) > 0 and isinstance(v[0], dict):
-                # If list of dicts, flatten the first one
-                items.extend(flatten_dict(v[0], new_key, sep=sep).items())
-            else:
-                items.append((new_key, str(v) if v else ""))
-        else:
-            items.append((new_key, v))
-    return dict(items)
+    return format_from_extension(path)
 
-def read_xml_to_dicts(file_path: str) -> List[Dict]:
+def read_xml_to_dicts(file_path: str, record_path: Optional[str] = None) -> List[Dict]:
     """Read XML file and convert to list of dictionaries."""
     records = []
     try:
-        encoding = detect_encoding(file_path)
-        tree = ET.parse(file_path)
-        root = tree.getroot()
-        
-        # Try to find repeating elements (common pattern)
-        # Look for direct children that might be records
-        for child in root:
-            record = {}
-            for elem in child.iter():
-                if elem.text and elem.text.strip():
-                    # Use tag name as key, handle nested tags
-                    key = elem.tag
-                    if key in record:
-                        # If duplicate key, make it a list or append
-                        if not isinstance(record[key], list):
-                            record[key] = [record[key]]
-                        record[key].append(elem.text.strip())
-                    else:
-                        record[key] = elem.text.strip()
-            if record:
-                records.append(flatten_dict(record))
-        
-        # If no records found, try treating root as single record
-        if not records:
-            record = {}
-            for elem in root.iter():
-                if elem.text and elem.text.strip() and elem.tag != root.tag:
-                    record[elem.tag] = elem.text.strip()
-            if record:
-                records.append(flatten_dict(record))
+        # Repeating elements (by default the root's direct children) are records
+        for record in iter_xml_records(file_path, record_path):
+            records.append(flatten_dict(record))
                 
     except ET.ParseError as e:
         print(f"⚠ XML parsing error in {file_path}: {e}")
@@ -138,134 +134,146 @@ def read_excel_to_dicts(file_path: str) -> List[Dict]:
     """Read Excel file and convert to list of dictionaries."""
     records = []
     try:
-        # Try reading all sheets
-        excel_file = pd.ExcelFile(file_path, engine='openpyxl')
-        for sheet_name in excel_file.sheet_names:
-            df = pd.read_excel(excel_file, sheet_name=sheet_name, engine='openpyxl')
-            # Convert to dict, handling nested structures
-            for _, row in df.iterrows():
-                record = row.to_dict()
-                # Flatten any nested structures
-                flattened = flatten_dict(record)
-                records.append(flattened)
+        # Read all sheets through the streaming columnar reader
+        for sheet_name in list_sheets(file_path):
+            for batch in iter_sheet_batches(file_path, sheet_name):
+                records.extend(batch.to_pylist())
     except Exception as e:
         print(f"⚠ Error reading Excel {file_path}: {e}")
         return []
     return records
 
-def parse_sql_dump(file_path: str) -> List[Dict]:
+def parse_sql_dump(file_path: str, encoding: Optional[str] = None) -> List[Dict]:
     """Parse SQL INSERT statements from dump file with robust error handling."""
-    records = []
     try:
-        encoding = detect_encoding(file_path)
-        with open(file_path, 'r', encoding=encoding, errors='ignore') as f:
-            content = f.read()
-            
-        # Pattern to match INSERT INTO ... VALUES (...)
-        # Handle multi-line INSERT statements
-        insert_pattern = r'INSERT\s+INTO\s+(\w+)\s*\(([^)]+)\)\s*VALUES\s*(.+?)(?=INSERT|$)'
-        matches = re.finditer(insert_pattern, content, re.IGNORECASE | re.MULTILINE | re.DOTALL)
-        
-        for match in matches:
-            try:
-                table_name = match.group(1)
-                columns_str = match.group(2)
-                values_str = match.group(3)
-                
-                # Extract column names
-                columns = [col.strip().strip('`"\'') for col in columns_str.split(',')]
-                
-                # Parse VALUES - handle multiple rows
-                # Split by ),( or just ) for single row
-                value_rows = re.split(r'\),\s*\(', values_str)
-                
-                for row_str in value_rows:
-                    # Clean up row string
-                    row_str = row_str.strip().strip('()')
-                    
-                    # Parse values - handle quoted strings properly
-                    values = []
-                    current_value = ""
-                    in_quotes = False
-                    quote_char = None
-                    
-                    for char in row_str:
-                        if char in ['"', "'"] and (not in_quotes or char == quote_char):
-                            in_quotes = not in_quotes
-                            quote_char = char if in_quotes else None
-                            current_value += char
-                        elif char == ',' and not in_quotes:
-                            values.append(current_value.strip().strip("'\"`"))
-                            current_value = ""
-                        else:
-                            current_value += char
-                    
-                    # Add last value
-                    if current_value:
-                        values.append(current_value.strip().strip("'\"`"))
-                    
-                    # Create record with column names
-                    if len(values) == len(columns):
-                        record = {normalize_field_name(col): sanitize_for_storage(val) 
-                                 for col, val in zip(columns, values)}
-                        records.append(flatten_dict(record))
-                    elif len(values) > 0:
-                        # Mismatch - create record with available columns
-                        record = {normalize_field_name(columns[i]): sanitize_for_storage(val) 
-                                 for i, val in enumerate(values) if i < len(columns)}
-                        records.append(flatten_dict(record))
-                        
-            except Exception as e:
-                continue  # Skip malformed INSERT statements
-                
+        encoding = encoding or detect_encoding(file_path)
+        # Streamed by the sql_dump tokenizer; each record keeps its source_table
+        return [flatten_dict(record) for record in iter_dump_records(file_path, encoding)]
     except Exception as e:
         print(f"⚠ Error parsing SQL dump {file_path}: {e}")
         return []
-    
-    return records
 
-def read_file(spark: SparkSession, path: str):
-    """Read file with robust error handling and format support."""
-    fmt = detect_format(path)
-    
+def new_staging_dir(source_path: str) -> str:
+    """Create a staging directory for one source file, removed by cleanup_staging()."""
+    os.makedirs(STAGING_PATH, exist_ok=True)
+    staged_dir = tempfile.mkdtemp(prefix=os.path.basename(source_path) + "-", dir=STAGING_PATH)
+    with _staging_lock:
+        _staged_dirs.append(staged_dir)
+    return staged_dir
+
+def stage_records(batches, source_path: str) -> Optional[str]:
+    """
+    Convert record batches to Arrow and spill them as Parquet part files to a
+    fresh staging directory. Returns the directory (None if there were no records).
+
+    Staged files must outlive the lazy Spark read; call cleanup_staging()
+    once the output has been written.
+    """
+    staged_dir = new_staging_dir(source_path)
+    with ArrowSpillWriter(staged_dir) as sink:
+        for batch in batches:
+            sink.write_records(batch)
+    return staged_dir if sink.rows else None
+
+def cleanup_staging():
+    """Remove every staging directory created by this process."""
+    with _staging_lock:
+        for staged_dir in _staged_dirs:
+            shutil.rmtree(staged_dir, ignore_errors=True)
+        _staged_dirs.clear()
+
+def spark_text_source(path: str, probe: Dict[str, Any], fmt: str) -> str:
+    """
+    Path Spark should read for a CSV/JSON file.
+
+    Plain files, bzip2 and small gzip files are read as they are. Large gzip
+    files (which Spark cannot split) and zstd/xz files are streamed into plain
+    part files in a staging directory so Spark reads them with many tasks.
+    JSON that is not JSON Lines (e.g. an array) is decompressed into a single
+    part, since cutting it between lines would break records.
+    """
+    compression = probe["compression"]
+    if spark_reads_directly(path, compression, probe["size"]):
+        return path
+    staged_dir = new_staging_dir(path)
+    # Cutting between lines is only safe when no record spans lines and "\n" is one byte
+    split = not probe.get("multiline") and not (probe["encoding"] or "").lower().startswith("utf-16") \
+        and (fmt != "json" or is_json_lines(path, compression))
+    parts = rechunk_text(path, compression, staged_dir, suffix=f".{fmt}", repeat_header=fmt == "csv", split=split)
+    print(f"🗜  Re-chunked {os.path.basename(path)} ({compression}) into {len(parts)} part(s)")
+    return staged_dir
+
+def local_copy(path: str, compression: Optional[str]) -> str:
+    """Decompressed copy of a file in a staging directory, for readers that need a real file."""
+    if compression is None:
+        return path
+    name = split_compression_extension(os.path.basename(path))[0]
+    return decompress_to(path, compression, os.path.join(new_staging_dir(path), name))
+
+def _with_schema(reader, schema: Optional[StructType]):
+    """Use an explicit schema when one is known, otherwise fall back to inference."""
+    if schema is not None:
+        return reader.schema(schema)
+    return reader.option("inferSchema", "true")
+
+def read_file(spark: SparkSession, path: str, stats: Optional[IngestionStats] = None,
+              schemas: Optional[SchemaRegistry] = None, xml_record_path: Optional[str] = None,
+              xml_batch_size: int = DEFAULT_XML_BATCH_SIZE, excel_workers: int = DEFAULT_EXCEL_WORKERS,
+              sql_workers: int = DEFAULT_SQL_WORKERS, probes: Optional[FileProber] = None):
+    """
+    Read file with robust error handling and format support.
+
+    When a stats collector is given, row and corrupt-row counts are attached as
+    observed metrics and filled in by whichever action later executes the plan.
+    When a schema registry is given, CSV/JSON files with a declared or cached
+    schema are read with it instead of running schema inference.
+    XML is streamed; xml_record_path selects the record elements (see xml_reader).
+    Excel sheets are converted to Parquet by up to excel_workers processes.
+    SQL dumps are tokenized in chunks; large dumps are split into byte ranges
+    parsed by up to sql_workers processes.
+    Format, encoding and CSV header come from the file's probe (shared via
+    probes when given), so the file is not opened again just to sniff it.
+    """
+    probe = probes.get(path) if probes is not None else probe_file(path)
+    fmt = probe["format"]
+
     if fmt is None:
         print(f"⚠ Unsupported format: {path}")
         return None
 
     # ---------- SAFETY CHECKS BEFORE SPARK ----------
+    explicit_schema = schemas.resolve(path, fmt) if schemas is not None else None
     try:
-        encoding = detect_encoding(path)
+        if "error" in probe:
+            raise OSError(probe["error"])
+        encoding = probe["encoding"] or "utf-8"
         
         if fmt == "csv":
-            # Try reading first line safely
-            with open(path, 'r', encoding=encoding, errors='ignore') as f:
-                first_line = f.readline()
-                if not first_line or ("," not in first_line and ";" not in first_line and "\t" not in first_line):
-                    print(f"⚠ Skipping corrupt CSV: {path}")
-                    return None
+            # The probe found no delimiter in the leading lines
+            if probe["delimiter"] is None:
+                print(f"⚠ Skipping corrupt CSV: {path}")
+                return None
+            # A registered schema is only trusted if the header still matches it
+            if explicit_schema is not None:
+                if not schemas.check_header(path, explicit_schema, probe["header"]):
+                    explicit_schema = None
 
         elif fmt == "json":
-            # Try loading first JSON line
-            with open(path, "r", encoding=encoding, errors="ignore") as f:
-                line = f.readline().strip()
-                if line and not (line.startswith("{") or line.startswith("[")):
-                    print(f"⚠ Skipping corrupt JSON: {path}")
-                    return None
+            # Content must open a JSON object or array
+            if probe["size"] and probe["content_format"] != "json":
+                print(f"⚠ Skipping corrupt JSON: {path}")
+                return None
 
         elif fmt == "xml":
-            # Basic XML validation
-            try:
-                ET.parse(path)
-            except ET.ParseError:
-                print(f"⚠ Skipping corrupt XML: {path}")
-                return None
+            # Validated while streaming; a parse error skips the whole file
+            pass
                 
         elif fmt == "excel":
             # Excel files will be validated by pandas
             pass
             
         elif fmt == "sql":
-            # SQL dumps will be parsed manually
+            # Tokenized while streaming; malformed statements are skipped
             pass
             
         elif fmt == "parquet":
@@ -276,60 +284,63 @@ def read_file(spark: SparkSession, path: str):
         return None
 
     # ---------- READ WITH SPARK OR PANDAS ----------
+    compression = probe["compression"]
     try:
         if fmt == "csv":
-            # Try multiple delimiters and handle encoding issues
-            df = spark.read.option("header", "true") \
-                .option("inferSchema", "true") \
+            # Dialect sniffed by the probe, so the file is scanned exactly once
+            dialect = csv_dialect(probe)
+            if stats is not None:
+                stats.record_file(path, dialect=dialect)
+            df = _with_schema(spark.read, explicit_schema).option("header", "true") \
                 .option("mode", "PERMISSIVE") \
                 .option("columnNameOfCorruptRecord", "_corrupt_record") \
                 .option("encoding", encoding) \
-                .csv(path)
-            
-            # Handle multiple delimiter attempts
-            if df.count() == 0:
-                # Try semicolon delimiter
-                df = spark.read.option("header", "true") \
-                    .option("inferSchema", "true") \
-                    .option("mode", "PERMISSIVE") \
-                    .option("delimiter", ";") \
-                    .option("columnNameOfCorruptRecord", "_corrupt_record") \
-                    .csv(path)
+                .option("sep", dialect["delimiter"]) \
+                .option("quote", dialect["quote"]) \
+                .option("escape", dialect["escape"]) \
+                .option("multiLine", str(dialect["multiline"]).lower()) \
+                .csv(spark_text_source(path, probe, fmt))
 
         elif fmt == "json":
             # Handle both JSON arrays and JSONL
-            df = spark.read.option("inferSchema", "true") \
+            df = _with_schema(spark.read, explicit_schema) \
                 .option("mode", "PERMISSIVE") \
                 .option("columnNameOfCorruptRecord", "_corrupt_record") \
-                .json(path)
+                .json(spark_text_source(path, probe, fmt))
 
         elif fmt == "parquet":
-            df = spark.read.parquet(path)
+            df = spark.read.parquet(local_copy(path, compression))
 
         elif fmt == "xml":
-            # Convert XML to JSON-like structure first
-            records = read_xml_to_dicts(path)
-            if not records:
+            # Stream records in fixed-size batches into staged Arrow/Parquet
+            # files, so driver memory stays flat regardless of file size
+            try:
+                with open_compressed(path, compression) as source:
+                    staged_dir = stage_records(
+                        (map(flatten_dict, batch) for batch in iter_xml_batches(source, xml_record_path, xml_batch_size)),
+                        path,
+                    )
+            except ET.ParseError as e:
+                print(f"⚠ Skipping corrupt XML: {path} - {e}")
+                return None
+            if staged_dir is None:
                 return None
-            # Convert to pandas then Spark
-            pdf = pd.DataFrame(records)
-            df = spark.createDataFrame(pdf)
+            df = spark.read.option("mergeSchema", "true").parquet(staged_dir)
 
         elif fmt == "excel":
-            # Read Excel via pandas, then convert to Spark
-            records = read_excel_to_dicts(path)
-            if not records:
+            # Sheets are converted to Parquet in parallel worker processes
+            workbook = local_copy(path, compression)
+            staged_dir = new_staging_dir(path)
+            if not excel_to_parquet(workbook, staged_dir, workers=excel_workers):
                 return None
-            pdf = pd.DataFrame(records)
-            df = spark.createDataFrame(pdf)
+            df = spark.read.option("mergeSchema", "true").parquet(staged_dir)
 
         elif fmt == "sql":
-            # Parse SQL dump
-            records = parse_sql_dump(path)
-            if not records:
+            # Tokenize the dump straight into staged Arrow/Parquet, never holding it in memory
+            staged_dir = new_staging_dir(path)
+            if not dump_to_parquet(path, staged_dir, encoding, workers=sql_workers, compression=compression):
                 return None
-            pdf = pd.DataFrame(records)
-            df = spark.createDataFrame(pdf)
+            df = spark.read.option("mergeSchema", "true").parquet(staged_dir)
 
         else:
             return None
@@ -339,133 +350,598 @@ def read_file(spark: SparkSession, path: str):
         print(f"Reason: {e}")
         return None
 
+    # Remember inferred schemas so the next read of this content skips inference
+    if schemas is not None and explicit_schema is None:
+        schemas.register(path, fmt, df.schema)
+
     # ---------- DROP CORRUPT RECORDS IF EXIST ----------
+    # Counted via observed metrics rather than a separate count() job
+    if stats is not None:
+        df = stats.observe_source(df, path, fmt)
     if "_corrupt_record" in df.columns:
-        corrupt_count = df.filter(df["_corrupt_record"].isNotNull()).count()
-        if corrupt_count > 0:
-            print(f"⚠ Found {corrupt_count} corrupt rows in {path}, dropping them.")
         df = df.filter(df["_corrupt_record"].isNull()).drop("_corrupt_record")
 
-    # ---------- HANDLE MISSING FIELDS AND NULL VALUES ----------
-    # Fill null values with empty strings for string columns
-    for col_name in df.columns:
-        df = df.withColumn(col_name, when(col(col_name).isNull(), lit("")).otherwise(col(col_name)))
-        # Only apply isnan() to numeric columns (DoubleType, FloatType, etc.)
-        # isnan() only works on numeric types and will fail on string columns
-        field = next((f for f in df.schema.fields if f.name == col_name), None)
-        if field and isinstance(field.dataType, (DoubleType, FloatType)):
-            df = df.withColumn(col_name, when(isnan(col(col_name)), lit("")).otherwise(col(col_name)))
-
-    # ---------- FLATTEN NESTED STRUCTURES ----------
-    # Spark automatically handles nested structures, but we ensure they're flattened
-    # by converting complex types to strings if needed
-    for field in df.schema.fields:
-        if str(field.dataType).startswith("StructType") or str(field.dataType).startswith("ArrayType"):
-            # Convert nested structures to JSON strings
-            df = df.withColumn(field.name, when(col(field.name).isNotNull(), 
-                                                 col(field.name).cast("string")).otherwise(lit("")))
+    # ---------- HANDLE MISSING FIELDS, NULL VALUES AND NESTED STRUCTURES ----------
+    # One select for every column: nulls/NaNs become empty strings and nested
+    # structs/arrays are stringified. Parquet keeps its schema as-is.
+    df = apply_cleaning_projection(df, fmt)
 
     return df
 
 
-def normalize_columns(df):
-    """Normalize column names and values."""
-    # Normalize typical fields if they exist
-    mapping = {
-        "fname": "first_name",
-        "lname": "last_name",
-        "full_name": "name",
-        "email_address": "email",
-        "e_mail": "email",
-        "phone_number": "phone",
-        "mobile": "phone",
-        "date_of_birth": "dob",
-        "birth_date": "dob",
-    }
-
-    for old, new in mapping.items():
-        if old in df.columns and new not in df.columns:
-            df = df.withColumnRenamed(old, new)
-
-    # Lowercase / trim typical fields
-    for field in ["name", "first_name", "last_name", "email", "phone"]:
-        if field in df.columns:
-            df = df.withColumn(field, trim(lower(col(field))))
+def process_file(spark: SparkSession, file_path: str, key_strategies: Optional[KeyStrategies] = None,
+                 **read_options):
+    """
+    Read, normalize and key a single raw file. Row counts are observed, not counted.
 
-    # Add ingestion timestamp
-    df = df.withColumn("ingest_timestamp", current_timestamp())
+    The file's key strategy comes from key_strategies when given.
+    read_options are passed straight through to read_file.
+    """
+    df = read_file(spark, file_path, **read_options)
+    if df is None:
+        return None
 
+    df = normalize_columns(df)
+    strategy = key_strategies.resolve(file_path) if key_strategies is not None else None
+    if read_options.get("stats") is not None:
+        read_options["stats"].record_file(file_path, key_strategy=effective_strategy(df, strategy)["strategy"])
+    df = generate_canonical_key(df, strategy)
     return df
 
-def generate_canonical_key(df):
-    """Create deterministic hash for deduplication."""
-    key_cols = []
-
-    for c in ["name", "email", "phone", "dob"]:
-        if c in df.columns:
-            key_cols.append(col(c))
-
-    if len(key_cols) == 0:
-        df = df.withColumn("canonical_key", sha2(lit("no_key"), 256))
-        return df
-
-    return df.withColumn(
-        "canonical_key",
-        sha2(concat_ws("||", *key_cols), 256)
-    )
-
+def checkpoint_output(spark: SparkSession, journal: RunJournal, key: str, df, paths: List[str],
+                      stats: Optional[IngestionStats] = None):
+    """Stage df in the run's work directory and continue from the staged copy."""
+    df = journal.stage(spark, key, df, paths)
+    if stats is not None:
+        # Staging executed the source, so its observed counts are final
+        metrics = stats.source_metrics(key)
+        stats.record_file(key, **metrics)
+        journal.record_metrics(key, metrics)
+    return df
 
-def main():
-    spark = create_spark_session()
+def commit_output(spark: SparkSession, journal: RunJournal, key_index: Optional[KeyIndex],
+                  published_df=None):
+    """
+    Move a run's Parquet output from its work directory into the master
+    dataset and add its keys to the key index. Only what the journal has not
+    recorded as done is done, so a resumed run finishes a commit without
+    publishing anything twice. published_df is the written data, if still at
+    hand; otherwise the committed files are read back.
+    """
+    commit = journal.extra["commit"]
+    commit_files(commit)
+    if key_index is not None and not journal.extra.get("keys_indexed"):
+        files = [final for _, final in commit["moves"]]
+        if published_df is None and files:
+            published_df = spark.read.parquet(*files)
+        if published_df is not None and "canonical_key" in published_df.columns:
+            key_index.add(published_df, mode=commit["mode"])
+        journal.set_status(COMMITTING, keys_indexed=True)
+
+
+def resumed_result(spark: SparkSession, journal: RunJournal, key: str,
+                   stats: Optional[IngestionStats] = None) -> Dict[str, Any]:
+    """Result entry for output a previous attempt of this run already staged."""
+    entry = journal.entries[key]
+    print(f"♻ Reusing staged output of {os.path.basename(key)}")
+    if stats is not None:
+        stats.record_file(key, pool="resumed", ok=True, resumed=True, **entry["metrics"])
+    return {
+        "file": os.path.basename(key),
+        "path": key,
+        "paths": entry["paths"],
+        "df": journal.read_staged(spark, key),
+        "seconds": 0.0,
+        "pool": "resumed",
+        "error": None,
+    }
 
-    all_dfs = []
+def _timed_process_file(spark: SparkSession, file_path: str, pool: Optional[str] = None,
+                        journal: Optional[RunJournal] = None, **read_options) -> Dict[str, Any]:
+    """Run process_file under an optional FAIR scheduler pool and record its timing."""
+    stats = read_options.get("stats")
+    if pool is not None:
+        spark.sparkContext.setLocalProperty("spark.scheduler.pool", pool)
 
-    print("\n🔍 Scanning raw data folder...")
-    for file in os.listdir(RAW_DATA_PATH):
-        file_path = os.path.join(RAW_DATA_PATH, file)
+    file = os.path.basename(file_path)
+    print(f"📥 Reading {file} as {detect_format(file_path)}...")
+    started = time.time()
+    try:
+        df = process_file(spark, file_path, **read_options)
+        if df is not None and journal is not None:
+            df = checkpoint_output(spark, journal, file_path, df, [file_path], stats)
+        error = None
+    except Exception as e:
+        df, error = None, str(e)
+    finally:
+        if pool is not None:
+            spark.sparkContext.setLocalProperty("spark.scheduler.pool", None)
+
+    if df is None:
+        print(f"❌ Could not read: {file}")
+        if stats is not None:
+            stats.forget(file_path)
+
+    result = {
+        "file": file,
+        "path": file_path,
+        "df": df,
+        "seconds": time.time() - started,
+        "pool": pool or "default",
+        "error": error,
+    }
+    if stats is not None:
+        stats.record_file(file_path, read_seconds=round(result["seconds"], 3),
+                          pool=result["pool"], error=error, ok=df is not None)
+    return result
+
+def ingest_files(spark: SparkSession, file_paths: List[str], parallelism: int = DEFAULT_PARALLELISM,
+                 journal: Optional[RunJournal] = None, **read_options) -> List[Dict[str, Any]]:
+    """
+    Ingest files either sequentially or through a bounded worker pool.
+
+    With parallelism > 1 each worker thread submits its file's Spark jobs
+    under its own FAIR scheduler pool, so small files are not starved
+    behind large ones. With a journal, each file's output is staged as soon
+    as it is read. Results are returned in input order.
+    """
+    if parallelism <= 1 or len(file_paths) <= 1:
+        return [_timed_process_file(spark, path, None, journal, **read_options) for path in file_paths]
+
+    workers = min(parallelism, len(file_paths))
+    results: List[Optional[Dict[str, Any]]] = [None] * len(file_paths)
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix=SCHEDULER_POOL_PREFIX) as executor:
+        futures = {
+            executor.submit(_timed_process_file, spark, path, f"{SCHEDULER_POOL_PREFIX}_{i % workers}", journal,
+                            **read_options): i
+            for i, path in enumerate(file_paths)
+        }
+        for future in as_completed(futures):
+            results[futures[future]] = future.result()
+    return results
+
+def print_timing_summary(results: List[Dict[str, Any]], wall_seconds: float, stats: Optional[IngestionStats] = None):
+    """Print per-file read timings (slowest first) with observed row counts when available."""
+    if not results:
+        return
+    print("\n⏱  Per-file timing summary:")
+    print(f"   {'file':<40} {'pool':<10} {'records':>10} {'corrupt':>8} {'read s':>9}")
+    for r in sorted(results, key=lambda r: r["seconds"], reverse=True):
+        status = "" if r["df"] is not None else "  (failed)"
+        info = stats.files.get(r["path"], {}) if stats is not None else {}
+        records = info.get("rows", "-")
+        corrupt = info.get("corrupt_rows", "-")
+        print(f"   {r['file'][:40]:<40} {r['pool']:<10} {records:>10} {corrupt:>8} {r['seconds']:>9.2f}{status}")
+        # A grouped read is one timing, but its files are counted one by one
+        for counts in info.get("file_counts", []):
+            print(f"     {counts['file'][:38]:<38} {'':<10} {counts['rows']:>10} {counts['corrupt_rows']:>8}")
+    busy = sum(r["seconds"] for r in results)
+    print(f"   Total file time: {busy:.2f}s, wall time: {wall_seconds:.2f}s")
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Unified raw data ingestion pipeline")
+    parser.add_argument("--parallelism", type=int, default=DEFAULT_PARALLELISM,
+                        help="Number of files ingested concurrently (default: %(default)s)")
+    parser.add_argument("--no-schema-cache", action="store_true",
+                        help="Ignore cached inferred schemas and infer CSV/JSON schemas again")
+    parser.add_argument("--xml-record-path", default=None,
+                        help="XML record elements: a path like 'catalog/customers/customer' or a bare tag "
+                             "(default: direct children of the root)")
+    parser.add_argument("--xml-batch-size", type=int, default=DEFAULT_XML_BATCH_SIZE,
+                        help="Records per staged batch when streaming XML (default: %(default)s)")
+    parser.add_argument("--excel-workers", type=int, default=DEFAULT_EXCEL_WORKERS,
+                        help="Worker processes converting Excel sheets in parallel (default: %(default)s)")
+    parser.add_argument("--probe-workers", type=int, default=DEFAULT_PROBE_WORKERS,
+                        help="Worker processes probing files before the read (default: %(default)s)")
+    parser.add_argument("--sql-workers", type=int, default=DEFAULT_SQL_WORKERS,
+                        help="Worker processes parsing byte ranges of large SQL dumps (default: %(default)s)")
+    parser.add_argument("--pack-small-files", action="store_true",
+                        help="Concatenate small plain UTF-8 CSV/JSONL files into larger packs before probing; "
+                             "packed rows get a source_file column")
+    parser.add_argument("--pack-target-mb", type=int, default=128,
+                        help="Target size of a pack of small files, in MB (default: %(default)s)")
+    parser.add_argument("--executor-parsing", action="store_true",
+                        help="Parse XML, Excel and SQL files on the Spark executors instead of the driver "
+                             "(raw files must be readable from every executor)")
+    parser.add_argument("--no-grouped-reads", action="store_true",
+                        help="Read every CSV/JSON file on its own instead of one multi-path read per group "
+                             "of files with the same format and dialect")
+    parser.add_argument("--union-checkpoint-levels", type=int, default=None,
+                        help="Local-checkpoint partial unions every N levels of the union tree "
+                             "(default 6; 0 disables)")
+    parser.add_argument("--no-key-index", action="store_true",
+                        help="Only deduplicate within this run, not against keys already published")
+    parser.add_argument("--entity-resolution", action="store_true",
+                        help="Link near-duplicate records (fuzzy name, shared phone/email) under an entity_id")
+    parser.add_argument("--er-threshold", type=float, default=0.7,
+                        help="Minimum match score (0-1) for --entity-resolution to link two records "
+                             "(default: %(default)s)")
+    parser.add_argument("--target-file-mb", type=int, default=256,
+                        help="Target size of master dataset files in MB (default: %(default)s)")
+    parser.add_argument("--row-group-mb", type=int, default=64,
+                        help="Parquet row group size in MB (default: %(default)s)")
+    parser.add_argument("--partition-by-date", action="store_true",
+                        help="Partition the master dataset by ingest_date (takes effect on the first run "
+                             "or a --full-refresh)")
+    parser.add_argument("--compact", action="store_true",
+                        help="Merge small files of the master dataset into --target-file-mb files and exit "
+                             "(OPTIMIZE ... ZORDER BY with --output-format delta)")
+    parser.add_argument("--key-format", choices=KEY_FORMATS, default=DEFAULT_KEY_FORMAT,
+                        help="canonical_key encoding: hex (64-char SHA-256), sha256-128 (first 16 bytes of it, "
+                             "binary) or xxhash-128 (16-byte binary, faster) (default: %(default)s)")
+    parser.add_argument("--migrate-keys", action="store_true",
+                        help="Convert the published hex canonical keys to --key-format sha256-128 and exit")
+    parser.add_argument("--output-format", choices=["parquet", "delta"], default="parquet",
+                        help="parquet: files in data_processed/master_dataset/; delta: MERGE into the Delta "
+                             "table data_processed/master_delta/ (default: %(default)s)")
+    parser.add_argument("--optimize", action="store_true",
+                        help="With --output-format delta, run OPTIMIZE ... ZORDER BY after the merge")
+    parser.add_argument("--zorder-by", nargs="+", default=["canonical_key"],
+                        help="Columns the Delta table is Z-ordered by (default: %(default)s)")
+    parser.add_argument("--profile", choices=sorted(PROFILES), default=DEFAULT_PROFILE,
+                        help="Spark settings profile; partitions, split size and driver memory are then "
+                             "sized from the input (default: %(default)s)")
+    parser.add_argument("--cores", type=int, default=None,
+                        help="Cores the session plan assumes (default: this machine's for local, "
+                             "the profile's for cluster and large-backfill)")
+    parser.add_argument("--spark-conf", action="append", metavar="KEY=VALUE",
+                        help="Spark setting that overrides the session plan; repeatable")
+    parser.add_argument("--resume", metavar="RUN_ID", default=None,
+                        help="Continue this failed run, reusing the files it already staged "
+                             "(default: the latest unfinished run, if any)")
+    parser.add_argument("--no-checkpoint", action="store_true",
+                        help="Do not stage each file's output or keep a run journal; a failed run starts over")
+    parser.add_argument("--full-refresh", action="store_true",
+                        help="Ignore the manifest, re-ingest every file and overwrite the master dataset")
+
+    streaming = parser.add_argument_group("streaming mode")
+    streaming.add_argument("--stream", action="store_true",
+                           help="Continuously ingest new CSV/JSON/Parquet files with Structured Streaming")
+    streaming.add_argument("--trigger-interval", default="30 seconds",
+                           help="Micro-batch trigger interval (default: %(default)s)")
+    streaming.add_argument("--max-files-per-trigger", type=int, default=100,
+                           help="Max new files per format picked up by one micro-batch (default: %(default)s)")
+    streaming.add_argument("--dedup-retention", default=None,
+                           help="Keep canonical_key dedup state only this long, e.g. '7 days' (default: forever)")
+    streaming.add_argument("--checkpoint-dir", default=STREAM_CHECKPOINT_PATH,
+                           help="Streaming checkpoint location (default: %(default)s)")
+    return parser.parse_args(argv)
+
+def main(argv=None):
+    args = parse_args(argv)
+    delta = args.output_format == "delta"
+    overrides = parse_conf_overrides(args.spark_conf)
+
+    def start_session(paths: List[str]):
+        # Settings depend on how much is about to be read, so the session starts only once that is known
+        plan = plan_session(input_bytes(paths), args.profile, args.cores, overrides)
+        print(f"⚙  Spark session: {describe(plan)}")
+        return create_spark_session(args.parallelism, delta=delta, conf=plan["conf"]), plan
+
+    if args.stream:
+        spark, _ = start_session([os.path.join(RAW_DATA_PATH, name) for name in os.listdir(RAW_DATA_PATH)])
+    elif args.compact or args.migrate_keys:
+        from delta_output import DELTA_PATH
+        spark, _ = start_session(dataset_files(DELTA_PATH if delta else OUTPUT_PATH))
+
+    if args.stream:
+        run_streaming(spark, RAW_DATA_PATH, OUTPUT_PATH,
+                      checkpoint_path=args.checkpoint_dir,
+                      trigger_interval=args.trigger_interval,
+                      max_files_per_trigger=args.max_files_per_trigger,
+                      dedup_retention=args.dedup_retention,
+                      partition_by_date=args.partition_by_date,
+                      row_group_bytes=args.row_group_mb * MB,
+                      key_format=args.key_format,
+                      manifest_path=MANIFEST_PATH,
+                      use_key_index=not args.no_key_index)
+        return
 
-        fmt = detect_format(file_path)
-        if fmt is None:
-            print(f"⚠ Skipping unsupported file: {file}")
-            continue
+    if args.migrate_keys:
+        from delta_output import DELTA_PATH
+        migrated = migrate_keys(spark, args.key_format, OUTPUT_PATH, DELTA_PATH if delta else None,
+                                target_file_bytes=args.target_file_mb * MB, row_group_bytes=args.row_group_mb * MB)
+        print(f"\n✅ KEY MIGRATION COMPLETE ({', '.join(migrated) or 'nothing to migrate'})")
+        return
 
-        print(f"📥 Reading {file} as {fmt}...")
-        df = read_file(spark, file_path)
+    if args.compact and delta:
+        from delta_output import DELTA_PATH, optimize_table
+        result = optimize_table(spark, DELTA_PATH, zorder_by=args.zorder_by)
+        print(f"\n✅ OPTIMIZE COMPLETE ({result['files_removed']} files -> {result['files_added']})")
+        return
 
-        if df is None:
-            print(f"❌ Could not read: {file}")
-            continue
+    if args.compact:
+        print(f"\n🗜 Compacting {OUTPUT_PATH}...")
+        compacted = compact_dataset(spark, OUTPUT_PATH, target_file_bytes=args.target_file_mb * MB,
+                                    row_group_bytes=args.row_group_mb * MB)
+        for entry in compacted:
+            print(f"   {entry['partition']}: {entry['files_in']} files -> {entry['files_out']}")
+        print(f"\n✅ COMPACTION COMPLETE ({len(compacted)} partition(s) rewritten)")
+        return
 
-        print(f"   ✓ Loaded {df.count()} records")
+    # A run that died is continued where it stopped: files it already staged are not read again
+    journal = None
+    if args.resume:
+        journal = RunJournal.load(args.resume)
+    elif not args.no_checkpoint:
+        journal = RunJournal.latest_unfinished()
+    if journal is not None:
+        run_id = journal.run_id
+        # Staged outputs already hold keys in the format the run started with
+        journal.check_key_format(args.key_format)
+        print(f"♻ Resuming run {run_id} ({len(journal.entries)} staged output(s), stopped while {journal.status})")
+    else:
+        run_id = new_run_id()
+        journal = RunJournal(run_id, key_format=args.key_format) if not args.no_checkpoint else None
+    stats = IngestionStats(run_id)
+
+    manifest = FileManifest.load(MANIFEST_PATH)
+    if args.full_refresh:
+        manifest.reset()
+    schemas = SchemaRegistry(use_cache=not args.no_schema_cache)
+    key_strategies = KeyStrategies(key_format=args.key_format, run_id=run_id)
+    prober = FileProber()
+
+    print(f"\n🔍 Scanning raw data folder... (run {run_id})")
+    with stats.stage("scan"):
+        file_paths = []
+        for file in sorted(os.listdir(RAW_DATA_PATH)):
+            file_path = os.path.join(RAW_DATA_PATH, file)
+
+            fmt = detect_format(file_path)
+            if fmt is None:
+                print(f"⚠ Skipping unsupported file: {file}")
+                continue
+            file_paths.append(file_path)
+
+        to_process, skipped = manifest.plan(file_paths)
+    for entry in skipped:
+        print(f"⏭  Skipping {os.path.basename(entry['path'])}: {entry['reason']}")
+    stats.extra["skipped_files"] = [{"file": os.path.basename(e["path"]), "reason": e["reason"]} for e in skipped]
+    changed = [e for e in to_process if e.get("changed")]
+    for entry in changed:
+        # Sources are append-only: the rows of the earlier version stay published
+        print(f"⚠ {os.path.basename(entry['path'])} changed since run {entry['changed']}; its earlier rows are "
+              f"kept (use --full-refresh to replace them)")
+    if changed:
+        stats.extra["changed_files"] = [{"file": os.path.basename(e["path"]), "previous_run": e["changed"]}
+                                        for e in changed]
+
+    if journal is not None and journal.status == COMMITTING:
+        # The output was written and its moves recorded before the run died: finish them, write nothing again
+        spark, _ = start_session([final for _, final in journal.extra["commit"]["moves"]])
+        commit_output(spark, journal, KeyIndex(spark) if not args.no_key_index else None)
+        journal.set_status(PUBLISHED)
+
+    if journal is not None and journal.status == PUBLISHED:
+        # The output was written before the run died; only the manifest update is missing
+        published = set(journal.extra.get("ingested", []))
+        manifest.record([e for e in to_process if e["path"] in published], run_id)
+        manifest.record([e for e in skipped if e.get("duplicate_of")], run_id)
+        manifest.record_run(run_id, journal.started_at, len(published))
+        manifest.save()
+        journal.cleanup()
+        print(f"\n✅ Run {run_id} had already published its output; manifest updated.")
+        return
 
-        df = normalize_columns(df)
-        df = generate_canonical_key(df)
+    if not to_process:
+        manifest.record([e for e in skipped if e.get("duplicate_of")], run_id)
+        manifest.save()
+        if journal is not None:
+            journal.cleanup()
+        print("\n✅ Nothing new to ingest.")
+        return
 
-        all_dfs.append(df)
+    spark, session_plan = start_session([e["path"] for e in to_process])
+    stats.extra["session_plan"] = session_plan
+
+    if not delta:
+        # Even a full refresh must not leave a half-swapped --migrate-keys behind to be "finished" later
+        finish_parquet_migration(OUTPUT_PATH)
+    if not (args.full_refresh or manifest.is_empty):
+        # Checked before anything is read: hex and binary keys cannot share a dataset
+        if delta:
+            from delta_output import DELTA_PATH
+            from key_migration import delta_key_format
+            check_key_format(delta_key_format(spark, DELTA_PATH), args.key_format)
+        else:
+            check_key_format(parquet_key_format(OUTPUT_PATH), args.key_format)
+    stats.extra["key_format"] = args.key_format
+
+    fingerprints = {e["path"]: e["sha256"] for e in to_process}
+    paths = [e["path"] for e in to_process]
+    packs = []
+    if args.pack_small_files:
+        from small_files import cleanup_packs, pack_small_files
+        with stats.stage("pack"):
+            packs, paths = pack_small_files(paths, fingerprints, target_bytes=args.pack_target_mb * MB,
+                                            keep_apart=lambda path: key_strategies.resolve(path)["pattern"])
+        for pack in packs:
+            key_strategies.alias(pack["path"], pack["paths"][0])
+        # A pack is identified by its members' content hashes, for the probe/schema caches and the journal
+        fingerprints.update({pack["path"]: pack["id"] for pack in packs})
+        for pack in packs:
+            stats.record_file(pack["path"], packed_files=[os.path.basename(p) for p in pack["paths"]])
+        print(f"📦 Packed {sum(len(pack['paths']) for pack in packs)} small file(s) into {len(packs)} pack(s)")
+
+    with stats.stage("probe"):
+        prober.seed_fingerprints(fingerprints)
+        for path, probe in prober.probe_all(paths, args.probe_workers).items():
+            stats.record_file(path, probe={k: probe.get(k) for k in
+                                           ("format", "encoding", "confidence", "compression", "size", "delimiter")})
+    prober.save()
+
+    from grouped_reads import ingest_groups, plan_groups, union_balanced
+    with stats.stage("read"):
+        read_started = time.time()
+        schemas.seed_fingerprints(fingerprints)
+        results = []
+        if journal is not None:
+            journal.fingerprints = fingerprints
+            journal.save()
+            completed = journal.completed()
+            results = [resumed_result(spark, journal, key, stats) for key in completed]
+            done = {p for entry in completed.values() for p in entry["paths"]}
+            paths = [p for p in paths if p not in done]
+        grouped_results = []
+        if not args.no_grouped_reads:
+            groups, paths = plan_groups(paths, prober, key_strategies)
+            grouped_results = ingest_groups(spark, groups, stats=stats, probes=prober, schemas=schemas,
+                                            key_strategies=key_strategies)
+        executor_paths = []
+        if args.executor_parsing:
+            from executor_parsing import EXECUTOR_FORMATS, ingest_on_executors
+            executor_paths = [p for p in paths if prober.get(p)["format"] in EXECUTOR_FORMATS]
+            paths = [p for p in paths if p not in executor_paths]
+        results += ingest_files(spark, paths, args.parallelism, journal,
+                                stats=stats, schemas=schemas,
+                                xml_record_path=args.xml_record_path, xml_batch_size=args.xml_batch_size,
+                                excel_workers=args.excel_workers, sql_workers=args.sql_workers,
+                                probes=prober, key_strategies=key_strategies)
+        executor_results = []
+        if executor_paths:
+            executor_results = ingest_on_executors(spark, executor_paths, stats=stats,
+                                                   xml_record_path=args.xml_record_path, probes=prober,
+                                                   key_strategies=key_strategies)
+        for result in grouped_results + executor_results:
+            if result["df"] is None or journal is None:
+                continue
+            try:
+                result["df"] = checkpoint_output(spark, journal, result["path"], result["df"],
+                                                 result["paths"], stats)
+            except Exception as e:
+                print(f"❌ Could not stage: {result['file']}")
+                result["df"], result["error"] = None, str(e)
+                stats.forget(result["path"])
+                stats.record_file(result["path"], error=result["error"], ok=False)
+        results += grouped_results + executor_results
+        read_wall = time.time() - read_started
+    schemas.save()
+    stats.extra["schema_drift"] = schemas.drift
+
+    all_dfs = [r["df"] for r in results if r["df"] is not None]
+    # Grouped and executor-side results cover a whole group of files
+    pack_members = {pack["path"]: pack["paths"] for pack in packs}
+    read_paths = {member for r in results if r["df"] is not None
+                  for p in r.get("paths", [r["path"]]) for member in pack_members.get(p, [p])}
+    ingested = [e for e in to_process if e["path"] in read_paths]
 
     if not all_dfs:
+        cleanup_staging()
+        if packs:
+            cleanup_packs(packs)
+        if journal is not None:
+            journal.cleanup()
+        print_timing_summary(results, read_wall)
         print("\n❌ No valid data files found.")
         return
 
+    if journal is not None:
+        journal.set_status(PUBLISHING)
+
     print("\n🔄 Merging all dataframes...")
-    merged_df = all_dfs[0]
-    for df in all_dfs[1:]:
-        merged_df = merged_df.unionByName(df, allowMissingColumns=True)
+    # A balanced tree keeps the plan log2(N) deep instead of N
+    merged_df = union_balanced(all_dfs, args.union_checkpoint_levels)
+
+    # Incremental runs add to the existing dataset; the first run (or a full refresh) replaces it
+    write_mode = "overwrite" if args.full_refresh or manifest.is_empty else "append"
+    # A Delta MERGE matches published keys against the table itself
+    key_index = KeyIndex(spark) if not args.no_key_index and not delta else None
 
     print("🧹 Dropping duplicates using canonical_key...")
+    resolution_input = None
     if "canonical_key" in merged_df.columns:
-        before_count = merged_df.count()
+        # Planned as a partial then final aggregate, so even a hot key reaches its reducer
+        # as at most one row per map partition
         merged_df = merged_df.dropDuplicates(["canonical_key"])
-        after_count = merged_df.count()
-        print(f"   Removed {before_count - after_count} duplicate records")
-
-    print("\n💾 Writing output to Parquet:", OUTPUT_PATH)
-    os.makedirs(OUTPUT_PATH, exist_ok=True)
-    merged_df.write.mode("overwrite").parquet(OUTPUT_PATH)
+        if key_index is not None and write_mode == "append":
+            # Keys published by earlier runs are checked against the key index, not the whole history
+            if not key_index.exists:
+                key_index.bootstrap(OUTPUT_PATH)
+            merged_df = key_index.drop_published(merged_df, stats, exempt_column=SURROGATE_COLUMN)
+        if SURROGATE_COLUMN in merged_df.columns:
+            merged_df = merged_df.drop(SURROGATE_COLUMN)
+
+        if args.entity_resolution:
+            from entity_resolution import resolve_entities
+            print("🔗 Resolving entities across near-duplicate records...")
+            # Read for matching and again for the output; released after the write
+            resolution_input = merged_df.persist(StorageLevel.MEMORY_AND_DISK)
+            with stats.stage("entity_resolution"):
+                merged_df, resolution = resolve_entities(resolution_input, threshold=args.er_threshold)
+            stats.extra["entity_resolution"] = resolution
+            print(f"   Linked {resolution['matched_pairs']} record pairs")
+            if not resolution["converged"]:
+                print(f"⚠ Entity clustering stopped after {resolution['iterations']} iterations without "
+                      f"converging; some clusters may be split across several entity_ids")
+    merged_df = stats.observe_output(merged_df)
+    # Written to the dataset and then the key index, so computed once
+    merged_df = merged_df.persist(StorageLevel.MEMORY_AND_DISK)
+
+    if delta:
+        from delta_output import DELTA_PATH, merge_into_delta, optimize_table
+        print("\n💾 Merging output into Delta table on canonical_key:", DELTA_PATH)
+        with stats.stage("merge_dedup_write"):
+            commit = merge_into_delta(spark, merged_df, DELTA_PATH, full_refresh=write_mode == "overwrite")
+        print(f"   Version {commit['version']}: {commit['inserted']} inserted, {commit['updated']} updated")
+        stats.extra["delta"] = commit
+        if args.optimize:
+            with stats.stage("optimize"):
+                stats.extra["delta"]["optimize"] = optimize_table(spark, DELTA_PATH, zorder_by=args.zorder_by)
+    else:
+        print(f"\n💾 Writing output to Parquet ({write_mode}):", OUTPUT_PATH)
+        os.makedirs(OUTPUT_PATH, exist_ok=True)
+        # Union and dedup run once, in the write; all row counts are observed during it.
+        # A checkpointed run writes to its work directory first, so publishing can be repeated safely
+        with stats.stage("merge_dedup_write"):
+            plan = write_dataset(merged_df, OUTPUT_PATH, write_mode,
+                                 target_file_bytes=args.target_file_mb * MB,
+                                 row_group_bytes=args.row_group_mb * MB,
+                                 partition_by_date=args.partition_by_date,
+                                 staging_dir=journal.output_dir if journal is not None else None)
+        stats.extra["output_files"] = plan.get("files")
+    has_keys = "canonical_key" in merged_df.columns
+    if journal is not None and not delta:
+        commit = plan_commit(journal.output_dir, OUTPUT_PATH, replace=write_mode == "overwrite")
+        journal.set_status(COMMITTING, commit={**commit, "mode": write_mode},
+                           ingested=[e["path"] for e in ingested])
+        with stats.stage("key_index"):
+            commit_output(spark, journal, key_index if has_keys else None, merged_df)
+    elif key_index is not None and has_keys:
+        with stats.stage("key_index"):
+            key_index.add(merged_df, mode=write_mode)
+    merged_df.unpersist()
+    if resolution_input is not None:
+        resolution_input.unpersist()
+    stats.collect()
+    for entry in ingested:
+        # Files of a grouped read have their own counts too; pack members only have their pack's
+        entry["rows"] = stats.file_rows(entry["path"])
+    cleanup_staging()
+    if packs:
+        cleanup_packs(packs)
+    if journal is not None:
+        journal.set_status(PUBLISHED, ingested=[e["path"] for e in ingested])
+
+    manifest.record(ingested, run_id)
+    manifest.record([e for e in skipped if e.get("duplicate_of")], run_id)
+    manifest.record_run(run_id, stats.started_at, len(ingested))
+    manifest.save()
+    if journal is not None:
+        journal.cleanup()
+
+    print_timing_summary(results, read_wall, stats)
+    totals = stats.totals()
+    if totals["corrupt_rows"]:
+        print(f"\n⚠ Dropped {totals['corrupt_rows']} corrupt rows")
+    print(f"   Removed {totals['duplicates_removed']} duplicate records")
+    if totals.get("matched_published"):
+        print(f"   Skipped {totals['matched_published']} records already in the master dataset")
+    report_path = stats.write_report()
 
     print("\n✅ INGESTION COMPLETE")
-    print(f"Total Records: {merged_df.count()}")
-
+    print(f"Total Records: {totals['rows_out']}")
+    print(f"Run report: {report_path}")
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,127 @@
+"""
+Persisted index of published canonical keys.
+
+dropDuplicates only sees the rows of the current run. To keep reruns and
+incremental drops from re-publishing records, every key written to the
+master dataset is also appended to a narrow key table: canonical_key only,
+written as a Spark bucketed table (bucketBy(buckets, canonical_key), sorted
+within each bucket file) at KEY_INDEX_PATH.
+
+A new batch is checked with a left join on canonical_key. The batch is
+hash-partitioned into the same number of buckets, so the join's
+partitioning matches the index layout: only the incoming keys are
+shuffled, and each task reads exactly one bucket of the index. The index
+is still read once per run, key column only, but it is never shuffled or
+sorted again.
+
+The table definition lives in the session catalog, which does not survive
+the session, so it is registered over the existing files at every start.
+"""
+import os
+import json
+import shutil
+from typing import Optional
+
+from pyspark.sql import DataFrame, SparkSession
+from pyspark.sql.functions import coalesce, col, lit, when
+
+from parquet_writer import dataset_files
+from run_stats import IngestionStats
+
+KEY_INDEX_PATH = "../../data_processed/key_index/"
+DEFAULT_BUCKETS = 256
+KEY_COLUMN = "canonical_key"
+TABLE_NAME = "published_keys"
+# Layout of the files under KEY_INDEX_PATH; an index in another layout is rebuilt
+INDEX_LAYOUT = "bucketed"
+# Set on incoming rows whose key is already published
+PUBLISHED_COLUMN = "_published"
+# Spark skips files starting with "_" when reading the index
+META_FILE = "_index.json"
+
+
+class KeyIndex:
+    """Bucketed Parquet table of every canonical_key already in the master dataset."""
+
+    def __init__(self, spark: SparkSession, path: str = KEY_INDEX_PATH, buckets: int = DEFAULT_BUCKETS):
+        self.spark = spark
+        self.path = path
+        self.buckets = buckets
+        self.meta = {}
+        meta_path = os.path.join(path, META_FILE)
+        if os.path.exists(meta_path):
+            with open(meta_path, "r", encoding="utf-8") as f:
+                self.meta = json.load(f)
+            if self.meta.get("layout") == INDEX_LAYOUT:
+                # The bucket count is fixed once the index has been written
+                self.buckets = self.meta["buckets"]
+
+    @property
+    def exists(self) -> bool:
+        """Whether a bucketed index has been written and holds at least one file."""
+        return self.meta.get("layout") == INDEX_LAYOUT and bool(dataset_files(self.path))
+
+    def _register(self):
+        """Declare the table over the files already at self.path."""
+        self.spark.sql(f"CREATE TABLE IF NOT EXISTS {TABLE_NAME} ({KEY_COLUMN} {self.meta['key_type']}) "
+                       f"USING parquet CLUSTERED BY ({KEY_COLUMN}) SORTED BY ({KEY_COLUMN}) "
+                       f"INTO {self.buckets} BUCKETS LOCATION '{os.path.abspath(self.path)}'")
+
+    def _write_meta(self, key_type: str):
+        self.meta = {"layout": INDEX_LAYOUT, "buckets": self.buckets, "key_type": key_type}
+        with open(os.path.join(self.path, META_FILE), "w", encoding="utf-8") as f:
+            json.dump(self.meta, f)
+
+    def add(self, df: DataFrame, mode: str = "append"):
+        """Record the keys of rows just written to the master dataset."""
+        keys = df.select(KEY_COLUMN)
+        key_type = keys.schema[KEY_COLUMN].dataType.simpleString()
+        if mode == "append" and self.exists and self.meta.get("key_type") == key_type:
+            self._register()
+        else:
+            # First write, full refresh, or an index in an older layout or key format
+            mode = "overwrite"
+            self.spark.sql(f"DROP TABLE IF EXISTS {TABLE_NAME}")
+            shutil.rmtree(self.path, ignore_errors=True)
+        # One task per bucket, so each run adds at most one file per bucket
+        keys.repartition(self.buckets, col(KEY_COLUMN)) \
+            .write.mode(mode).format("parquet") \
+            .bucketBy(self.buckets, KEY_COLUMN).sortBy(KEY_COLUMN) \
+            .option("path", os.path.abspath(self.path)) \
+            .saveAsTable(TABLE_NAME)
+        self._write_meta(key_type)
+
+    def bootstrap(self, master_path: str):
+        """Build the index from an existing master dataset (reads the key column only)."""
+        if not dataset_files(master_path):
+            return
+        print(f"🔑 Building key index from {master_path}...")
+        keys = self.spark.read.parquet(master_path).select(KEY_COLUMN).distinct()
+        self.add(keys, mode="overwrite")
+
+    def mark_published(self, df: DataFrame, exempt_column: Optional[str] = None) -> DataFrame:
+        """
+        Add PUBLISHED_COLUMN (true for keys already in the index, null
+        otherwise). Rows where exempt_column is true are never marked.
+        """
+        if not self.exists:
+            return df.withColumn(PUBLISHED_COLUMN, lit(None).cast("boolean"))
+        self._register()
+        published = self.spark.table(TABLE_NAME).select(KEY_COLUMN, lit(True).alias(PUBLISHED_COLUMN))
+        # Same hash partitioning as the index buckets, so the index side needs no exchange
+        df = df.repartition(self.buckets, col(KEY_COLUMN)).join(published, [KEY_COLUMN], "left")
+        if exempt_column is not None and exempt_column in df.columns:
+            df = df.withColumn(PUBLISHED_COLUMN,
+                               when(~coalesce(col(exempt_column), lit(False)), col(PUBLISHED_COLUMN)))
+        return df
+
+    def drop_published(self, df: DataFrame, stats: Optional[IngestionStats] = None,
+                       exempt_column: Optional[str] = None) -> DataFrame:
+        """
+        Remove rows whose key is already published, counting them in stats
+        when given. Rows where exempt_column is true are always kept.
+        """
+        df = self.mark_published(df, exempt_column)
+        if stats is not None:
+            df = stats.observe_published(df, PUBLISHED_COLUMN)
+        return df.filter(col(PUBLISHED_COLUMN).isNull()).drop(PUBLISHED_COLUMN)
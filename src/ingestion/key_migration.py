@@ -0,0 +1,162 @@
+"""
+Migration of published canonical keys from hex strings to binary.
+
+A sha256-128 key is the first 16 bytes of the SHA-256 whose hex digest the
+original keys hold, so an existing dataset is converted by unhexing the
+first 32 characters of every key: no source file is read again and every
+key still identifies the same record. The master dataset (Parquet or Delta)
+is rewritten with binary canonical_key (and entity_id) columns, and the key
+index is dropped so the next incremental run rebuilds it from the new keys.
+
+The Parquet dataset is rewritten next to itself (<path>.migrating) and then
+swapped in, with the hex dataset moved aside to <path>.hex. The swap is
+recorded in <path>.migration.json first, so a run interrupted at any point
+of it is finished by the next run (finish_parquet_migration) instead of
+leaving the dataset missing.
+
+xxhash-128 keys cannot be derived from the hex ones; switching to them takes
+a --full-refresh run. The loader has a matching --migrate-binary-keys step
+for the ClickHouse table.
+"""
+import os
+import json
+import shutil
+from typing import Any, Dict, Optional
+
+import pyarrow.parquet as pq
+from pyspark.sql import SparkSession
+from pyspark.sql.types import BinaryType
+
+from key_index import KEY_INDEX_PATH
+from key_strategies import KEY_COLUMN, binary_from_hex, is_binary_format
+from parquet_writer import (DEFAULT_ROW_GROUP_BYTES, DEFAULT_TARGET_FILE_BYTES, PARTITION_COLUMN, dataset_files,
+                            is_partitioned, write_dataset)
+
+# Columns holding canonical keys
+KEY_COLUMNS = (KEY_COLUMN, "entity_id")
+
+
+def parquet_key_format(path: str) -> Optional[str]:
+    """"hex" or "binary" for the keys of the Parquet dataset at path, None if it has none yet."""
+    files = dataset_files(path)
+    if not files:
+        return None
+    schema = pq.read_schema(files[0])
+    if KEY_COLUMN not in schema.names:
+        return None
+    return "hex" if str(schema.field(KEY_COLUMN).type) in ("string", "large_string") else "binary"
+
+
+def delta_key_format(spark: SparkSession, path: str) -> Optional[str]:
+    """"hex" or "binary" for the keys of the Delta table at path, None if there is no table yet."""
+    if not os.path.isdir(os.path.join(path, "_delta_log")):
+        return None
+    schema = spark.read.format("delta").load(os.path.abspath(path)).schema
+    if KEY_COLUMN not in schema.fieldNames():
+        return None
+    return "binary" if isinstance(schema[KEY_COLUMN].dataType, BinaryType) else "hex"
+
+
+def check_key_format(existing: Optional[str], key_format: str):
+    """Refuse to add keys of one format to a dataset holding the other."""
+    wanted = "binary" if is_binary_format(key_format) else "hex"
+    if existing is not None and existing != wanted:
+        raise ValueError(f"The published dataset has {existing} canonical keys but this run writes {key_format} "
+                         f"keys; run with --migrate-keys first, or re-ingest with --full-refresh")
+
+
+def _binary_keys(df):
+    for column in KEY_COLUMNS:
+        if column in df.columns and not isinstance(df.schema[column].dataType, BinaryType):
+            df = df.withColumn(column, binary_from_hex(df[column]))
+    return df
+
+
+def _migration_paths(path: str) -> Dict[str, str]:
+    root = path.rstrip("/")
+    return {"path": root, "staging": root + ".migrating", "backup": root + ".hex",
+            "journal": root + ".migration.json"}
+
+
+def _swap(paths: Dict[str, str]):
+    """Move the staged dataset into place; safe to repeat after an interruption at any step."""
+    if os.path.isdir(paths["staging"]):
+        if os.path.isdir(paths["path"]):
+            shutil.rmtree(paths["backup"], ignore_errors=True)
+            os.replace(paths["path"], paths["backup"])
+        os.replace(paths["staging"], paths["path"])
+    shutil.rmtree(paths["backup"], ignore_errors=True)
+    os.remove(paths["journal"])
+
+
+def finish_parquet_migration(path: str) -> bool:
+    """Complete a swap an interrupted migrate_parquet recorded. Returns whether there was one."""
+    paths = _migration_paths(path)
+    if os.path.exists(paths["journal"]):
+        print(f"♻ Finishing an interrupted key migration of {path}...")
+        _swap(paths)
+        return True
+    if not os.path.isdir(paths["path"]) and os.path.isdir(paths["backup"]):
+        # Moved aside by a migration that died before it recorded its swap
+        os.replace(paths["backup"], paths["path"])
+    return False
+
+
+def migrate_parquet(spark: SparkSession, path: str, target_file_bytes: int = DEFAULT_TARGET_FILE_BYTES,
+                    row_group_bytes: int = DEFAULT_ROW_GROUP_BYTES) -> Dict[str, Any]:
+    """Rewrite the Parquet dataset at path with binary keys, then swap it into place."""
+    paths = _migration_paths(path)
+    staging = paths["staging"]
+    # Left over from an attempt that died while writing; the hex dataset is still in place
+    shutil.rmtree(staging, ignore_errors=True)
+    shutil.rmtree(paths["backup"], ignore_errors=True)
+    partitioned = is_partitioned(path)
+
+    df = spark.read.parquet(path)
+    if PARTITION_COLUMN in df.columns:
+        # Derived again from ingest_timestamp by write_dataset
+        df = df.drop(PARTITION_COLUMN)
+    plan = write_dataset(_binary_keys(df), staging, mode="overwrite", target_file_bytes=target_file_bytes,
+                         row_group_bytes=row_group_bytes, partition_by_date=partitioned)
+
+    # Recorded before anything moves, so an interrupted swap is finished by the next run
+    with open(paths["journal"], "w", encoding="utf-8") as f:
+        json.dump({"staging": staging, "backup": paths["backup"]}, f)
+    _swap(paths)
+    return {"path": path, "files": plan.get("files")}
+
+
+def migrate_delta(spark: SparkSession, path: str) -> Dict[str, Any]:
+    """Overwrite the Delta table at path with binary keys (one new table version)."""
+    location = os.path.abspath(path)
+    df = _binary_keys(spark.read.format("delta").load(location))
+    # Reads the current snapshot and replaces it in one commit
+    df.write.format("delta").mode("overwrite").option("overwriteSchema", "true").save(location)
+    return {"path": path}
+
+
+def migrate_keys(spark: SparkSession, key_format: str, output_path: str, delta_path: Optional[str] = None,
+                 key_index_path: str = KEY_INDEX_PATH, **write_options) -> Dict[str, Any]:
+    """
+    Convert the published hex keys to key_format. Only sha256-128 can be
+    derived from hex keys. Returns what was migrated.
+    """
+    if key_format == "hex":
+        raise ValueError("--migrate-keys converts hex keys to binary ones; pass --key-format sha256-128")
+    if key_format != "sha256-128":
+        raise ValueError(f"Hex keys can only be migrated to sha256-128 keys; for {key_format} keys "
+                         f"re-ingest with --full-refresh --key-format {key_format}")
+
+    migrated: Dict[str, Any] = {}
+    finish_parquet_migration(output_path)
+    if parquet_key_format(output_path) == "hex":
+        print(f"🔑 Converting canonical keys in {output_path} to {key_format}...")
+        migrated["parquet"] = migrate_parquet(spark, output_path, **write_options)
+    if delta_path is not None and delta_key_format(spark, delta_path) == "hex":
+        print(f"🔑 Converting canonical keys in {delta_path} to {key_format}...")
+        migrated["delta"] = migrate_delta(spark, delta_path)
+    if migrated and os.path.isdir(key_index_path):
+        # Rebuilt from the migrated dataset by the next incremental run
+        shutil.rmtree(key_index_path)
+        migrated["key_index"] = "dropped"
+    return migrated
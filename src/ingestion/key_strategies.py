@@ -0,0 +1,207 @@
+"""
+Per-source canonical_key strategies.
+
+canonical_key is a hash of name/email/phone/dob. A source with none of those
+columns (e.g. earthquake_data_tsunami.csv) used to get the constant
+sha2("no_key") on every row, so dropDuplicates sent the whole source to one
+task and kept a single row of it. Sources can now declare how their rows are
+keyed in key_strategies.json, matched by filename pattern:
+
+- identity: the name/email/phone/dob hash (default); a source without any of
+  those columns falls back to the "keyless" strategy (row_hash by default),
+  and so does any row whose identity columns are all empty,
+- columns: a hash of the listed columns,
+- row_hash: a hash of every column (except ingestion bookkeeping), so only
+  exact duplicate rows are dropped,
+- surrogate: a generated key unique to each row (run id, source file and
+  row position); nothing is deduplicated, and surrogate-keyed rows are
+  flagged with SURROGATE_COLUMN so they are not checked against keys
+  published by earlier runs either.
+
+Whatever the strategy, the key is stored in one of KEY_FORMATS:
+- hex: SHA-256 as a 64-character hex string (the original format),
+- sha256-128: the first 16 bytes of the same SHA-256, as binary; an existing
+  hex key converts to it exactly (binary_from_hex), so a dataset migrates
+  without its sources,
+- xxhash-128: two differently seeded 64-bit xxHash values, as 16 bytes of
+  binary; much cheaper to compute, not collision resistant against crafted
+  input, and only reachable from other formats by re-ingesting.
+"""
+import os
+import json
+import fnmatch
+from functools import reduce
+from operator import and_
+from typing import Any, Dict, List, Optional
+
+from pyspark.sql import Column, DataFrame
+from pyspark.sql.functions import (coalesce, col, concat, concat_ws, hex, input_file_name, lit, lpad,
+                                   monotonically_increasing_id, sha2, struct, substring, to_json, unhex, when,
+                                   xxhash64)
+
+from projection import quote_identifier
+
+KEY_STRATEGIES_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "key_strategies.json")
+KEY_COLUMN = "canonical_key"
+STRATEGIES = ("identity", "columns", "row_hash", "surrogate")
+IDENTITY_COLUMNS = ["name", "email", "phone", "dob"]
+DEFAULT_KEYLESS = "row_hash"
+# True on rows with a surrogate key; dropped before the output is written
+SURROGATE_COLUMN = "_surrogate_key"
+# Added by the pipeline, not part of a row's content
+BOOKKEEPING_COLUMNS = {KEY_COLUMN, "ingest_timestamp", "source_file", "_corrupt_record", SURROGATE_COLUMN}
+KEY_FORMATS = ("hex", "sha256-128", "xxhash-128")
+DEFAULT_KEY_FORMAT = "hex"
+KEY_BYTES = 16
+# Prepended to the input of the second xxHash, so the two halves are independent
+XXHASH_SEED = "canonical_key:2"
+
+
+def _quoted(names: List[str]) -> List[Column]:
+    return [col(quote_identifier(name)) for name in names]
+
+
+def _check(entry: Dict[str, Any]) -> Dict[str, Any]:
+    if entry.get("strategy") not in STRATEGIES:
+        raise ValueError(f"Unknown key strategy {entry.get('strategy')!r} for {entry.get('pattern')!r}; "
+                         f"expected one of {', '.join(STRATEGIES)}")
+    if entry["strategy"] == "columns" and not entry.get("columns"):
+        raise ValueError(f"Key strategy 'columns' for {entry.get('pattern')!r} needs a list of columns")
+    return entry
+
+
+class KeyStrategies:
+    """Declared key strategies, resolved per source file."""
+
+    def __init__(self, path: str = KEY_STRATEGIES_PATH, key_format: str = DEFAULT_KEY_FORMAT,
+                 run_id: Optional[str] = None):
+        if key_format not in KEY_FORMATS:
+            raise ValueError(f"Unknown key format {key_format!r}; expected one of {', '.join(KEY_FORMATS)}")
+        self.path = path
+        self.key_format = key_format
+        # Part of every surrogate key, so a file re-ingested by a later run gets new keys
+        self.run_id = run_id
+        self.keyless = DEFAULT_KEYLESS
+        self.declared: List[Dict[str, Any]] = []
+        # Files standing in for a source file (packs of small files) -> that source file
+        self.aliases: Dict[str, str] = {}
+        if os.path.exists(path):
+            with open(path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            self.keyless = data.get("keyless", DEFAULT_KEYLESS)
+            self.declared = [_check(entry) for entry in data.get("sources", [])]
+        if self.keyless not in ("row_hash", "surrogate"):
+            raise ValueError(f"keyless strategy must be row_hash or surrogate, got {self.keyless!r}")
+
+    def alias(self, path: str, source_path: str):
+        """Resolve path as if it were source_path."""
+        self.aliases[path] = source_path
+
+    def resolve(self, file_path: str) -> Dict[str, Any]:
+        """
+        The strategy entry for a file: {"pattern", "strategy", "columns",
+        "keyless", "key_format", "run_id", "source"}.
+        """
+        name = os.path.basename(self.aliases.get(file_path, file_path)).lower()
+        context = {"keyless": self.keyless, "key_format": self.key_format, "run_id": self.run_id,
+                   "source": file_path}
+        for entry in self.declared:
+            if fnmatch.fnmatch(name, entry["pattern"].lower()):
+                return {**context, **entry}
+        return {"pattern": None, "strategy": "identity", **context}
+
+
+def is_binary_format(key_format: str) -> bool:
+    return key_format != "hex"
+
+
+def hash_key(value: Column, key_format: str = DEFAULT_KEY_FORMAT) -> Column:
+    """Hash a string expression into a canonical_key in key_format."""
+    if key_format == "hex":
+        return sha2(value, 256)
+    if key_format == "sha256-128":
+        return unhex(substring(sha2(value, 256), 1, KEY_BYTES * 2))
+    # hex() of a bigint is its two's complement, so each half is exactly 8 bytes
+    halves = [xxhash64(value), xxhash64(lit(XXHASH_SEED), value)]
+    return unhex(concat(*[lpad(hex(half), 16, "0") for half in halves]))
+
+
+def binary_from_hex(key: Column) -> Column:
+    """A hex SHA-256 key as the sha256-128 key of the same input."""
+    return unhex(substring(key, 1, KEY_BYTES * 2))
+
+
+def _content_columns(df: DataFrame) -> List[str]:
+    return sorted(c for c in df.columns if c not in BOOKKEEPING_COLUMNS)
+
+
+def effective_strategy(df: DataFrame, strategy: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    """The strategy that applies to df's columns, with the key columns it uses."""
+    strategy = strategy or {}
+    kind = strategy.get("strategy", "identity")
+    if kind == "identity":
+        columns = [c for c in IDENTITY_COLUMNS if c in df.columns]
+    elif kind == "columns":
+        by_lower = {c.lower(): c for c in df.columns}
+        columns = [by_lower[c.lower()] for c in strategy["columns"] if c.lower() in by_lower]
+    elif kind == "row_hash":
+        columns = _content_columns(df)
+    else:
+        columns = []
+
+    if kind in ("identity", "columns") and not columns:
+        kind = strategy.get("keyless", DEFAULT_KEYLESS)
+        if kind == "row_hash":
+            columns = _content_columns(df)
+    return {"strategy": kind, "columns": columns}
+
+
+def _key_value(kind: str, columns: List[str], strategy: Dict[str, Any]) -> Column:
+    """The string a strategy hashes into the key."""
+    if kind == "identity":
+        # Unchanged from earlier releases, so published keys stay valid
+        return concat_ws("||", *_quoted(columns))
+    if kind == "columns":
+        return concat_ws("||", *[c.cast("string") for c in _quoted(columns)])
+    if kind == "row_hash":
+        # Column names are part of the hash, so values cannot shift between columns
+        return to_json(struct(*_quoted(columns)))
+    # Surrogate: the run, the source and the row's position in it. input_file_name() tells the files of a
+    # multi-path read apart; it is "" for executor-parsed groups, whose source is unique in the run
+    return concat_ws("||", lit("surrogate"), lit(strategy.get("run_id") or ""), lit(strategy.get("source") or ""),
+                     input_file_name(), monotonically_increasing_id().cast("string"))
+
+
+def _all_blank(columns: List[str]) -> Column:
+    # Missing values are null, or "" after the cleaning projection
+    return reduce(and_, [coalesce(c.cast("string"), lit("")) == "" for c in _quoted(columns)])
+
+
+def key_column(df: DataFrame, strategy: Optional[Dict[str, Any]] = None) -> Column:
+    """
+    canonical_key expression for df under a (resolved) strategy.
+
+    identity and columns keys fall back to the keyless strategy per row as
+    well: a DataFrame covering several files (an executor-parsed group) can
+    hold rows from a file without any of the key columns, which would all
+    hash to the same key.
+    """
+    strategy = strategy or {}
+    effective = effective_strategy(df, strategy)
+    kind, columns = effective["strategy"], effective["columns"]
+    value = _key_value(kind, columns, strategy)
+    if kind in ("identity", "columns"):
+        keyless = strategy.get("keyless", DEFAULT_KEYLESS)
+        value = when(_all_blank(columns), _key_value(keyless, _content_columns(df), strategy)).otherwise(value)
+    return hash_key(value, strategy.get("key_format", DEFAULT_KEY_FORMAT))
+
+
+def surrogate_flag(df: DataFrame, strategy: Optional[Dict[str, Any]] = None) -> Optional[Column]:
+    """SURROGATE_COLUMN value for the rows key_column gives a surrogate key, None if no row gets one."""
+    strategy = strategy or {}
+    effective = effective_strategy(df, strategy)
+    if effective["strategy"] == "surrogate":
+        return lit(True)
+    if effective["strategy"] in ("identity", "columns") and strategy.get("keyless") == "surrogate":
+        return when(_all_blank(effective["columns"]), lit(True))
+    return None
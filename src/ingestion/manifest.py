@@ -0,0 +1,182 @@
+"""
+Persistent ingestion manifest.
+
+Records every raw file that has been ingested (path, size, mtime, content
+hash and the run that ingested it) so that repeat runs only process new or
+changed files, and identical content delivered under a different filename
+is skipped before Spark ever reads it.
+
+Sources are treated as append-only: a changed file is ingested again and its
+rows are appended, but the rows its earlier version published are not
+removed. Such files are flagged ("changed") so the run can report them.
+"""
+import os
+import json
+import time
+import uuid
+import hashlib
+from typing import Any, Dict, List, Optional, Tuple
+
+MANIFEST_PATH = "../../data_processed/ingestion_manifest.json"
+MANIFEST_VERSION = 1
+HASH_CHUNK_SIZE = 1024 * 1024
+
+
+def new_run_id() -> str:
+    """Generate a sortable, unique identifier for an ingestion run."""
+    return time.strftime("%Y%m%dT%H%M%S", time.gmtime()) + "-" + uuid.uuid4().hex[:8]
+
+
+def file_sha256(file_path: str, chunk_size: int = HASH_CHUNK_SIZE) -> str:
+    """Compute the SHA-256 of a file without loading it into memory."""
+    digest = hashlib.sha256()
+    with open(file_path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class FileManifest:
+    """
+    JSON-backed manifest of ingested source files.
+
+    Layout on disk:
+        {
+          "version": 1,
+          "files":  {path: {"path", "size", "mtime", "sha256", "run_id", "ingested_at"}},
+          "hashes": {sha256: path},
+          "runs":   [{"run_id", "started_at", "finished_at", "files"}]
+        }
+    """
+
+    def __init__(self, path: str, data: Optional[Dict[str, Any]] = None):
+        self.path = path
+        self.data = data or {"version": MANIFEST_VERSION, "files": {}, "hashes": {}, "runs": []}
+
+    @classmethod
+    def load(cls, path: str) -> "FileManifest":
+        """Load the manifest from disk, starting empty if it is missing or unreadable."""
+        if not os.path.exists(path):
+            return cls(path)
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except (OSError, ValueError) as e:
+            print(f"⚠ Could not read manifest {path}, starting fresh: {e}")
+            return cls(path)
+        data.setdefault("files", {})
+        data.setdefault("hashes", {})
+        data.setdefault("runs", [])
+        return cls(path, data)
+
+    def save(self):
+        """Atomically write the manifest back to disk."""
+        directory = os.path.dirname(os.path.abspath(self.path))
+        os.makedirs(directory, exist_ok=True)
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(self.data, f, indent=2, sort_keys=True)
+        os.replace(tmp_path, self.path)
+
+    def reset(self):
+        """Forget every ingested file (used for full refreshes)."""
+        self.data["files"] = {}
+        self.data["hashes"] = {}
+
+    @property
+    def is_empty(self) -> bool:
+        return not self.data["files"]
+
+    @staticmethod
+    def _key(file_path: str) -> str:
+        return os.path.normpath(os.path.abspath(file_path))
+
+    def plan(self, file_paths: List[str]) -> Tuple[List[Dict[str, Any]], List[Dict[str, Any]]]:
+        """
+        Split candidate files into (to_process, skipped).
+
+        Size and mtime are checked first so unchanged files are never hashed.
+        Files whose stat changed are hashed; they are skipped if the content is
+        identical to what was already ingested under this or any other path.
+        Each returned entry carries path, size, mtime and sha256 (when known),
+        for skipped files a "reason", and for files whose earlier content was
+        already ingested "changed" (the run that ingested it).
+        """
+        to_process = []
+        skipped = []
+        seen_hashes = {}
+
+        for file_path in file_paths:
+            key = self._key(file_path)
+            stat = os.stat(file_path)
+            entry = {"path": file_path, "size": stat.st_size, "mtime": stat.st_mtime, "sha256": None}
+            previous = self.data["files"].get(key)
+
+            if previous and previous["size"] == stat.st_size and previous["mtime"] == stat.st_mtime:
+                duplicate_of = previous.get("duplicate_of")
+                entry["reason"] = f"duplicate of {os.path.basename(duplicate_of)}" if duplicate_of else "unchanged"
+                skipped.append(entry)
+                continue
+
+            entry["sha256"] = file_sha256(file_path)
+            if previous and previous["sha256"] == entry["sha256"]:
+                # Touched but not modified; refresh the stat so it isn't hashed again
+                previous["mtime"] = stat.st_mtime
+                entry["reason"] = "unchanged"
+                skipped.append(entry)
+                continue
+
+            owner = self.data["hashes"].get(entry["sha256"]) or seen_hashes.get(entry["sha256"])
+            if owner and owner != key:
+                entry["duplicate_of"] = owner
+                entry["reason"] = f"duplicate of {os.path.basename(owner)}"
+                skipped.append(entry)
+                continue
+
+            seen_hashes[entry["sha256"]] = key
+            if previous and not previous.get("duplicate_of"):
+                entry["changed"] = previous["run_id"]
+            to_process.append(entry)
+
+        return to_process, skipped
+
+    def record(self, entries: List[Dict[str, Any]], run_id: str):
+        """Mark the given files as ingested by run_id, with their row count when the entry has one ("rows")."""
+        now = time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime())
+        for entry in entries:
+            key = self._key(entry["path"])
+            if entry.get("duplicate_of"):
+                # Remember content duplicates so later runs skip them without re-hashing
+                self.data["files"][key] = {
+                    "path": key,
+                    "size": entry["size"],
+                    "mtime": entry["mtime"],
+                    "sha256": entry["sha256"],
+                    "duplicate_of": entry["duplicate_of"],
+                    "run_id": run_id,
+                    "ingested_at": now,
+                }
+                continue
+            previous = self.data["files"].get(key)
+            if previous and self.data["hashes"].get(previous["sha256"]) == key:
+                del self.data["hashes"][previous["sha256"]]
+            self.data["files"][key] = {
+                "path": key,
+                "size": entry["size"],
+                "mtime": entry["mtime"],
+                "sha256": entry["sha256"] or file_sha256(entry["path"]),
+                "run_id": run_id,
+                "ingested_at": now,
+            }
+            if entry.get("rows") is not None:
+                self.data["files"][key]["rows"] = entry["rows"]
+            self.data["hashes"][self.data["files"][key]["sha256"]] = key
+
+    def record_run(self, run_id: str, started_at: float, file_count: int):
+        """Append a run summary to the manifest history."""
+        self.data["runs"].append({
+            "run_id": run_id,
+            "started_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime(started_at)),
+            "finished_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+            "files": file_count,
+        })
@@ -0,0 +1,90 @@
+"""
+Record shaping shared by every read path: the batch reader (ingested_data),
+grouped reads, executor-side parsing and the streaming mode.
+
+Kept apart from ingested_data so those modules can import it without
+loading the batch entry point (and, when ingested_data runs as a script, a
+second copy of it).
+"""
+from typing import Any, Dict, Optional
+
+from pyspark.sql.functions import col, trim, lower, current_timestamp
+
+from identifiers import normalize_identifiers
+from key_strategies import SURROGATE_COLUMN, key_column, surrogate_flag
+
+
+def flatten_dict(d: Dict, parent_key: str = '', sep: str = '_') -> Dict:
+    """Flatten nested dictionary structures."""
+    items = []
+    for k, v in d.items():
+        new_key = f"{parent_key}{sep}{k}" if parent_key else k
+        if isinstance(v, dict):
+            items.extend(flatten_dict(v, new_key, sep=sep).items())
+        elif isinstance(v, list):
+            # Handle lists by converting to string or taking first element
+            if len(v) > 0 and isinstance(v[0], dict):
+                # If list of dicts, flatten the first one
+                items.extend(flatten_dict(v[0], new_key, sep=sep).items())
+            else:
+                items.append((new_key, str(v) if v else ""))
+        else:
+            items.append((new_key, v))
+    return dict(items)
+
+
+def csv_dialect(probe: Dict[str, Any]) -> Dict[str, Any]:
+    """Spark CSV options for a probed file's dialect."""
+    quote = probe.get("quote") or '"'
+    return {
+        "delimiter": probe["delimiter"],
+        "quote": quote,
+        # Spark un-doubles RFC 4180 quotes when the escape is the quote itself
+        "escape": probe.get("escape") or quote,
+        "multiline": bool(probe.get("multiline")),
+    }
+
+
+def normalize_columns(df):
+    """Normalize column names and values."""
+    # Normalize typical fields if they exist
+    mapping = {
+        "fname": "first_name",
+        "lname": "last_name",
+        "full_name": "name",
+        "email_address": "email",
+        "e_mail": "email",
+        "phone_number": "phone",
+        "mobile": "phone",
+        "date_of_birth": "dob",
+        "birth_date": "dob",
+    }
+
+    for old, new in mapping.items():
+        if old in df.columns and new not in df.columns:
+            df = df.withColumnRenamed(old, new)
+
+    # Lowercase / trim name fields
+    for field in ["name", "first_name", "last_name"]:
+        if field in df.columns:
+            df = df.withColumn(field, trim(lower(col(field))))
+
+    # Phone to E.164, email without plus-tag, dob to ISO, so formatting does not change canonical_key
+    df = normalize_identifiers(df)
+
+    # Add ingestion timestamp
+    df = df.withColumn("ingest_timestamp", current_timestamp())
+
+    return df
+
+def generate_canonical_key(df, strategy: Optional[Dict[str, Any]] = None):
+    """
+    Create deterministic hash for deduplication.
+
+    strategy is a source's entry from KeyStrategies.resolve; by default rows
+    are keyed on name/email/phone/dob, and rows without any of those on
+    their full content (see key_strategies).
+    """
+    keyed = df.withColumn("canonical_key", key_column(df, strategy))
+    flag = surrogate_flag(df, strategy)
+    return keyed.withColumn(SURROGATE_COLUMN, flag) if flag is not None else keyed
@@ -0,0 +1,267 @@
+"""
+Size-targeted Parquet output for the master dataset, and compaction.
+
+write_dataset writes zstd-compressed Parquet with a fixed row-group size, in
+files near a target size, without any job besides the write itself:
+
+- bytes per row come from the Parquet footers of the existing dataset (what
+  earlier runs actually wrote) or, on the first run, from the schema width,
+- a rebalance hint lets adaptive execution cut the output into partitions of
+  about the target size (splitting large ones, merging small ones), by
+  ingest_date when the dataset is partitioned, so a date is not spread over
+  every task,
+- maxRecordsPerFile caps any file that would grow past the target.
+
+Optionally the dataset is partitioned by ingest_date, so a reader interested
+in recent data only opens recent directories.
+
+Incremental and streaming runs still add small files. compact_dataset
+merges the small files of each partition into target-sized ones and leaves
+partitions without small files untouched. The swap is recorded in a journal
+first, so an interrupted compaction is finished (not duplicated) by the next.
+"""
+import os
+import json
+import math
+import shutil
+import uuid
+from typing import Any, Dict, List, Optional
+
+import pyarrow.parquet as pq
+from pyspark.sql import DataFrame, SparkSession
+from pyspark.sql.functions import col, current_date, to_date
+from pyspark.sql.types import (ArrayType, BinaryType, BooleanType, ByteType, DataType, DateType, DecimalType,
+                               FloatType, IntegerType, MapType, ShortType, StringType, StructType)
+
+MB = 1024 * 1024
+DEFAULT_TARGET_FILE_BYTES = 256 * MB
+# Several row groups per file, so the loader can stream a file group by group
+DEFAULT_ROW_GROUP_BYTES = 64 * MB
+COMPRESSION = "zstd"
+PARTITION_COLUMN = "ingest_date"
+# Width assumed for a string or binary value when nothing has been written yet
+STRING_BYTES = 24
+# Compressed Parquet bytes per byte of raw value width, for the first run
+PARQUET_COMPRESSION_RATIO = 0.35
+# Shuffle bytes (what adaptive execution sizes partitions by) per Parquet byte written
+SHUFFLE_BYTES_PER_OUTPUT_BYTE = 2.0
+ADVISORY_PARTITION_SIZE = "spark.sql.adaptive.advisoryPartitionSizeInBytes"
+# Files smaller than this share of the target are merged by compaction
+SMALL_FILE_RATIO = 0.5
+# Spark skips files and directories starting with "_" when reading the dataset
+COMPACTION_DIR = "_compaction"
+COMPACTION_JOURNAL = "_compaction.json"
+
+
+def dataset_files(path: str) -> List[str]:
+    """Parquet data files of a dataset, including those in partition directories."""
+    files = []
+    if not os.path.isdir(path):
+        return files
+    for root, dirs, names in os.walk(path):
+        dirs[:] = [d for d in dirs if not d.startswith(("_", "."))]
+        files.extend(os.path.join(root, name) for name in names if name.endswith(".parquet"))
+    return sorted(files)
+
+
+def is_partitioned(path: str) -> bool:
+    """Whether an existing dataset is partitioned by ingest_date."""
+    return os.path.isdir(path) and any(name.startswith(f"{PARTITION_COLUMN}=") for name in os.listdir(path))
+
+
+def _parquet_options(row_group_bytes: int) -> Dict[str, str]:
+    return {"compression": COMPRESSION, "parquet.block.size": str(row_group_bytes)}
+
+
+def _value_bytes(data_type: DataType) -> float:
+    """Raw width of a value of data_type; strings and collections by assumption."""
+    if isinstance(data_type, (StringType, BinaryType)):
+        return STRING_BYTES
+    if isinstance(data_type, (BooleanType, ByteType)):
+        return 1
+    if isinstance(data_type, ShortType):
+        return 2
+    if isinstance(data_type, (IntegerType, FloatType, DateType)):
+        return 4
+    if isinstance(data_type, DecimalType):
+        return 16
+    if isinstance(data_type, StructType):
+        return sum(_value_bytes(field.dataType) for field in data_type.fields)
+    if isinstance(data_type, ArrayType):
+        return 4 * _value_bytes(data_type.elementType)
+    if isinstance(data_type, MapType):
+        return 4 * (_value_bytes(data_type.keyType) + _value_bytes(data_type.valueType))
+    # long, double, timestamp
+    return 8
+
+
+def estimate_row_bytes(df: DataFrame, path: Optional[str] = None) -> float:
+    """
+    Compressed Parquet bytes per row: measured from the footers of the
+    dataset already at path, else estimated from the width of df's schema.
+    Neither runs a Spark job.
+    """
+    rows = size = 0
+    for f in dataset_files(path) if path else []:
+        try:
+            rows += pq.ParquetFile(f).metadata.num_rows
+            size += os.path.getsize(f)
+        except (OSError, ValueError):
+            continue
+    if rows:
+        return size / rows
+    return _value_bytes(df.schema) * PARQUET_COMPRESSION_RATIO
+
+
+def plan_files(row_bytes: float, target_file_bytes: int) -> Dict[str, int]:
+    """Rows per file and the shuffle partition size that give files of about target_file_bytes."""
+    return {"rows_per_file": max(1, int(target_file_bytes / row_bytes)) if row_bytes else 0,
+            "partition_bytes": int(target_file_bytes * SHUFFLE_BYTES_PER_OUTPUT_BYTE)}
+
+
+def write_dataset(df: DataFrame, path: str, mode: str = "append",
+                  target_file_bytes: Optional[int] = DEFAULT_TARGET_FILE_BYTES,
+                  row_group_bytes: int = DEFAULT_ROW_GROUP_BYTES,
+                  partition_by_date: bool = False, staging_dir: Optional[str] = None) -> Dict[str, int]:
+    """
+    Write df to the dataset at path, in files of about target_file_bytes
+    when given. Returns the plan used ({} when not sized), with the number
+    of files written.
+
+    Appends follow the layout of the existing dataset: Spark cannot read a
+    directory that mixes partitioned and flat files.
+
+    With staging_dir the files are written there instead (replacing what an
+    earlier attempt left), laid out for path; plan_commit and commit_files
+    then move them into path.
+    """
+    if mode == "append" and dataset_files(path):
+        existing = is_partitioned(path)
+        if existing != partition_by_date:
+            layout = "partitioned by ingest_date" if existing else "not partitioned"
+            print(f"⚠ Existing dataset at {path} is {layout}; appending in the same layout "
+                  f"(use --full-refresh to change it)")
+        partition_by_date = existing
+
+    if partition_by_date:
+        date = to_date(col("ingest_timestamp")) if "ingest_timestamp" in df.columns else current_date()
+        df = df.withColumn(PARTITION_COLUMN, date)
+
+    plan: Dict[str, int] = {}
+    writer_df = df
+    if target_file_bytes:
+        plan = plan_files(estimate_row_bytes(df, path), target_file_bytes)
+        # Rebalanced by date: each date is cut into target-sized partitions, and no task writes every date
+        writer_df = df.hint("rebalance", PARTITION_COLUMN) if partition_by_date else df.hint("rebalance")
+
+    target = staging_dir or path
+    writer = writer_df.write.mode("overwrite" if staging_dir else mode).options(**_parquet_options(row_group_bytes))
+    if plan.get("rows_per_file"):
+        writer = writer.option("maxRecordsPerFile", plan["rows_per_file"])
+    if partition_by_date:
+        writer = writer.partitionBy(PARTITION_COLUMN)
+
+    conf = df.sparkSession.conf
+    previous = conf.get(ADVISORY_PARTITION_SIZE, None)
+    before = set(dataset_files(target)) if plan and mode == "append" and not staging_dir else set()
+    if plan:
+        conf.set(ADVISORY_PARTITION_SIZE, str(plan["partition_bytes"]))
+    try:
+        writer.parquet(target)
+    finally:
+        if plan:
+            if previous is None:
+                conf.unset(ADVISORY_PARTITION_SIZE)
+            else:
+                conf.set(ADVISORY_PARTITION_SIZE, previous)
+    if plan:
+        plan["files"] = len(set(dataset_files(target)) - before)
+    return plan
+
+
+def plan_commit(staging_dir: str, path: str, replace: bool = False) -> Dict[str, List]:
+    """
+    Moves that put the files written to staging_dir into the dataset at path
+    (partition directories kept), plus the files they replace when the write
+    was an overwrite. Record this before calling commit_files.
+    """
+    moves = [(f, os.path.join(path, os.path.relpath(f, staging_dir))) for f in dataset_files(staging_dir)]
+    return {"moves": moves, "replaced": dataset_files(path) if replace else []}
+
+
+def commit_files(commit: Dict[str, List]):
+    """
+    Make the moves of plan_commit and delete the files they replace. Moves
+    already made and files already gone are skipped, so repeating this after
+    an interruption finishes the commit instead of duplicating it.
+    """
+    for staged, final in commit["moves"]:
+        if os.path.exists(staged):
+            os.makedirs(os.path.dirname(final), exist_ok=True)
+            os.replace(staged, final)
+    for old in commit["replaced"]:
+        if os.path.exists(old):
+            os.remove(old)
+        # A partition directory emptied by an overwrite would make the dataset look partitioned
+        directory = os.path.dirname(old)
+        if os.path.basename(directory).startswith(f"{PARTITION_COLUMN}=") and os.path.isdir(directory) \
+                and not os.listdir(directory):
+            os.rmdir(directory)
+
+
+def _partition_dirs(path: str) -> List[str]:
+    if is_partitioned(path):
+        return sorted(os.path.join(path, name) for name in os.listdir(path)
+                      if name.startswith(f"{PARTITION_COLUMN}="))
+    return [path]
+
+
+def _finish_swap(journal_path: str):
+    """Move compacted files into place and delete the files they replace."""
+    with open(journal_path, "r", encoding="utf-8") as f:
+        commit_files(json.load(f))
+    os.remove(journal_path)
+
+
+def compact_dataset(spark: SparkSession, path: str,
+                    target_file_bytes: int = DEFAULT_TARGET_FILE_BYTES,
+                    row_group_bytes: int = DEFAULT_ROW_GROUP_BYTES) -> List[Dict[str, Any]]:
+    """
+    Merge the small files of every partition of the dataset at path into
+    files of about target_file_bytes. Partitions with fewer than two small
+    files are not rewritten. Returns one entry per compacted partition.
+    """
+    journal_path = os.path.join(path, COMPACTION_JOURNAL)
+    if os.path.exists(journal_path):
+        print("♻ Finishing an interrupted compaction...")
+        _finish_swap(journal_path)
+
+    compacted = []
+    small_limit = target_file_bytes * SMALL_FILE_RATIO
+    for partition in _partition_dirs(path):
+        small = [os.path.join(partition, name) for name in sorted(os.listdir(partition))
+                 if name.endswith(".parquet") and os.path.getsize(os.path.join(partition, name)) < small_limit]
+        if len(small) < 2:
+            continue
+
+        small_bytes = sum(os.path.getsize(f) for f in small)
+        files = max(1, math.ceil(small_bytes / target_file_bytes))
+        print(f"🗜 Compacting {len(small)} files ({small_bytes / MB:.1f} MB) in {partition} into {files}")
+        staging = os.path.join(path, COMPACTION_DIR, uuid.uuid4().hex)
+        df = spark.read.option("mergeSchema", "true").parquet(*small)
+        if PARTITION_COLUMN in df.columns:
+            df = df.drop(PARTITION_COLUMN)
+        df.repartition(files).write.mode("overwrite").options(**_parquet_options(row_group_bytes)).parquet(staging)
+
+        # Record the swap before making it, so a crash halfway is finished, not repeated
+        moves = [(f, os.path.join(partition, f"part-compacted-{uuid.uuid4().hex}.zstd.parquet"))
+                 for f in dataset_files(staging)]
+        with open(journal_path, "w", encoding="utf-8") as f:
+            json.dump({"moves": moves, "replaced": small}, f)
+        _finish_swap(journal_path)
+        shutil.rmtree(staging, ignore_errors=True)
+        compacted.append({"partition": os.path.basename(partition.rstrip("/")), "files_in": len(small),
+                          "files_out": len(moves), "bytes": small_bytes})
+
+    shutil.rmtree(os.path.join(path, COMPACTION_DIR), ignore_errors=True)
+    return compacted
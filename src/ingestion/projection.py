@@ -0,0 +1,54 @@
+"""
+Single-select projection builder for read_file's cleaning step.
+
+Building the null/NaN handling and nested-type stringification as one list of
+column expressions keeps the analyzed plan a single Project node regardless of
+column count, instead of one (or two) Project nodes per column from chained
+withColumn calls.
+"""
+from typing import List
+
+from pyspark.sql import Column, DataFrame
+from pyspark.sql.functions import col, isnan, lit, when
+from pyspark.sql.types import ArrayType, DoubleType, FloatType, MapType, StructField, StructType
+
+# Formats whose reader already yields a typed, self-describing schema
+PASSTHROUGH_FORMATS = {"parquet"}
+
+
+def quote_identifier(name: str) -> str:
+    """Backtick-quote a column name so dots and spaces are taken literally."""
+    return "`" + name.replace("`", "``") + "`"
+
+
+def clean_column(field: StructField) -> Column:
+    """Return the cleaning expression for a single field, aliased to its name."""
+    c = col(quote_identifier(field.name))
+    data_type = field.dataType
+
+    if isinstance(data_type, (StructType, ArrayType, MapType)):
+        # Nested structures are stored as their string representation
+        expr = when(c.isNotNull(), c.cast("string")).otherwise(lit(""))
+    elif isinstance(data_type, (DoubleType, FloatType)):
+        # isnan() only works on floating point columns, so it is only applied here
+        expr = when(c.isNull() | isnan(c), lit("")).otherwise(c.cast("string"))
+    else:
+        expr = when(c.isNull(), lit("")).otherwise(c.cast("string"))
+
+    return expr.alias(field.name)
+
+
+def build_cleaning_projection(schema: StructType) -> List[Column]:
+    """Build one expression per field, in a single pass over the schema."""
+    return [clean_column(field) for field in schema.fields]
+
+
+def apply_cleaning_projection(df: DataFrame, fmt: str = None) -> DataFrame:
+    """
+    Fill nulls/NaNs with empty strings and stringify nested types in one select.
+
+    Parquet input is passed through untouched so its schema stays intact.
+    """
+    if fmt in PASSTHROUGH_FORMATS:
+        return df
+    return df.select(*build_cleaning_projection(df.schema))
@@ -0,0 +1,176 @@
+"""
+Run journal: per-file checkpoints that make an ingestion run resumable.
+
+Without it nothing is persisted between reading a file and the final write,
+so a run that dies on file 900 of 1,000 starts over. With it, every file's
+normalized, keyed output is written to the run's work directory as soon as
+it has been read, and the journal records it (with its content hash and row
+counts). Reading the staged Parquet back also cuts each file's lineage, so
+the union/dedup plan no longer carries every parser and cleaning step, and a
+file that fails while being materialized fails on its own instead of taking
+down the union.
+
+Layout:
+    _runs/<run_id>/journal.json
+    _runs/<run_id>/staged/<id>/part-*.parquet
+    _runs/<run_id>/output/...            the run's Parquet output, before it is committed
+
+A restarted run picks up the latest unfinished journal (or the one named
+with --resume), reuses the staged output of files whose content is
+unchanged, and only reads the rest before redoing union, dedup and publish.
+Staged outputs hold canonical keys in the run's --key-format, so a run is
+only resumed with the same format.
+
+Publishing is idempotent: the output is written to the run directory, the
+files to move into the dataset are recorded (COMMITTING), and only then
+moved. A run that dies before the record rewrites its output from scratch;
+one that dies after it finishes the recorded moves and writes nothing again.
+The work directory is removed once the run has been recorded in the manifest.
+"""
+import os
+import json
+import time
+import shutil
+import threading
+import uuid
+from typing import Any, Dict, List, Optional
+
+from pyspark.sql import DataFrame, SparkSession
+from pyspark.sql.types import StructType
+from pyspark.sql.utils import AnalysisException
+
+from key_strategies import KEY_COLUMN, KEY_FORMATS, is_binary_format
+
+RUNS_PATH = "../../data_processed/_runs/"
+JOURNAL_FILE = "journal.json"
+JOURNAL_VERSION = 2
+
+# Journal status: files being read, output being written, output files being moved into the dataset,
+# output published (manifest pending)
+READING = "reading"
+PUBLISHING = "publishing"
+COMMITTING = "committing"
+PUBLISHED = "published"
+
+
+class RunJournal:
+    """Staged per-file outputs and progress of one ingestion run."""
+
+    def __init__(self, run_id: str, root: str = RUNS_PATH, key_format: Optional[str] = None):
+        self.run_id = run_id
+        self.root = root
+        self.dir = os.path.join(root, run_id)
+        self.path = os.path.join(self.dir, JOURNAL_FILE)
+        self.output_dir = os.path.join(self.dir, "output")
+        self.key_format = key_format
+        self.status = READING
+        self.started_at = time.time()
+        # key (file path, or executor group label) -> {"paths", "sha256", "dir", "schema", "metrics"}
+        self.entries: Dict[str, Dict[str, Any]] = {}
+        self.extra: Dict[str, Any] = {}
+        # Content hashes of this run's input files, set by the caller (the manifest computes them)
+        self.fingerprints: Dict[str, Optional[str]] = {}
+        self._lock = threading.Lock()
+
+    @classmethod
+    def load(cls, run_id: str, root: str = RUNS_PATH) -> "RunJournal":
+        journal = cls(run_id, root)
+        if not os.path.exists(journal.path):
+            raise ValueError(f"No journal for run {run_id} in {root}")
+        with open(journal.path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        journal.status = data.get("status", READING)
+        journal.key_format = data.get("key_format")
+        journal.started_at = data.get("started_at", journal.started_at)
+        journal.entries = data.get("entries", {})
+        journal.extra = data.get("extra", {})
+        return journal
+
+    @classmethod
+    def latest_unfinished(cls, root: str = RUNS_PATH) -> Optional["RunJournal"]:
+        """The most recent run whose work directory is still there, i.e. that did not finish."""
+        if not os.path.isdir(root):
+            return None
+        # Run ids start with a UTC timestamp, so they sort by start time
+        for run_id in sorted(os.listdir(root), reverse=True):
+            if os.path.exists(os.path.join(root, run_id, JOURNAL_FILE)):
+                return cls.load(run_id, root)
+        return None
+
+    def save(self):
+        """Atomically persist the journal."""
+        os.makedirs(self.dir, exist_ok=True)
+        tmp_path = f"{self.path}.tmp"
+        with self._lock:
+            data = {
+                "version": JOURNAL_VERSION,
+                "run_id": self.run_id,
+                "status": self.status,
+                "key_format": self.key_format,
+                "started_at": self.started_at,
+                "entries": self.entries,
+                "extra": self.extra,
+            }
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(data, f, indent=2, sort_keys=True)
+            os.replace(tmp_path, self.path)
+
+    def set_status(self, status: str, **extra):
+        self.status = status
+        self.extra.update(extra)
+        self.save()
+
+    def check_key_format(self, key_format: str):
+        """Refuse to resume with another --key-format than the run was started with."""
+        if self.key_format is None:
+            # Journals written before the format was recorded: tell hex from binary by the staged schemas
+            binary = {field["type"] == "binary" for entry in self.entries.values()
+                      for field in json.loads(entry["schema"])["fields"] if field["name"] == KEY_COLUMN}
+            if not binary or binary == {is_binary_format(key_format)}:
+                return
+            started_with = " or ".join(f for f in KEY_FORMATS if is_binary_format(f) == (True in binary))
+        elif self.key_format == key_format:
+            return
+        else:
+            started_with = self.key_format
+        raise ValueError(f"Run {self.run_id} was started with --key-format {started_with} and its staged output "
+                         f"holds those keys; resume it with the same format, or delete {self.dir} to start over")
+
+    def completed(self) -> Dict[str, Dict[str, Any]]:
+        """Staged entries still valid for this run: every file they cover is unchanged."""
+        valid = {}
+        for key, entry in self.entries.items():
+            if all(path in self.fingerprints and self.fingerprints[path] == entry["sha256"].get(path)
+                   for path in entry["paths"]):
+                valid[key] = entry
+        return valid
+
+    def stage(self, spark: SparkSession, key: str, df: DataFrame, paths: List[str]) -> DataFrame:
+        """
+        Write df to the work directory, record it, and return the staged copy.
+        Executing df here runs the file's observed metrics too.
+        """
+        staged_dir = os.path.join(self.dir, "staged", uuid.uuid4().hex[:12])
+        df.write.mode("overwrite").parquet(staged_dir)
+        with self._lock:
+            self.entries[key] = {"paths": paths, "sha256": {p: self.fingerprints.get(p) for p in paths},
+                                 "dir": staged_dir, "schema": df.schema.json(), "metrics": {}}
+        self.save()
+        return self.read_staged(spark, key)
+
+    def record_metrics(self, key: str, metrics: Dict[str, Any]):
+        with self._lock:
+            self.entries[key]["metrics"] = metrics
+        self.save()
+
+    def read_staged(self, spark: SparkSession, key: str) -> DataFrame:
+        entry = self.entries[key]
+        try:
+            return spark.read.parquet(entry["dir"])
+        except AnalysisException:
+            # An empty input may leave no Parquet file to take the schema from
+            return spark.createDataFrame([], StructType.fromJson(json.loads(entry["schema"])))
+
+    def cleanup(self):
+        """Remove the work directory (staged outputs and journal) once the run is recorded."""
+        shutil.rmtree(self.dir, ignore_errors=True)
@@ -0,0 +1,208 @@
+"""
+Single-pass ingestion statistics.
+
+Row counts are gathered with Spark observed metrics (`DataFrame.observe`), so
+per-file input rows, corrupt rows, duplicates removed and output rows all fall
+out of the one write job instead of separate `count()` actions that re-run the
+whole lineage. A source read from several files at once (a grouped read) is
+also counted per file, by input_file_name(), in the same observation. Stage durations are tracked on the driver and everything is
+written out as a JSON run report.
+"""
+import os
+import json
+import time
+import threading
+from contextlib import contextmanager
+from typing import Any, Dict, List, Optional
+
+from pyspark.sql import Column, DataFrame, Observation
+from pyspark.sql.functions import col, count, create_map, expr, lit, when, sum as spark_sum
+
+RUN_REPORT_DIR = "../../data_processed/run_reports/"
+CORRUPT_COLUMN = "_corrupt_record"
+# Position of a row's input file among a grouped source's files, only while it is observed
+SOURCE_INDEX_COLUMN = "_source_index"
+
+
+def _iso(ts: float) -> str:
+    return time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime(ts))
+
+
+def _source_file_name() -> Column:
+    """Name of the file a row was read from: the last segment of input_file_name(), which is URL-encoded."""
+    # "+" stands for itself in a file URI, so it is protected from url_decode
+    return expr("url_decode(replace(element_at(split(input_file_name(), '/'), -1), '+', '%2B'))")
+
+
+class IngestionStats:
+    """
+    Collects metrics for one ingestion run.
+
+    Metrics attached with observe_source()/observe_output() only become
+    available after an action that executes the observed DataFrame has
+    finished, so collect() must be called after the write succeeds. A source
+    dropped before that (a failed read or staging) must be forget()-ten, or
+    collect() would wait for its metrics forever.
+    """
+
+    def __init__(self, run_id: str):
+        self.run_id = run_id
+        self.started_at = time.time()
+        self.finished_at: Optional[float] = None
+        self.stages: List[Dict[str, Any]] = []
+        self.files: Dict[str, Dict[str, Any]] = {}
+        self.extra: Dict[str, Any] = {}
+        self._observations: Dict[str, Observation] = {}
+        self._members: Dict[str, List[str]] = {}
+        self._output_observation: Optional[Observation] = None
+        self._published_observation: Optional[Observation] = None
+        self._lock = threading.Lock()
+        self._collected = False
+
+    @contextmanager
+    def stage(self, name: str):
+        """Time a pipeline stage on the driver."""
+        started = time.time()
+        try:
+            yield
+        finally:
+            self.stages.append({"stage": name, "seconds": round(time.time() - started, 3)})
+
+    def observe_source(self, df: DataFrame, file_path: str, fmt: Optional[str] = None,
+                       member_paths: Optional[List[str]] = None) -> DataFrame:
+        """
+        Attach row/corrupt-row metrics to a freshly read source DataFrame.
+        member_paths are the files of a multi-path read (file_path is then
+        the group's label); their rows are counted one by one as well.
+        """
+        metrics = [count(lit(1)).alias("rows")]
+        corrupt = col(CORRUPT_COLUMN).isNotNull() if CORRUPT_COLUMN in df.columns else None
+        if corrupt is not None:
+            metrics.append(spark_sum(when(corrupt, 1).otherwise(0)).alias("corrupt_rows"))
+        if member_paths:
+            # The file of each row is looked up once; every member then only compares an index
+            names = create_map(*[lit(v) for i, path in enumerate(member_paths)
+                                 for v in (os.path.basename(path), i)])
+            df = df.withColumn(SOURCE_INDEX_COLUMN, names[_source_file_name()])
+            member = col(SOURCE_INDEX_COLUMN)
+            for i in range(len(member_paths)):
+                metrics.append(count(when(member == i, 1)).alias(f"rows_{i}"))
+                if corrupt is not None:
+                    metrics.append(count(when((member == i) & corrupt, 1)).alias(f"corrupt_rows_{i}"))
+
+        with self._lock:
+            observation = Observation(f"ingest_source_{len(self._observations)}")
+            self._observations[file_path] = observation
+            self._members[file_path] = list(member_paths or [])
+            self.files[file_path] = {"file": os.path.basename(file_path), "format": fmt}
+        observed = df.observe(observation, *metrics)
+        return observed.drop(SOURCE_INDEX_COLUMN) if member_paths else observed
+
+    def observe_output(self, df: DataFrame) -> DataFrame:
+        """Attach the output row count to the final DataFrame that gets written."""
+        self._output_observation = Observation("ingest_output")
+        return df.observe(self._output_observation, count(lit(1)).alias("rows"))
+
+    def observe_published(self, df: DataFrame, flag_column: str) -> DataFrame:
+        """Count incoming rows whose key is already published (flag_column not null)."""
+        self._published_observation = Observation("ingest_published")
+        return df.observe(self._published_observation,
+                          spark_sum(when(col(flag_column).isNotNull(), 1).otherwise(0)).alias("rows"))
+
+    def forget(self, file_path: str):
+        """Stop waiting for the metrics of a source whose DataFrame will never be executed."""
+        with self._lock:
+            self._observations.pop(file_path, None)
+            self._members.pop(file_path, None)
+
+    def record_file(self, file_path: str, **values):
+        """Attach driver-side facts (timings, pool, errors) to a file entry."""
+        with self._lock:
+            self.files.setdefault(file_path, {"file": os.path.basename(file_path)}).update(values)
+
+    def source_metrics(self, file_path: str) -> Dict[str, Any]:
+        """
+        Observed row counts of one source; blocks until an action has executed
+        it. A grouped source also gets "file_counts", the counts of each of its files.
+        """
+        if file_path not in self._observations:
+            return {}
+        metrics = self._observations[file_path].get
+        rows = int(metrics.get("rows") or 0)
+        corrupt = int(metrics.get("corrupt_rows") or 0)
+        result: Dict[str, Any] = {"rows_read": rows, "corrupt_rows": corrupt, "rows": rows - corrupt}
+        members = self._members.get(file_path)
+        if members:
+            result["file_counts"] = []
+            for i, path in enumerate(members):
+                rows = int(metrics.get(f"rows_{i}") or 0)
+                corrupt = int(metrics.get(f"corrupt_rows_{i}") or 0)
+                result["file_counts"].append({"file": os.path.basename(path), "path": path, "rows_read": rows,
+                                              "corrupt_rows": corrupt, "rows": rows - corrupt})
+        return result
+
+    def collect(self):
+        """Pull observed metrics into the file entries. Call once after the write job."""
+        if self._collected:
+            return
+        for file_path in self._observations:
+            self.files[file_path].update(self.source_metrics(file_path))
+        if self._output_observation is not None:
+            self.extra["output_rows"] = int(self._output_observation.get.get("rows") or 0)
+        if self._published_observation is not None:
+            self.extra["matched_published_rows"] = int(self._published_observation.get.get("rows") or 0)
+        self.finished_at = time.time()
+        self._collected = True
+
+    def file_rows(self, file_path: str) -> Optional[int]:
+        """Rows read from one file, whether it was a source of its own or part of a grouped read."""
+        if file_path in self.files:
+            return self.files[file_path].get("rows")
+        for entry in self.files.values():
+            for counts in entry.get("file_counts", []):
+                if counts["path"] == file_path:
+                    return counts["rows"]
+        return None
+
+    def totals(self) -> Dict[str, int]:
+        rows_in = sum(f.get("rows", 0) for f in self.files.values())
+        corrupt = sum(f.get("corrupt_rows", 0) for f in self.files.values())
+        totals = {"rows_in": rows_in, "corrupt_rows": corrupt}
+        if "output_rows" in self.extra:
+            matched = self.extra.get("matched_published_rows", 0)
+            totals["rows_out"] = self.extra["output_rows"]
+            # Rows matching already-published keys are counted apart from in-run duplicates
+            totals["matched_published"] = matched
+            totals["duplicates_removed"] = rows_in - self.extra["output_rows"] - matched
+        return totals
+
+    def report(self) -> Dict[str, Any]:
+        """Build the machine-readable run report."""
+        finished_at = self.finished_at or time.time()
+        totals = self.totals()
+        stages = []
+        for stage in self.stages:
+            entry = dict(stage)
+            # Every stage handles the run's input rows; throughput is relative to those
+            if stage["seconds"] > 0 and totals["rows_in"]:
+                entry["rows_per_second"] = round(totals["rows_in"] / stage["seconds"], 1)
+            stages.append(entry)
+
+        return {
+            "run_id": self.run_id,
+            "started_at": _iso(self.started_at),
+            "finished_at": _iso(finished_at),
+            "duration_seconds": round(finished_at - self.started_at, 3),
+            "totals": totals,
+            "stages": stages,
+            "files": list(self.files.values()),
+            **{k: v for k, v in self.extra.items() if k not in ("output_rows", "matched_published_rows")},
+        }
+
+    def write_report(self, directory: str = RUN_REPORT_DIR) -> str:
+        """Write the report as <run_id>.json and return its path."""
+        os.makedirs(directory, exist_ok=True)
+        path = os.path.join(directory, f"{self.run_id}.json")
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(self.report(), f, indent=2, default=str)
+        return path
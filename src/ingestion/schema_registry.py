@@ -0,0 +1,196 @@
+"""
+Schema registry for CSV/JSON sources.
+
+Holds two kinds of schemas:
+- declared schemas, configured per source filename pattern in
+  schema_registry.json, which always win;
+- inferred schemas, cached per file fingerprint (content hash), so a repeat
+  read of the same file uses an explicit StructType and skips the extra
+  inference pass.
+
+The latest schema seen for each source is kept as well. When a newly inferred
+schema adds, removes or retypes columns relative to it, the difference is
+recorded as schema drift and reported rather than silently accepted.
+"""
+import os
+import re
+import json
+import time
+import fnmatch
+import threading
+from typing import Any, Dict, List, Optional
+
+from pyspark.sql.types import StringType, StructField, StructType
+
+from manifest import file_sha256
+
+REGISTRY_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "schema_registry.json")
+SCHEMA_CACHE_PATH = "../../data_processed/schema_cache.json"
+CORRUPT_COLUMN = "_corrupt_record"
+
+# Formats whose Spark reader supports (and otherwise needs) schema inference
+REGISTRY_FORMATS = {"csv", "json"}
+
+
+def source_key(file_path: str) -> str:
+    """
+    Derive a source identifier from a filename.
+
+    Digit runs are collapsed so dated drops of one feed (orders_20251101.csv,
+    orders_20251102.csv) share a source and are compared against each other.
+    """
+    return re.sub(r"\d+", "#", os.path.basename(file_path).lower())
+
+
+def schema_diff(old: StructType, new: StructType) -> Dict[str, List[str]]:
+    """Describe added, removed and retyped columns between two schemas."""
+    old_types = {f.name: f.dataType.simpleString() for f in old.fields}
+    new_types = {f.name: f.dataType.simpleString() for f in new.fields}
+    return {
+        "added": [n for n in new_types if n not in old_types],
+        "removed": [n for n in old_types if n not in new_types],
+        "changed": [f"{n}: {old_types[n]} -> {new_types[n]}"
+                    for n in new_types if n in old_types and old_types[n] != new_types[n]],
+    }
+
+
+def without_corrupt_column(schema: StructType) -> StructType:
+    return StructType([f for f in schema.fields if f.name != CORRUPT_COLUMN])
+
+
+def with_corrupt_column(schema: StructType) -> StructType:
+    """Add the PERMISSIVE-mode corrupt record column so bad rows are still captured."""
+    if CORRUPT_COLUMN in schema.fieldNames():
+        return schema
+    return StructType(list(schema.fields) + [StructField(CORRUPT_COLUMN, StringType(), True)])
+
+
+class SchemaRegistry:
+    """Declared and cached inferred schemas, plus drift tracking."""
+
+    def __init__(self, registry_path: str = REGISTRY_PATH, cache_path: str = SCHEMA_CACHE_PATH,
+                 use_cache: bool = True):
+        self.registry_path = registry_path
+        self.cache_path = cache_path
+        self.use_cache = use_cache
+        self.declared: List[Dict[str, Any]] = []
+        self.cache: Dict[str, Any] = {"files": {}, "sources": {}}
+        self.drift: List[Dict[str, Any]] = []
+        self._fingerprints: Dict[str, str] = {}
+        self._lock = threading.Lock()
+        self._load()
+
+    def _load(self):
+        if os.path.exists(self.registry_path):
+            with open(self.registry_path, "r", encoding="utf-8") as f:
+                for entry in json.load(f).get("declared", []):
+                    self.declared.append({
+                        "pattern": entry["pattern"].lower(),
+                        "schema": StructType.fromJson(entry["schema"]),
+                    })
+        if os.path.exists(self.cache_path):
+            try:
+                with open(self.cache_path, "r", encoding="utf-8") as f:
+                    self.cache = json.load(f)
+            except (OSError, ValueError) as e:
+                print(f"⚠ Could not read schema cache {self.cache_path}, starting fresh: {e}")
+            self.cache.setdefault("files", {})
+            self.cache.setdefault("sources", {})
+
+    def save(self):
+        """Atomically persist the inferred-schema cache."""
+        os.makedirs(os.path.dirname(os.path.abspath(self.cache_path)), exist_ok=True)
+        tmp_path = f"{self.cache_path}.tmp"
+        with self._lock, open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(self.cache, f, indent=2, sort_keys=True)
+        os.replace(tmp_path, self.cache_path)
+
+    def seed_fingerprints(self, fingerprints: Dict[str, Optional[str]]):
+        """Reuse content hashes already computed elsewhere (e.g. by the manifest)."""
+        with self._lock:
+            for path, digest in fingerprints.items():
+                if digest:
+                    self._fingerprints[os.path.abspath(path)] = digest
+
+    def fingerprint(self, file_path: str) -> str:
+        key = os.path.abspath(file_path)
+        with self._lock:
+            digest = self._fingerprints.get(key)
+        if digest is None:
+            digest = file_sha256(file_path)
+            with self._lock:
+                self._fingerprints[key] = digest
+        return digest
+
+    def declared_schema(self, file_path: str) -> Optional[StructType]:
+        name = os.path.basename(file_path).lower()
+        for entry in self.declared:
+            if fnmatch.fnmatch(name, entry["pattern"]):
+                return entry["schema"]
+        return None
+
+    def resolve(self, file_path: str, fmt: str) -> Optional[StructType]:
+        """
+        Return an explicit schema for the file, or None if it must be inferred.
+
+        The returned schema includes the corrupt record column.
+        """
+        if fmt not in REGISTRY_FORMATS:
+            return None
+
+        declared = self.declared_schema(file_path)
+        if declared is not None:
+            return with_corrupt_column(declared)
+
+        if not self.use_cache:
+            return None
+        digest = self.fingerprint(file_path)
+        with self._lock:
+            cached = self.cache["files"].get(digest)
+        if cached is None:
+            return None
+        return with_corrupt_column(StructType.fromJson(cached["schema"]))
+
+    def check_header(self, file_path: str, schema: StructType, header: List[str]) -> bool:
+        """
+        Compare a CSV header against an explicit schema.
+
+        A mismatch is recorded as drift; the caller should fall back to inference.
+        """
+        expected = [f.name for f in without_corrupt_column(schema).fields]
+        header = [h.strip() for h in header]
+        if header == expected:
+            return True
+        self._record_drift(file_path, {
+            "added": [h for h in header if h not in expected],
+            "removed": [e for e in expected if e not in header],
+            "changed": [] if set(header) != set(expected) else ["column order"],
+        }, "header does not match registered schema")
+        return False
+
+    def register(self, file_path: str, fmt: str, schema: StructType):
+        """Cache a freshly inferred schema and compare it with the source's previous one."""
+        if fmt not in REGISTRY_FORMATS:
+            return
+        schema = without_corrupt_column(schema)
+        source = source_key(file_path)
+        digest = self.fingerprint(file_path)
+
+        with self._lock:
+            previous = self.cache["sources"].get(source)
+        if previous is not None:
+            diff = schema_diff(StructType.fromJson(previous["schema"]), schema)
+            if any(diff.values()):
+                self._record_drift(file_path, diff, f"differs from cached schema of source '{source}'")
+
+        now = time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime())
+        with self._lock:
+            self.cache["files"][digest] = {"source": source, "schema": schema.jsonValue(), "cached_at": now}
+            self.cache["sources"][source] = {"schema": schema.jsonValue(), "fingerprint": digest, "updated_at": now}
+
+    def _record_drift(self, file_path: str, diff: Dict[str, List[str]], reason: str):
+        entry = {"file": os.path.basename(file_path), "source": source_key(file_path), "reason": reason, **diff}
+        with self._lock:
+            self.drift.append(entry)
+        details = ", ".join(f"{k}: {v}" for k, v in diff.items() if v)
+        print(f"⚠ Schema drift in {entry['file']} ({reason}) - {details}")
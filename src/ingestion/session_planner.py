@@ -0,0 +1,155 @@
+"""
+Input-size-aware Spark session settings.
+
+Spark's defaults (200 shuffle partitions, 128MB input splits, 1g driver) are
+wrong at both ends: a 5 KB sample becomes 200 near-empty shuffle tasks, and a
+500 GB drop gets 200 shuffle partitions of several GB each. plan_session runs
+before the session is created, from the total size of the files the run is
+about to read, and picks:
+
+- spark.sql.shuffle.partitions: about one partition per target_partition_bytes
+  of (estimated uncompressed) input, at least one per core, rounded up to a
+  multiple of the core count so no wave of tasks is left half empty,
+- spark.sql.files.maxPartitionBytes: small enough that every core gets a
+  split of a small input, capped by the profile for a large one,
+- Arrow transfer between the JVM and Python (batch size by profile),
+- spark.driver.memory: the profile's base plus a share of the input, capped
+  at a fraction of the machine's memory in the local profile.
+
+Profiles hold the knobs per environment; any resulting setting can be
+overridden with --spark-conf KEY=VALUE.
+"""
+import os
+import math
+from typing import Any, Dict, Iterable, List, Optional
+
+from compressed_io import split_compression_extension
+
+MB = 1024 * 1024
+GB = 1024 * MB
+
+PROFILES: Dict[str, Dict[str, Any]] = {
+    # One machine: every core of it, driver and executors share its memory
+    "local": {
+        "target_partition_bytes": 64 * MB,
+        "max_split_bytes": 128 * MB,
+        "max_shuffle_partitions": 2000,
+        "driver_memory_base": 2 * GB,
+        "driver_memory_per_input": 0.02,
+        "driver_memory_max_fraction": 0.6,
+        "arrow_batch_rows": 10000,
+    },
+    # spark-submit to a cluster; the driver only plans and parses driver-side formats
+    "cluster": {
+        "target_partition_bytes": 128 * MB,
+        "max_split_bytes": 128 * MB,
+        "max_shuffle_partitions": 10000,
+        "driver_memory_base": 4 * GB,
+        "driver_memory_per_input": 0.01,
+        "driver_memory_max": 16 * GB,
+        "arrow_batch_rows": 10000,
+        "default_cores": 64,
+    },
+    # Multi-terabyte re-ingestion: fewer, larger tasks and skew handling
+    "large-backfill": {
+        "target_partition_bytes": 256 * MB,
+        "max_split_bytes": 512 * MB,
+        "max_shuffle_partitions": 50000,
+        "driver_memory_base": 8 * GB,
+        "driver_memory_per_input": 0.005,
+        "driver_memory_max": 32 * GB,
+        "arrow_batch_rows": 50000,
+        "default_cores": 256,
+        "extra_conf": {
+            "spark.sql.adaptive.skewJoin.enabled": "true",
+            "spark.sql.adaptive.advisoryPartitionSizeInBytes": str(256 * MB),
+            "spark.network.timeout": "600s",
+        },
+    },
+}
+DEFAULT_PROFILE = "local"
+MIN_SPLIT_BYTES = 1 * MB
+# Rough in-memory expansion of compressed text
+COMPRESSION_RATIOS = {"gzip": 5.0, "bz2": 6.0, "zstd": 5.0, "xz": 7.0}
+
+
+def input_bytes(file_paths: Iterable[str]) -> int:
+    """Estimated uncompressed size of the files, from their sizes and compression suffixes."""
+    total = 0.0
+    for path in file_paths:
+        try:
+            size = os.path.getsize(path)
+        except OSError:
+            continue
+        compression = split_compression_extension(path)[1]
+        total += size * COMPRESSION_RATIOS.get(compression, 1.0)
+    return int(total)
+
+
+def _memory_bytes() -> Optional[int]:
+    try:
+        return os.sysconf("SC_PAGE_SIZE") * os.sysconf("SC_PHYS_PAGES")
+    except (ValueError, OSError, AttributeError):
+        return None
+
+
+def _round_up(value: int, multiple: int) -> int:
+    return int(math.ceil(value / multiple) * multiple)
+
+
+def plan_session(total_bytes: int, profile: str = DEFAULT_PROFILE, cores: Optional[int] = None,
+                 overrides: Optional[Dict[str, str]] = None) -> Dict[str, Any]:
+    """
+    Spark settings for reading total_bytes of input. Returns
+    {"profile", "input_bytes", "cores", "conf"}; conf maps config keys to values.
+    """
+    settings = PROFILES[profile]
+    if cores is None:
+        cores = (os.cpu_count() or 1) if profile == "local" else settings.get("default_cores", 64)
+    cores = max(1, cores)
+
+    wanted = math.ceil(total_bytes / settings["target_partition_bytes"])
+    shuffle_partitions = min(settings["max_shuffle_partitions"], _round_up(max(cores, wanted), cores))
+
+    # Small inputs are split so every core reads something; large ones get the profile's split size
+    split_bytes = min(settings["max_split_bytes"], max(MIN_SPLIT_BYTES, total_bytes // (cores * 2)))
+
+    driver_memory = settings["driver_memory_base"] + int(total_bytes * settings["driver_memory_per_input"])
+    if "driver_memory_max_fraction" in settings and _memory_bytes():
+        driver_memory = min(driver_memory, int(_memory_bytes() * settings["driver_memory_max_fraction"]))
+    if "driver_memory_max" in settings:
+        driver_memory = min(driver_memory, settings["driver_memory_max"])
+    driver_memory = max(driver_memory, 1 * GB)
+
+    conf = {
+        "spark.sql.shuffle.partitions": str(shuffle_partitions),
+        "spark.sql.files.maxPartitionBytes": str(split_bytes),
+        "spark.sql.execution.arrow.pyspark.enabled": "true",
+        "spark.sql.execution.arrow.pyspark.fallback.enabled": "true",
+        "spark.sql.execution.arrow.maxRecordsPerBatch": str(settings["arrow_batch_rows"]),
+        "spark.driver.memory": f"{driver_memory // MB}m",
+        **settings.get("extra_conf", {}),
+        **(overrides or {}),
+    }
+    return {"profile": profile, "input_bytes": total_bytes, "cores": cores, "conf": conf}
+
+
+def parse_conf_overrides(pairs: Optional[List[str]]) -> Dict[str, str]:
+    """['spark.sql.shuffle.partitions=400', ...] -> {'spark.sql.shuffle.partitions': '400'}."""
+    overrides = {}
+    for pair in pairs or []:
+        key, sep, value = pair.partition("=")
+        if not sep or not key.strip():
+            raise ValueError(f"--spark-conf expects KEY=VALUE, got {pair!r}")
+        overrides[key.strip()] = value.strip()
+    return overrides
+
+
+def describe(plan: Dict[str, Any]) -> str:
+    """One-line summary of a plan for the console."""
+    conf = plan["conf"]
+    split = conf["spark.sql.files.maxPartitionBytes"]
+    split = f"{int(split) // MB} MB" if split.isdigit() else split
+    return (f"{plan['profile']} profile, {plan['input_bytes'] / MB:.1f} MB input on {plan['cores']} cores: "
+            f"{conf['spark.sql.shuffle.partitions']} shuffle partitions, {split} splits, "
+            f"driver {conf['spark.driver.memory']}")
@@ -0,0 +1,228 @@
+"""
+Bin-packing of small raw CSV/JSONL files into consolidated inputs.
+
+A drop of hundreds of thousands of tiny files spends its time on per-file
+work (probe, encoding detection, one Spark read and task per file) rather
+than on parsing. This pre-stage runs after the manifest has picked the new
+files and before anything is probed: small files that can share a reader are
+concatenated into packs of about target_bytes, and the rest of the pipeline
+sees one file per pack.
+
+Files are packed together when they have the same format and:
+- are plain UTF-8 (a BOM is dropped); compressed or otherwise encoded files
+  are left alone,
+- CSV: have the same header line, no quoted field spanning lines and as
+  many fields on every row as in the header,
+- JSON: are JSON Lines, one object per line.
+
+Every packed row gets a source_file column holding the raw file's name, so
+provenance survives the concatenation. Packs are named after the content
+hashes of their members, so a resumed run rebuilds the same pack paths and
+can reuse their staged output.
+"""
+import io
+import os
+import csv
+import json
+import hashlib
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from compressed_io import split_compression_extension
+from file_probe import format_from_extension, sniff_dialect
+
+MB = 1024 * 1024
+PACK_PATH = "../../data_processed/_staging/packs/"
+DEFAULT_PACK_BYTES = 128 * MB
+# Larger files already amortize their per-file overhead
+SMALL_FILE_BYTES = 8 * MB
+SOURCE_COLUMN = "source_file"
+PACK_EXTENSIONS = {"csv": ".csv", "json": ".jsonl"}
+# Lines of the first member used to sniff a CSV pack's dialect
+SNIFF_LINES = 200
+DEFAULT_WORKERS = min(32, (os.cpu_count() or 1) * 4)
+
+
+def _read_text(path: str) -> Optional[str]:
+    """Whole content of a plain UTF-8 file, or None if it cannot be packed as text."""
+    if split_compression_extension(path)[1] is not None:
+        return None
+    try:
+        with open(path, "rb") as f:
+            return f.read().decode("utf-8-sig")
+    except (OSError, UnicodeDecodeError):
+        return None
+
+
+def _lines(text: str) -> List[str]:
+    """Non-blank lines. Only \n (and \r\n) ends a line, as for Spark; splitlines() would also
+    split on \x0b, \x0c, \x1c-\x1e, \x85 and \u2028 inside a field."""
+    return [line[:-1] if line.endswith("\r") else line for line in text.split("\n") if line.strip()]
+
+
+def _field_count(line: str, dialect: Dict[str, Any]) -> int:
+    reader = csv.reader(io.StringIO(line), delimiter=dialect["delimiter"], quotechar=dialect["quote"],
+                        escapechar=dialect["escape"], doublequote=dialect["escape"] is None)
+    return len(next(reader, []))
+
+
+def classify(path: str, small_file_bytes: int = SMALL_FILE_BYTES) -> Optional[Tuple[str, ...]]:
+    """Pack key of a file (files with the same key can share a pack), or None to read it on its own."""
+    fmt = format_from_extension(path)
+    if fmt not in PACK_EXTENSIONS:
+        return None
+    try:
+        if os.path.getsize(path) > small_file_bytes:
+            return None
+    except OSError:
+        return None
+    text = _read_text(path)
+    if text is None:
+        return None
+    lines = _lines(text)
+    if not lines:
+        return None
+
+    if fmt == "json":
+        records = [line.strip() for line in lines]
+        if all(r.startswith("{") and r.endswith("}") and f'"{SOURCE_COLUMN}"' not in r for r in records):
+            return (fmt,)
+        return None
+
+    header = lines[0].strip()
+    if SOURCE_COLUMN in header:
+        return None
+    return fmt, header
+
+
+def _bin_pack(paths: List[str], sizes: Dict[str, int], target_bytes: int) -> List[List[str]]:
+    """First-fit decreasing: fill each bin up to target_bytes, largest files first."""
+    bins: List[List[str]] = []
+    free: List[int] = []
+    for path in sorted(paths, key=lambda p: sizes[p], reverse=True):
+        for i, room in enumerate(free):
+            if sizes[path] <= room:
+                bins[i].append(path)
+                free[i] -= sizes[path]
+                break
+        else:
+            bins.append([path])
+            free.append(target_bytes - sizes[path])
+    return [sorted(members) for members in bins]
+
+
+def _pack_id(members: List[str], fingerprints: Dict[str, Optional[str]]) -> str:
+    digest = hashlib.sha256()
+    for path in members:
+        digest.update(f"{os.path.abspath(path)}:{fingerprints.get(path) or ''}\n".encode("utf-8"))
+    return digest.hexdigest()
+
+
+def _quote(value: str, dialect: Dict[str, Any]) -> str:
+    quote = dialect["quote"]
+    escaped = value.replace(quote, (dialect["escape"] or quote) + quote)
+    return f"{quote}{escaped}{quote}"
+
+
+def _csv_dialect(path: str) -> Optional[Dict[str, Any]]:
+    """Dialect of a CSV pack, sniffed once from its first member."""
+    text = _read_text(path)
+    lines = _lines(text or "")
+    return sniff_dialect("\n".join(lines[:SNIFF_LINES]) + "\n") if lines else None
+
+
+def write_pack(pack: Dict[str, Any], dialect: Optional[Dict[str, Any]] = None) -> List[str]:
+    """
+    Concatenate the members of a pack into pack["path"], tagging every row
+    with its source file. Returns the members that could not be packed.
+    """
+    os.makedirs(os.path.dirname(pack["path"]), exist_ok=True)
+    tmp_path = f"{pack['path']}.tmp"
+    rejected = []
+    with open(tmp_path, "w", encoding="utf-8", newline="\n") as out:
+        if pack["format"] == "csv":
+            out.write(f"{pack['header']}{dialect['delimiter']}{SOURCE_COLUMN}\n")
+        for path in pack["paths"]:
+            lines = _lines(_read_text(path) or "")
+            name = os.path.basename(path)
+            if pack["format"] == "csv":
+                # An odd quote count means a quoted field continues on the next line; a ragged
+                # row would get source_file in the wrong column
+                width = _field_count(pack["header"], dialect)
+                if not lines or any(line.count(dialect["quote"]) % 2 or _field_count(line, dialect) != width
+                                    for line in lines):
+                    rejected.append(path)
+                    continue
+                suffix = dialect["delimiter"] + _quote(name, dialect)
+                out.writelines(f"{line}{suffix}\n" for line in lines[1:])
+            else:
+                tag = "{" + f"{json.dumps(SOURCE_COLUMN)}: {json.dumps(name)}"
+                for line in lines:
+                    record = line.strip()
+                    out.write(f"{tag}}}\n" if record[1:].strip() == "}" else f"{tag}, {record[1:]}\n")
+    os.replace(tmp_path, pack["path"])
+    return rejected
+
+
+def pack_small_files(file_paths: List[str], fingerprints: Dict[str, Optional[str]],
+                     target_bytes: int = DEFAULT_PACK_BYTES, small_file_bytes: int = SMALL_FILE_BYTES,
+                     directory: str = PACK_PATH, workers: int = DEFAULT_WORKERS,
+                     keep_apart: Optional[Callable[[str], Any]] = None) -> Tuple[List[Dict[str, Any]], List[str]]:
+    """
+    Bin-pack the small files among file_paths. Returns (packs, paths): each pack
+    is {"path", "id", "format", "paths", "bytes"}; paths are the pack files plus
+    every file left to be read on its own, in input order. Files for which
+    keep_apart returns different values never share a pack.
+    """
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as executor:
+        keys = list(executor.map(lambda p: classify(p, small_file_bytes), file_paths))
+
+    groups: Dict[Tuple[str, ...], List[str]] = {}
+    for path, key in zip(file_paths, keys):
+        if key is not None:
+            if keep_apart is not None:
+                key += (keep_apart(path),)
+            groups.setdefault(key, []).append(path)
+
+    packs = []
+    packed = set()
+    for key, members in groups.items():
+        fmt = key[0]
+        dialect = _csv_dialect(members[0]) if fmt == "csv" else None
+        if fmt == "csv" and dialect is None:
+            continue
+        sizes = {path: os.path.getsize(path) for path in members}
+        for bin_members in _bin_pack(members, sizes, target_bytes):
+            if len(bin_members) < 2:
+                continue
+            pack_id = _pack_id(bin_members, fingerprints)
+            pack = {
+                "path": os.path.join(directory, f"pack-{pack_id[:16]}{PACK_EXTENSIONS[fmt]}"),
+                "id": pack_id,
+                "format": fmt,
+                "header": key[1] if fmt == "csv" else None,
+                "paths": bin_members,
+            }
+            rejected = write_pack(pack, dialect)
+            pack["paths"] = [p for p in bin_members if p not in rejected]
+            if len(pack["paths"]) < len(bin_members):
+                # The id has to describe what the pack really holds
+                pack["id"] = _pack_id(pack["paths"], fingerprints)
+            if not pack["paths"]:
+                os.remove(pack["path"])
+                continue
+            pack["bytes"] = os.path.getsize(pack["path"])
+            packs.append(pack)
+            packed.update(pack["paths"])
+
+    remaining = [p for p in file_paths if p not in packed]
+    return packs, [pack["path"] for pack in packs] + remaining
+
+
+def cleanup_packs(packs: List[Dict[str, Any]]):
+    """Remove pack files once the output has been written."""
+    for pack in packs:
+        try:
+            os.remove(pack["path"])
+        except OSError:
+            pass
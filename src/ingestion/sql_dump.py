@@ -0,0 +1,538 @@
+"""
+Streaming SQL dump reader.
+
+Parses INSERT statements from arbitrarily large dumps in bounded memory. The
+file is decoded in chunks and consumed by a small state machine:
+
+- SEEK: skip whitespace/comments and identify the next statement. INSERT
+  headers switch to ROWS; CREATE TABLE statements are parsed for column names
+  (used by INSERTs without a column list); anything else is skipped.
+- ROWS: consume the `( ... )` tuples in the buffer, so a multi-GB extended
+  INSERT never has to be held in memory as a whole. A run of rows of one
+  width is split by a single findall with a pattern for that width, which
+  yields the values already grouped by position; only the last row of a
+  statement and rows reaching the end of the buffer go one at a time.
+
+Quoted values honour backslash escapes and doubled quotes, so values
+containing `),(`, commas or semicolons are split correctly. Tokenizing is
+done with compiled regular expressions (no per-character Python loop).
+
+Large dumps can be split into byte ranges that start at line-initial INSERT
+statements (the layout mysqldump produces) and parsed in parallel processes.
+Values are turned into Arrow string arrays per column with pyarrow.compute
+(quotes, escapes, NULL), and records leave as Arrow batches spilled to
+Parquet (see arrow_spill).
+"""
+import os
+import re
+import mmap
+import codecs
+import functools
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, Iterator, List, Optional, Tuple
+
+import pyarrow as pa
+import pyarrow.compute as pc
+
+from arrow_spill import ArrowSpillWriter
+from compressed_io import decompress_to, open_compressed
+from data_quality import normalize_field_name
+
+DEFAULT_CHUNK_SIZE = 4 * 1024 * 1024
+# Characters kept ahead of the cursor before deciding a statement or row is incomplete
+MIN_LOOKAHEAD = 64 * 1024
+# A single row larger than this is treated as malformed instead of buffering further
+MAX_ROW_CHARS = 64 * 1024 * 1024
+# Ranges smaller than this are not worth a separate worker
+MIN_RANGE_BYTES = 64 * 1024 * 1024
+MAX_VALUE_LENGTH = 10000
+# Rows converted to Arrow at once
+BATCH_ROWS = 65536
+TABLE_COLUMN = "source_table"
+
+# Quoted strings, written as unrolled loops so failed matches backtrack linearly
+_SQ = r"'[^'\\]*(?:(?:\\.|'')[^'\\]*)*'"
+_DQ = r'"[^"\\]*(?:(?:\\.|"")[^"\\]*)*"'
+_BQ = r"`[^`]*`"
+_IDENT = r"(?:`[^`]+`|\"[^\"]+\"|[\w$]+)"
+
+SKIP_RE = re.compile(r"(?:\s|--[^\n]*\n|#[^\n]*\n|/\*(?!!).*?\*/)*", re.S)
+HEADER_RE = re.compile(
+    r"INSERT\s+(?:(?:LOW_PRIORITY|DELAYED|HIGH_PRIORITY|IGNORE)\s+)*INTO\s+"
+    rf"(?P<table>{_IDENT}(?:\s*\.\s*{_IDENT})?)\s*"
+    r"(?:\((?P<columns>[^)]*)\)\s*)?VALUES\s*",
+    re.I,
+)
+CREATE_RE = re.compile(
+    rf"CREATE\s+(?:TEMPORARY\s+)?TABLE\s+(?:IF\s+NOT\s+EXISTS\s+)?(?P<table>{_IDENT}(?:\s*\.\s*{_IDENT})?)\s*\(",
+    re.I,
+)
+# Rest of a statement up to its terminating semicolon, skipping over quoted text
+STATEMENT_RE = re.compile(rf"[^;'\"`]*(?:(?:{_SQ}|{_DQ}|{_BQ})[^;'\"`]*)*;", re.S)
+# One row tuple; bare values may contain one level of parentheses, e.g. NOW()
+_ROW_BODY = rf"[^()'\"]*(?:(?:{_SQ}|{_DQ}|\([^()'\"]*\))[^()'\"]*)*"
+ROW_RE = re.compile(rf"\s*\(({_ROW_BODY})\)\s*([,;]?)", re.S)
+# Values of a row body with a trailing comma appended
+VALUE_RE = re.compile(rf"\s*({_SQ}|{_DQ}|[^,'\"]*?)\s*,", re.S)
+# A bare value for the block patterns; like ROW_RE it may hold one level of parentheses
+_BARE = r"[^,()'\"]*(?:\([^()'\"]*\)[^,()'\"]*)*"
+_ROW_END_RE = re.compile(r"\)\s*,")
+_QUOTE_VALUES = pa.array(["'", '"'])
+_NULL_VALUES = pa.array(["NULL", "null", "Null"])
+_ESCAPED = r"\\|''|\"\""
+_QUOTES = frozenset(("'", '"'))
+_NULLS = frozenset(("NULL", "null", "Null"))
+_ESCAPE_RE = re.compile(r"\\(.)|''|\"\"", re.S)
+_ESCAPES = {"0": "\0", "b": "\b", "n": "\n", "r": "\r", "t": "\t", "Z": "\x1a"}
+_CREATE_SKIP = ("PRIMARY", "KEY", "UNIQUE", "CONSTRAINT", "INDEX", "FOREIGN", "CHECK", "FULLTEXT", "SPATIAL")
+INSERT_LINE_RE = re.compile(rb"\nINSERT\s", re.I)
+CREATE_LINE_RE = re.compile(rb"CREATE\s+(?:TEMPORARY\s+)?TABLE\s", re.I)
+
+
+def _unescape_match(match) -> str:
+    escaped = match.group(1)
+    if escaped is None:
+        return match.group(0)[0]
+    return _ESCAPES.get(escaped, escaped)
+
+
+def _strip_identifier(name: str) -> str:
+    """`db`.`table` -> table; quoting removed."""
+    return re.split(r"\s*\.\s*", name.strip())[-1].strip("`\"")
+
+
+def _unquote(token: str) -> str:
+    inner = token[1:-1]
+    if "\\" in inner or token[0] * 2 in inner:
+        return _ESCAPE_RE.sub(_unescape_match, inner)
+    return inner
+
+
+def split_values(body: str) -> List[Optional[str]]:
+    """Split the inside of one row tuple into values (None for NULL)."""
+    # Inlined instead of a converter call per value: this runs for every field of every row
+    return [
+        _unquote(token) if token[:1] in _QUOTES else None if token in _NULLS else token
+        for token in VALUE_RE.findall(body + ",")
+    ]
+
+
+def parse_create_columns(body: str) -> List[str]:
+    """Column names from the inside of a CREATE TABLE (...) definition."""
+    columns = []
+    depth = 0
+    part = []
+    parts = []
+    for token in re.findall(rf"{_SQ}|{_DQ}|{_BQ}|[(),]|[^(),'\"`]+", body):
+        if token == "(":
+            depth += 1
+        elif token == ")":
+            depth -= 1
+        elif token == "," and depth == 0:
+            parts.append("".join(part))
+            part = []
+            continue
+        part.append(token)
+    parts.append("".join(part))
+
+    for definition in parts:
+        definition = definition.strip()
+        if not definition or definition.split(None, 1)[0].upper().strip("`\"") in _CREATE_SKIP and not definition.startswith(("`", '"')):
+            continue
+        match = re.match(_IDENT, definition)
+        if match:
+            columns.append(match.group(0).strip("`\""))
+    return columns
+
+
+def iter_text_chunks(file_path: str, encoding: str = "utf-8", start: int = 0, end: Optional[int] = None,
+                     chunk_size: int = DEFAULT_CHUNK_SIZE, compression: Optional[str] = None) -> Iterator[str]:
+    """Decode bytes [start, end) of a file in chunks; compressed files are decompressed as they stream."""
+    decoder = codecs.getincrementaldecoder(encoding)(errors="ignore")
+    with open_compressed(file_path, compression) as f:
+        if start:
+            f.seek(start)
+        remaining = None if end is None else end - start
+        while remaining is None or remaining > 0:
+            size = chunk_size if remaining is None else min(chunk_size, remaining)
+            data = f.read(size)
+            if not data:
+                break
+            if remaining is not None:
+                remaining -= len(data)
+            yield decoder.decode(data)
+    tail = decoder.decode(b"", final=True)
+    if tail:
+        yield tail
+
+
+def _row_tokens(body: str) -> List[str]:
+    """Raw value tokens of one row tuple's inside (quoted values keep their quotes)."""
+    return VALUE_RE.findall(body + ",")
+
+
+@functools.lru_cache(maxsize=None)
+def _row_patterns(width: int) -> Tuple[re.Pattern, re.Pattern]:
+    """
+    For rows of width values: a findall pattern giving (whole row, value 1,
+    ..., value n) per row followed by a comma or semicolon, and a pattern
+    matching the longest run of such rows followed by a comma.
+    """
+    def row(value: str) -> str:
+        return rf"\s*\({value}{(',' + value) * (width - 1)}\)\s*"
+
+    capturing = rf"\s*({_SQ}|{_DQ}|{_BARE})\s*"
+    plain = rf"\s*(?:{_SQ}|{_DQ}|{_BARE})\s*"
+    return re.compile(f"({row(capturing)}[,;])", re.S), re.compile(f"(?:{row(plain)},)*", re.S)
+
+
+def _take_rows(buf: str, pos: int, first: re.Match, guess: bool = True
+               ) -> Tuple[int, Optional[List[Tuple[str, ...]]], int]:
+    """
+    Tokenize the run of complete rows of one width starting at buf[pos] (the
+    row matched by first), up to the end of the statement, with one findall.
+
+    Returns (end, tokens, failed): end is the position after the run (after
+    the statement's ";" if the run includes its last row) and tokens the raw
+    tokens of each value position, all of one length, or None when the row
+    at pos cannot be taken this way. With guess, the rows up to the
+    statement's ");" are tokenized directly; when that stretch turns out not
+    to be one run, failed is its end and the run is matched first instead
+    (the caller passes guess=False up to there).
+    """
+    rows_re, run_re = _row_patterns(len(_row_tokens(first.group(1))))
+    if rows_re.match(buf, pos) is None:
+        return pos, None, 0
+    failed = 0
+    if guess:
+        end = buf.find(");", pos) + 2
+        if end == 1:
+            # The statement goes on in the next chunk: up to the last complete row
+            cut = buf.rfind("),", pos)
+            end = _ROW_END_RE.match(buf, cut).end() if cut >= 0 else pos
+        found = list(zip(*rows_re.findall(buf, pos, end)))
+        # findall skips text it cannot match (a row of another width, a ");" inside a quoted value)
+        if found and sum(map(len, found[0])) == end - pos:
+            return end, found[1:], 0
+        failed = end
+    end = run_re.match(buf, pos).end()
+    return end, list(zip(*rows_re.findall(buf, pos, end)))[1:], failed
+
+
+def iter_dump_blocks(chunks: Iterator[str],
+                     table_columns: Optional[Dict[str, List[str]]] = None
+                     ) -> Iterator[Tuple[str, List[str], List[Tuple[str, ...]]]]:
+    """
+    Run the tokenizer over decoded text chunks.
+
+    Yields (table, columns, tokens) for runs of rows of one INSERT and one
+    width; tokens holds the raw value tokens of each position (see
+    token_values). Columns come from the INSERT's own column list, else from
+    a CREATE TABLE seen earlier (or passed in via table_columns), else are
+    empty.
+
+    Runs of complete rows are tokenized by one findall each; only the last
+    row of a statement, rows of another width than the row before and rows
+    reaching the end of the buffer go through the row-by-row path.
+    """
+    known_columns = dict(table_columns or {})
+    chunks = iter(chunks)
+    buf = ""
+    pos = 0
+    eof = False
+    in_rows = False
+    table = ""
+    columns: List[str] = []
+    # Text before this position is known not to be one run of rows (see _take_rows)
+    run_until = 0
+
+    while True:
+        # Keep enough text ahead of the cursor to recognise a statement or row
+        if not eof and len(buf) - pos < MIN_LOOKAHEAD:
+            chunk = next(chunks, None)
+            if chunk is None:
+                eof = True
+            else:
+                run_until -= pos
+                buf = buf[pos:] + chunk
+                pos = 0
+                continue
+
+        if not in_rows:
+            pos = SKIP_RE.match(buf, pos).end()
+            if pos >= len(buf):
+                if eof:
+                    return
+                buf, pos = buf[pos:], 0
+                chunk = next(chunks, None)
+                if chunk is None:
+                    eof = True
+                else:
+                    buf += chunk
+                continue
+
+            header = HEADER_RE.match(buf, pos)
+            if header:
+                table = _strip_identifier(header.group("table"))
+                if header.group("columns") is not None:
+                    columns = [_strip_identifier(c) for c in header.group("columns").split(",")]
+                else:
+                    columns = known_columns.get(table, [])
+                pos = header.end()
+                in_rows = True
+                continue
+
+            statement = STATEMENT_RE.match(buf, pos)
+            if statement is None:
+                if eof:
+                    return
+                chunk = next(chunks, None)
+                if chunk is None:
+                    eof = True
+                else:
+                    buf = buf[pos:] + chunk
+                    pos = 0
+                continue
+
+            create = CREATE_RE.match(buf, pos)
+            if create:
+                body = buf[create.end():statement.end()].rstrip().rstrip(";")
+                body = body[:body.rfind(")")] if ")" in body else body
+                known_columns[_strip_identifier(create.group("table"))] = parse_create_columns(body)
+            pos = statement.end()
+            continue
+
+        row = ROW_RE.match(buf, pos)
+        if row is not None and row.group(2) == "," and row.end() < len(buf):
+            end, tokens, failed = _take_rows(buf, pos, row, pos >= run_until)
+            run_until = max(run_until, failed)
+            if tokens is not None:
+                yield table, columns, tokens
+                pos = end
+                in_rows = buf[end - 1] != ";"
+                continue
+
+        # A row the block patterns do not take: the last of its statement, one of another width,
+        # one that may continue in the next chunk
+        if row is None or (not eof and row.end() == len(buf)):
+            if not eof and len(buf) - pos < MAX_ROW_CHARS:
+                chunk = next(chunks, None)
+                if chunk is None:
+                    eof = True
+                else:
+                    run_until -= pos
+                    buf = buf[pos:] + chunk
+                    pos = 0
+                continue
+            if row is None:
+                # Malformed row: drop the rest of this statement
+                statement = STATEMENT_RE.match(buf, pos)
+                pos = statement.end() if statement else len(buf)
+                in_rows = False
+                continue
+        yield table, columns, [(token,) for token in _row_tokens(row.group(1))]
+        pos = row.end()
+        in_rows = row.group(2) == ","
+
+
+def token_values(tokens: List[str]) -> pa.Array:
+    """
+    Values of raw tokens as a string array: quotes removed and escapes
+    resolved, NULL as null. Vectorised; only values mixing backslash and
+    doubled-quote escapes, or holding an escaped backslash, go through Python.
+    """
+    raw = pa.array(tokens, pa.string())
+    quoted = pc.is_in(pc.utf8_slice_codeunits(raw, 0, 1), value_set=_QUOTE_VALUES)
+    quoted_count = pc.sum(quoted).as_py() or 0
+    if quoted_count == len(raw):
+        values = pc.utf8_slice_codeunits(raw, 1, -1)
+    else:
+        values = pc.utf8_rtrim_whitespace(raw)
+        values = pc.if_else(pc.is_in(values, value_set=_NULL_VALUES), pa.scalar(None, pa.string()), values)
+        if quoted_count:
+            values = pc.if_else(quoted, pc.utf8_slice_codeunits(raw, 1, -1), values)
+    # Most columns hold no escape at all: one scan of the joined tokens settles it
+    joined = "\0".join(tokens)
+    if not quoted_count or ("\\" not in joined and "''" not in joined and '""' not in joined):
+        return values
+    escaped = pc.fill_null(pc.and_(quoted, pc.match_substring_regex(values, _ESCAPED)), False)
+    if not pc.any(escaped).as_py():
+        return values
+
+    positions = pc.indices_nonzero(escaped)
+    inner = pc.take(values, positions)
+    # Escapes do not overlap unless a backslash is escaped or both kinds occur, so these
+    # replacements, applied one after the other, give what _unquote gives
+    unescaped = pc.replace_substring(pc.replace_substring(inner, "''", "'"), '""', '"')
+    for code, char in _ESCAPES.items():
+        unescaped = pc.replace_substring(unescaped, "\\" + code, char)
+    unescaped = pc.replace_substring_regex(unescaped, r"(?s)\\(.)", r"\1")
+    mixed = pc.or_(pc.match_substring(inner, "\\\\"),
+                   pc.and_(pc.match_substring(inner, "\\"), pc.match_substring_regex(inner, "''|\"\"")))
+    if pc.any(mixed).as_py():
+        tokens_mixed = pc.take(positions, pc.indices_nonzero(mixed)).to_pylist()
+        unescaped = pc.replace_with_mask(unescaped, mixed,
+                                         pa.array([_unquote(tokens[i]) for i in tokens_mixed], pa.string()))
+    return pc.replace_with_mask(values, escaped, unescaped)
+
+
+def _batched_blocks(blocks: Iterator[Tuple[str, List[str], List[Tuple[str, ...]]]],
+                    batch_rows: int = BATCH_ROWS) -> Iterator[Tuple[str, List[str], List[pa.Array]]]:
+    """
+    Merge consecutive blocks of one table and width (e.g. the many one-row
+    INSERTs of a dump written without extended inserts) and convert them to
+    one value array per position.
+    """
+    pending: List[List[str]] = []
+    key = None
+    for table, columns, tokens in blocks:
+        block_key = (table, tuple(columns), len(tokens))
+        if pending and (block_key != key or len(pending[0]) >= batch_rows):
+            yield key[0], list(key[1]), [token_values(values) for values in pending]
+            pending = []
+        if not pending:
+            key = block_key
+            pending = [[] for _ in tokens]
+        for values, block_values in zip(pending, tokens):
+            values.extend(block_values)
+    if pending:
+        yield key[0], list(key[1]), [token_values(values) for values in pending]
+
+
+def iter_dump_rows(chunks: Iterator[str],
+                   table_columns: Optional[Dict[str, List[str]]] = None
+                   ) -> Iterator[Tuple[str, List[str], List[Optional[str]]]]:
+    """
+    Run the tokenizer over decoded text chunks.
+
+    Yields (table, columns, values) per row. Columns come from the INSERT's
+    own column list, else from a CREATE TABLE seen earlier (or passed in via
+    table_columns), else are named col_1..col_n.
+    """
+    for table, columns, arrays in _batched_blocks(iter_dump_blocks(chunks, table_columns)):
+        names = columns if columns else [f"col_{i + 1}" for i in range(len(arrays))]
+        for values in zip(*(array.to_pylist() for array in arrays)):
+            yield table, names, list(values)
+
+
+def iter_dump_batches(file_path: str, encoding: str = "utf-8", start: int = 0, end: Optional[int] = None,
+                      table_columns: Optional[Dict[str, List[str]]] = None,
+                      chunk_size: int = DEFAULT_CHUNK_SIZE,
+                      compression: Optional[str] = None) -> Iterator[pa.RecordBatch]:
+    """
+    Stream a dump as Arrow batches of normalized column -> sanitized string.
+
+    Every record carries the INSERT's table in the source_table column. A row
+    with more values than columns keeps only the named ones.
+    """
+    name_cache: Dict[Tuple[str, ...], List[str]] = {}
+    chunks = iter_text_chunks(file_path, encoding, start, end, chunk_size, compression)
+    for table, columns, arrays in _batched_blocks(iter_dump_blocks(chunks, table_columns)):
+        key = tuple(columns) if columns else tuple(f"col_{i + 1}" for i in range(len(arrays)))
+        names = name_cache.get(key)
+        if names is None:
+            names = name_cache[key] = [normalize_field_name(c) for c in key]
+        # A dict, as for records: a repeated name keeps its first position and its last value
+        fields: Dict[str, pa.Array] = {}
+        for name, values in zip(names, arrays):
+            values = pc.fill_null(values, "")
+            fields[name] = pc.utf8_trim_whitespace(pc.utf8_slice_codeunits(values, 0, MAX_VALUE_LENGTH))
+        fields[TABLE_COLUMN] = pa.array([table] * len(arrays[0]), pa.string())
+        yield pa.RecordBatch.from_arrays(list(fields.values()), names=list(fields))
+
+
+def iter_dump_records(file_path: str, encoding: str = "utf-8", start: int = 0, end: Optional[int] = None,
+                      table_columns: Optional[Dict[str, List[str]]] = None,
+                      chunk_size: int = DEFAULT_CHUNK_SIZE,
+                      compression: Optional[str] = None) -> Iterator[Dict[str, str]]:
+    """Stream records (dicts of normalized column -> sanitized string) from a dump; see iter_dump_batches."""
+    for batch in iter_dump_batches(file_path, encoding, start, end, table_columns, chunk_size, compression):
+        yield from batch.to_pylist()
+
+
+def scan_table_columns(file_path: str, encoding: str = "utf-8") -> Dict[str, List[str]]:
+    """Collect CREATE TABLE column lists across the whole file (a fast byte scan)."""
+    found: Dict[str, List[str]] = {}
+    if os.path.getsize(file_path) == 0:
+        return found
+    with open(file_path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        for match in CREATE_LINE_RE.finditer(mm):
+            text = mm[match.start():match.start() + MIN_LOOKAHEAD].decode(encoding, errors="ignore")
+            create = CREATE_RE.match(text)
+            statement = STATEMENT_RE.match(text)
+            if create and statement:
+                body = text[create.end():statement.end()].rstrip().rstrip(";")
+                body = body[:body.rfind(")")] if ")" in body else body
+                found[_strip_identifier(create.group("table"))] = parse_create_columns(body)
+    return found
+
+
+def split_ranges(file_path: str, parts: int, min_range_bytes: int = MIN_RANGE_BYTES) -> List[Tuple[int, int]]:
+    """
+    Split a dump into byte ranges that each begin at a line-initial INSERT.
+
+    Relies on every INSERT starting on its own line with newlines inside values
+    escaped, which is how mysqldump writes dumps.
+    """
+    size = os.path.getsize(file_path)
+    parts = min(parts, max(1, size // min_range_bytes))
+    if parts <= 1:
+        return [(0, size)]
+
+    boundaries = [0]
+    with open(file_path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        for i in range(1, parts):
+            match = INSERT_LINE_RE.search(mm, max(size * i // parts, boundaries[-1]))
+            if match is None:
+                break
+            boundary = match.start() + 1
+            if boundary > boundaries[-1]:
+                boundaries.append(boundary)
+    boundaries.append(size)
+    return list(zip(boundaries[:-1], boundaries[1:]))
+
+
+def dump_range_to_parquet(file_path: str, start: int, end: Optional[int], output_dir: str, prefix: str,
+                          encoding: str = "utf-8", table_columns: Optional[Dict[str, List[str]]] = None,
+                          compression: Optional[str] = None) -> int:
+    """Parse one byte range into Parquet part files in output_dir; returns the number of records."""
+    with ArrowSpillWriter(output_dir, prefix=prefix) as sink:
+        for batch in iter_dump_batches(file_path, encoding, start, end, table_columns, compression=compression):
+            sink.write_batch(batch)
+    return sink.rows
+
+
+def dump_to_parquet(file_path: str, output_dir: str, encoding: str = "utf-8",
+                    workers: int = os.cpu_count() or 1, compression: Optional[str] = None) -> int:
+    """
+    Parse a dump into Parquet part files in output_dir, splitting large dumps
+    into byte ranges handled by parallel processes. Returns the record count.
+
+    Compressed dumps are streamed through the decompressor. A large one is
+    decompressed next to the output first so it can still be split into ranges.
+    """
+    if compression is not None:
+        if workers <= 1 or os.path.getsize(file_path) < MIN_RANGE_BYTES:
+            return dump_range_to_parquet(file_path, 0, None, output_dir, "range-0000", encoding,
+                                         compression=compression)
+        plain_path = decompress_to(file_path, compression, os.path.join(output_dir, "_decompressed.sql"))
+        try:
+            return dump_to_parquet(plain_path, output_dir, encoding, workers)
+        finally:
+            os.remove(plain_path)
+
+    ranges = split_ranges(file_path, workers)
+    prefixes = [f"range-{i:04d}" for i in range(len(ranges))]
+
+    if len(ranges) == 1:
+        return dump_range_to_parquet(file_path, 0, ranges[0][1], output_dir, prefixes[0], encoding)
+
+    # INSERTs without a column list need CREATE TABLEs that may sit in another range
+    table_columns = scan_table_columns(file_path, encoding)
+    context = multiprocessing.get_context("spawn")
+    with ProcessPoolExecutor(max_workers=min(workers, len(ranges)), mp_context=context) as executor:
+        futures = [executor.submit(dump_range_to_parquet, file_path, start, end, output_dir, prefix,
+                                   encoding, table_columns)
+                   for (start, end), prefix in zip(ranges, prefixes)]
+        return sum(future.result() for future in futures)
@@ -0,0 +1,205 @@
+"""
+Structured Streaming ingestion mode.
+
+Watches the raw data directory for new CSV, JSON/JSONL and Parquet files and
+runs the same cleaning, normalize_columns and generate_canonical_key logic on
+every micro-batch. Deduplication on canonical_key is stateful and
+checkpointed, so a key already published in an earlier micro-batch (or an
+earlier run of the stream) is not written again.
+
+Each micro-batch also goes through the same bookkeeping as a batch run, so
+the two modes can feed one master dataset: files the manifest already holds
+are dropped from the batch, keys already in the key index are dropped, and
+the batch's keys and input files are then added to the key index and the
+manifest. A file whose rows were all dropped as duplicates by the stream
+state is not recorded; a later batch run reads it again and the key index
+drops its rows.
+
+XML, Excel and SQL dumps have no streaming file source and are left to the
+batch pipeline, as are zstd/xz files (Spark only decodes gzip and bzip2).
+"""
+import os
+import time
+from typing import List, Optional
+from urllib.parse import unquote, urlparse
+
+from pyspark import StorageLevel
+from pyspark.sql import DataFrame, SparkSession
+from pyspark.sql.functions import col, input_file_name
+
+from compressed_io import SPARK_CODEC_EXTENSIONS, split_compression_extension
+from file_probe import format_from_extension
+from key_migration import check_key_format, finish_parquet_migration, parquet_key_format
+from key_index import KeyIndex
+from key_strategies import DEFAULT_KEY_FORMAT, SURROGATE_COLUMN
+from manifest import MANIFEST_PATH, FileManifest, new_run_id
+from normalization import generate_canonical_key, normalize_columns
+from parquet_writer import DEFAULT_ROW_GROUP_BYTES, write_dataset
+from projection import apply_cleaning_projection
+
+STREAM_CHECKPOINT_PATH = "../../data_processed/_checkpoints/stream/"
+DEFAULT_TRIGGER_INTERVAL = "30 seconds"
+DEFAULT_MAX_FILES_PER_TRIGGER = 100
+# Raw file each row was read from, for the manifest; dropped before the write
+INPUT_FILE_COLUMN = "_input_file"
+
+# Streaming file source format -> glob of raw files it picks up (gzip/bzip2 are decoded by Spark)
+STREAM_FORMATS = {
+    "csv": "*.{csv,csv.gz,csv.bz2}",
+    "json": "*.{json,jsonl,json.gz,jsonl.gz,json.bz2,jsonl.bz2}",
+    "parquet": "*.parquet",
+}
+
+
+def _has_files(raw_path: str, fmt: str) -> bool:
+    for name in os.listdir(raw_path):
+        compression = split_compression_extension(name)[1]
+        if format_from_extension(name) == fmt and (compression is None or os.path.splitext(name)[1] in SPARK_CODEC_EXTENSIONS):
+            if fmt != "parquet" or compression is None:
+                return True
+    return False
+
+
+def _local_path(uri: str) -> str:
+    """input_file_name() gives a file: URI; the manifest is keyed on local paths."""
+    return unquote(urlparse(uri).path) if uri.startswith("file:") else uri
+
+
+def read_stream(spark: SparkSession, raw_path: str, fmt: str, max_files_per_trigger: int) -> DataFrame:
+    """Open a file stream for one format, cleaned the same way read_file cleans batch input."""
+    reader = spark.readStream.format(fmt) \
+        .option("pathGlobFilter", STREAM_FORMATS[fmt]) \
+        .option("maxFilesPerTrigger", max_files_per_trigger)
+
+    if fmt == "csv":
+        reader = reader.option("header", "true") \
+            .option("inferSchema", "true") \
+            .option("mode", "PERMISSIVE") \
+            .option("columnNameOfCorruptRecord", "_corrupt_record")
+    elif fmt == "json":
+        reader = reader.option("mode", "PERMISSIVE") \
+            .option("columnNameOfCorruptRecord", "_corrupt_record")
+
+    df = reader.load(raw_path)
+    if "_corrupt_record" in df.columns:
+        df = df.filter(df["_corrupt_record"].isNull()).drop("_corrupt_record")
+    return apply_cleaning_projection(df, fmt)
+
+
+def build_stream(spark: SparkSession, raw_path: str, max_files_per_trigger: int,
+                 dedup_retention: Optional[str] = None,
+                 key_format: str = DEFAULT_KEY_FORMAT) -> Optional[DataFrame]:
+    """
+    Union all format streams, key them and deduplicate on canonical_key.
+
+    Without a retention the dedup state keeps every key ever seen. With one
+    (e.g. "7 days"), keys older than the watermark on ingest_timestamp are
+    evicted to bound the state size.
+    """
+    # File stream sources need a schema up front; infer it from the files already present
+    spark.conf.set("spark.sql.streaming.schemaInference", "true")
+
+    streams = []
+    for fmt in STREAM_FORMATS:
+        if not _has_files(raw_path, fmt):
+            print(f"⚠ No {fmt} files in {raw_path} yet, not watching {fmt}")
+            continue
+        df = read_stream(spark, raw_path, fmt, max_files_per_trigger)
+        df = normalize_columns(df)
+        df = generate_canonical_key(df, {"key_format": key_format})
+        # Taken before the dedup shuffle, while the row still knows its file
+        streams.append(df.withColumn(INPUT_FILE_COLUMN, input_file_name()))
+
+    if not streams:
+        return None
+
+    merged = streams[0]
+    for df in streams[1:]:
+        merged = merged.unionByName(df, allowMissingColumns=True)
+
+    if dedup_retention:
+        return merged.withWatermark("ingest_timestamp", dedup_retention) \
+            .dropDuplicatesWithinWatermark(["canonical_key"])
+    return merged.dropDuplicates(["canonical_key"])
+
+
+def run_streaming(spark: SparkSession, raw_path: str, output_path: str,
+                  checkpoint_path: str = STREAM_CHECKPOINT_PATH,
+                  trigger_interval: str = DEFAULT_TRIGGER_INTERVAL,
+                  max_files_per_trigger: int = DEFAULT_MAX_FILES_PER_TRIGGER,
+                  dedup_retention: Optional[str] = None,
+                  partition_by_date: bool = False,
+                  row_group_bytes: int = DEFAULT_ROW_GROUP_BYTES,
+                  key_format: str = DEFAULT_KEY_FORMAT,
+                  manifest_path: str = MANIFEST_PATH,
+                  use_key_index: bool = True):
+    """
+    Start the streaming ingestion and block until it is stopped.
+
+    End-to-end latency is bounded by the trigger interval plus the time to
+    process at most max_files_per_trigger files per format. Refuses to start if
+    output_path holds keys in another format than key_format. Every
+    micro-batch is checked against and recorded in the manifest at
+    manifest_path and, unless use_key_index is False, the key index.
+    """
+    # Micro-batches append, so they must match the keys already in the dataset
+    finish_parquet_migration(output_path)
+    check_key_format(parquet_key_format(output_path), key_format)
+    stream = build_stream(spark, raw_path, max_files_per_trigger, dedup_retention, key_format)
+    if stream is None:
+        print("\n❌ No CSV, JSON or Parquet files to infer a stream schema from.")
+        return
+
+    key_index = KeyIndex(spark) if use_key_index else None
+
+    def write_batch(batch_df: DataFrame, batch_id: int):
+        started = time.time()
+        batch_df = batch_df.persist(StorageLevel.MEMORY_AND_DISK)
+        uris = [row[0] for row in batch_df.select(INPUT_FILE_COLUMN).distinct().collect()]
+        # A batch run may have ingested some of these files already
+        manifest = FileManifest.load(manifest_path)
+        to_process, skipped = manifest.plan([_local_path(uri) for uri in uris])
+        new_paths = {entry["path"] for entry in to_process}
+        new_uris: List[str] = [uri for uri in uris if _local_path(uri) in new_paths]
+        df = batch_df.filter(col(INPUT_FILE_COLUMN).isin(new_uris)).drop(INPUT_FILE_COLUMN)
+
+        if key_index is not None:
+            if not key_index.exists:
+                key_index.bootstrap(output_path)
+            df = key_index.drop_published(df, exempt_column=SURROGATE_COLUMN)
+        if SURROGATE_COLUMN in df.columns:
+            df = df.drop(SURROGATE_COLUMN)
+        df = df.persist(StorageLevel.MEMORY_AND_DISK)
+
+        if new_uris:
+            # Same layout as the batch pipeline; micro-batch files are small and left to --compact
+            write_dataset(df, output_path, "append", target_file_bytes=None,
+                          row_group_bytes=row_group_bytes, partition_by_date=partition_by_date)
+            if key_index is not None:
+                key_index.add(df, mode="append")
+        df.unpersist()
+        batch_df.unpersist()
+
+        run_id = new_run_id()
+        manifest.record(to_process, run_id)
+        manifest.record([e for e in skipped if e.get("duplicate_of")], run_id)
+        manifest.record_run(run_id, started, len(to_process))
+        manifest.save()
+        print(f"💾 Micro-batch {batch_id}: {len(to_process)} new file(s) appended to {output_path}"
+              + (f", {len(skipped)} already ingested" if skipped else ""))
+
+    os.makedirs(output_path, exist_ok=True)
+    query = stream.writeStream \
+        .queryName("ingestion_stream") \
+        .foreachBatch(write_batch) \
+        .option("checkpointLocation", checkpoint_path) \
+        .trigger(processingTime=trigger_interval) \
+        .start()
+
+    print(f"\n📡 Streaming from {raw_path} every {trigger_interval} "
+          f"(max {max_files_per_trigger} files per trigger). Ctrl+C to stop.")
+    try:
+        query.awaitTermination()
+    except KeyboardInterrupt:
+        print("\n🛑 Stopping stream...")
+        query.stop()
@@ -0,0 +1,115 @@
+"""
+Streaming, bounded-memory XML reader.
+
+Records are pulled out of the document with ElementTree.iterparse and every
+element is cleared as soon as its record has been emitted, so memory use
+depends on the size of one record rather than the size of the file. Records
+are handed out in fixed-size batches.
+
+A document without any record element (e.g. a single <person> with leaf
+children and a record_path that matches nothing) is returned as one record
+built from the root, as the original tree-based reader did.
+"""
+import xml.etree.ElementTree as ET
+from typing import Dict, Iterator, List, Optional
+
+DEFAULT_BATCH_SIZE = 10000
+
+
+def _parse_record_path(record_path: Optional[str]) -> Optional[List[str]]:
+    """'catalog/customers/customer' -> ['catalog', 'customers', 'customer']."""
+    if not record_path:
+        return None
+    return [part for part in record_path.strip("/").split("/") if part]
+
+
+def _matches(stack: List[str], record_path: Optional[List[str]]) -> bool:
+    if record_path is None:
+        # Default: every direct child of the root element is a record
+        return len(stack) == 2
+    if len(record_path) == 1:
+        # A bare tag name matches that element at any depth
+        return stack[-1] == record_path[0]
+    return stack == record_path
+
+
+def _element_to_record(elem: ET.Element) -> Dict:
+    """Collect the text of an element and its descendants, keyed by tag."""
+    record = {}
+    for node in elem.iter():
+        if node.text and node.text.strip():
+            key = node.tag
+            value = node.text.strip()
+            if key in record:
+                # Repeated tags become a list
+                if not isinstance(record[key], list):
+                    record[key] = [record[key]]
+                record[key].append(value)
+            else:
+                record[key] = value
+    return record
+
+
+def iter_xml_records(source, record_path: Optional[str] = None) -> Iterator[Dict]:
+    """
+    Stream records from an XML file path or binary file object.
+
+    record_path selects the record elements: a slash-separated path from the
+    root ("catalog/customers/customer") or a bare tag matched at any depth
+    ("customer"). By default the root's direct children are records. If no
+    record is found, the root is yielded as a single record.
+    Raises ET.ParseError on malformed XML.
+    """
+    path = _parse_record_path(record_path)
+    stack: List[str] = []
+    elements: List[ET.Element] = []
+    inside_record = 0
+    # Root fallback, kept only until the first record: one value per tag, so its size is bounded
+    found = False
+    root_record: Dict = {}
+
+    for event, elem in ET.iterparse(source, events=("start", "end")):
+        if event == "start":
+            stack.append(elem.tag)
+            elements.append(elem)
+            if _matches(stack, path):
+                inside_record += 1
+            continue
+
+        is_record = _matches(stack, path)
+        if not found and elem.tag != stack[0] and elem.text and elem.text.strip():
+            root_record[elem.tag] = elem.text.strip()
+        stack.pop()
+        elements.pop()
+
+        if is_record:
+            inside_record -= 1
+            record = _element_to_record(elem)
+            if record:
+                found = True
+                root_record = {}
+                yield record
+            # Drop the subtree and detach it from its parent so nothing accumulates
+            elem.clear()
+            if elements:
+                elements[-1].remove(elem)
+        elif not inside_record and elements:
+            # Elements outside any record are never needed again either
+            elem.clear()
+            elements[-1].remove(elem)
+
+    if not found and root_record:
+        yield root_record
+
+
+def iter_xml_batches(source, record_path: Optional[str] = None,
+                     batch_size: int = DEFAULT_BATCH_SIZE) -> Iterator[List[Dict]]:
+    """Group streamed records into lists of at most batch_size."""
+    batch: List[Dict] = []
+    for record in iter_xml_records(source, record_path):
+        batch.append(record)
+        if len(batch) >= batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
@@ -1,20 +1,108 @@
 import os
+import json
+import argparse
 import pandas as pd
 import clickhouse_connect
+import pyarrow as pa
+import pyarrow.compute as pc
 import pyarrow.parquet as pq
-from typing import List
+from typing import Dict, List
+from urllib.parse import unquote
 from dotenv import load_dotenv
 from pathlib import Path
 
 PARQUET_DIR = "../../data_processed/master_dataset/"
+DELTA_DIR = "../../data_processed/master_delta/"
+# Last Delta table version and the Parquet files already loaded into ClickHouse
+LOADER_STATE_PATH = "../../data_processed/loader_state.json"
 BATCH_SIZE = 50000 
+CHANGE_TYPE_COLUMN = "_change_type"
+# Binary canonical keys (--key-format sha256-128 / xxhash-128) are 16 bytes
+BINARY_KEY_TYPE = "FixedString(16)"
+KEY_COLUMNS = ("canonical_key", "entity_id")
 
-def cast_dataframe(df: pd.DataFrame) -> pd.DataFrame:
+def parquet_files(path: str) -> List[str]:
+    """Parquet files of the master dataset, including ingest_date=... partition directories."""
+    files = []
+    for root, dirs, names in os.walk(path):
+        # _staging, _compaction and other "_" directories are not part of the dataset
+        dirs[:] = sorted(d for d in dirs if not d.startswith(("_", ".")))
+        files.extend(os.path.join(root, name) for name in sorted(names) if name.endswith(".parquet"))
+    return files
+
+def parquet_changes(path: str, loaded: List[str]) -> Dict:
+    """
+    Parquet files of the master dataset not loaded yet. Ingestion only adds
+    files to the dataset; if a loaded file is gone, the dataset was rewritten
+    (--full-refresh, --compact, --migrate-keys) and everything is reloaded.
+    """
+    current = {os.path.relpath(file_path, path): file_path for file_path in parquet_files(path)}
+    truncate = any(name not in current for name in loaded)
+    done = set() if truncate else set(loaded)
+    return {"truncate": truncate, "files": [(file_path, False) for name, file_path in current.items()
+                                            if name not in done]}
+
+def delta_changes(table_path: str, since_version: int) -> Dict:
+    """
+    Files holding the rows changed after since_version, from the Delta
+    transaction log. Versions with change data feed files ("cdc") use those;
+    other versions (plain inserts) use their added data files. OPTIMIZE
+    commits change no data and are skipped.
+    """
+    log_dir = os.path.join(table_path, "_delta_log")
+    versions = sorted(int(name[:-5]) for name in os.listdir(log_dir) if name.endswith(".json"))
+    changes = {"latest_version": versions[-1] if versions else since_version, "truncate": False, "files": []}
+    pending = [v for v in versions if v > since_version]
+    if pending and pending[0] != since_version + 1:
+        raise ValueError(f"Delta version {since_version + 1} is no longer in the transaction log; "
+                         f"reload everything with --since-version -1")
+
+    for version in pending:
+        with open(os.path.join(log_dir, f"{version:020d}.json"), "r", encoding="utf-8") as f:
+            actions = [json.loads(line) for line in f if line.strip()]
+        commit = next((a["commitInfo"] for a in actions if "commitInfo" in a), {})
+        if commit.get("operationParameters", {}).get("mode") == "Overwrite":
+            # A full refresh replaced the table; everything loaded so far is stale
+            changes["truncate"] = True
+            changes["files"] = []
+        cdc = [a["cdc"]["path"] for a in actions if "cdc" in a]
+        if cdc:
+            changes["files"].extend((os.path.join(table_path, unquote(p)), True) for p in cdc)
+        else:
+            changes["files"].extend((os.path.join(table_path, unquote(a["add"]["path"])), False)
+                                    for a in actions if "add" in a and a["add"].get("dataChange", True))
+    return changes
+
+def load_state() -> Dict:
+    if not os.path.exists(LOADER_STATE_PATH):
+        return {}
+    with open(LOADER_STATE_PATH, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+def save_state(state: Dict):
+    tmp_path = f"{LOADER_STATE_PATH}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(state, f, indent=2)
+    os.replace(tmp_path, LOADER_STATE_PATH)
+
+def binary_columns(schema: pa.Schema) -> List[str]:
+    """Columns of a Parquet schema holding binary keys."""
+    return [field.name for field in schema
+            if pa.types.is_binary(field.type) or pa.types.is_fixed_size_binary(field.type)]
+
+def key_column_type(files: List[str]) -> str:
+    """ClickHouse type for canonical_key, from the first file to load: String (hex) or FixedString(16)."""
+    if files and "canonical_key" in binary_columns(pq.read_schema(files[0][0])):
+        return BINARY_KEY_TYPE
+    return "String"
+
+def cast_dataframe(df: pd.DataFrame, binary: List[str] = ()) -> pd.DataFrame:
     """
     Cast all columns to correct ClickHouse-supported types.
     - Strings → str
     - DateTime → python datetime
     - NaN → ''
+    - Binary keys stay bytes (FixedString(16))
     - Handles missing fields gracefully
     """
     # Convert ingest_timestamp properly
@@ -26,7 +114,7 @@ def cast_dataframe(df: pd.DataFrame) -> pd.DataFrame:
 
     # Convert all other columns to strings (except DateTime)
     for col in df.columns:
-        if col != "ingest_timestamp":
+        if col != "ingest_timestamp" and col not in binary:
             # Handle various data types
             if df[col].dtype == 'object':
                 df[col] = df[col].astype(str).fillna("")
@@ -35,7 +123,7 @@ def cast_dataframe(df: pd.DataFrame) -> pd.DataFrame:
 
     return df
 
-def ensure_table_schema(client, columns: List[str]):
+def ensure_table_schema(client, columns: List[str], binary: List[str] = ()):
     """Ensure ClickHouse table has all required columns, add missing ones dynamically."""
     # Get current table structure
     try:
@@ -48,7 +136,8 @@ def ensure_table_schema(client, columns: List[str]):
             safe_col = col.replace(" ", "_").replace("-", "_")
             if safe_col not in existing_cols and safe_col != "ingest_timestamp":
                 try:
-                    client.command(f"ALTER TABLE master_records ADD COLUMN IF NOT EXISTS `{safe_col}` String")
+                    col_type = BINARY_KEY_TYPE if col in binary else "String"
+                    client.command(f"ALTER TABLE master_records ADD COLUMN IF NOT EXISTS `{safe_col}` {col_type}")
                     print(f"  ✓ Added column: {safe_col}")
                 except Exception as e:
                     print(f"  ⚠ Could not add column {safe_col}: {e}")
@@ -63,7 +152,92 @@ def ensure_table_schema(client, columns: List[str]):
     except Exception as e:
         print(f"  ⚠ Error checking table schema: {e}")
 
-def main():
+def insert_file(client, file_path: str, change_feed: bool = False) -> int:
+    """Insert one Parquet file batch by batch (row group by row group); returns rows inserted."""
+    # Read one batch at a time, not the whole file
+    parquet_file = pq.ParquetFile(file_path)
+    columns = [c for c in parquet_file.schema_arrow.names if c != CHANGE_TYPE_COLUMN]
+    binary = binary_columns(parquet_file.schema_arrow)
+    ensure_table_schema(client, columns, binary)
+
+    i = 0
+    for record_batch in parquet_file.iter_batches(batch_size=BATCH_SIZE):
+        if change_feed:
+            # Change data files also hold deletes and pre-images of updates
+            loaded = pc.is_in(record_batch.column(CHANGE_TYPE_COLUMN), value_set=pa.array(["insert", "update_postimage"]))
+            record_batch = record_batch.filter(loaded)
+            updated = record_batch.filter(pc.equal(record_batch.column(CHANGE_TYPE_COLUMN), "update_postimage"))
+            keys = updated.column("canonical_key").to_pylist()
+            if keys and "canonical_key" in binary:
+                # Binary keys travel as hex and are unhexed server-side
+                client.command("DELETE FROM master_records WHERE canonical_key IN "
+                               "(SELECT toFixedString(unhex(arrayJoin(%(keys)s)), 16))",
+                               parameters={"keys": [key.hex() for key in keys]})
+            elif keys:
+                # The old version of an updated record is replaced, not kept alongside
+                client.command("DELETE FROM master_records WHERE canonical_key IN %(keys)s",
+                               parameters={"keys": keys})
+        df = record_batch.to_pandas()
+        if change_feed:
+            df = df.drop(columns=[CHANGE_TYPE_COLUMN])
+
+        # CAST TYPES CORRECTLY (CRITICAL)
+        df = cast_dataframe(df, binary)
+
+        rows = df.values.tolist()
+        colnames = df.columns.tolist()
+        print(f"  → inserting rows {i} to {i+len(rows)}")
+        try:
+            client.insert("master_records", rows, column_names=colnames)
+        except Exception as e:
+            print(f"  ❌ Error inserting batch {i}: {e}")
+        i += len(rows)
+    return i
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Load the master dataset into ClickHouse")
+    parser.add_argument("--delta", action="store_true",
+                        help=f"Load from the Delta table ({DELTA_DIR}), only the changes since the last load")
+    parser.add_argument("--since-version", type=int, default=None,
+                        help="With --delta, load changes after this table version instead of the last "
+                             "loaded one (-1 loads the whole history)")
+    parser.add_argument("--reload", action="store_true",
+                        help="Truncate master_records and load every Parquet file again, not only the new ones")
+    parser.add_argument("--migrate-binary-keys", action="store_true",
+                        help="Convert the hex canonical keys already in master_records to FixedString(16) "
+                             "sha256-128 keys (after ingested_data.py --migrate-keys) and exit")
+    return parser.parse_args(argv)
+
+def table_columns(client) -> Dict[str, str]:
+    return {row[0]: row[1] for row in client.query("DESCRIBE master_records").result_rows}
+
+def migrate_binary_keys(client):
+    """
+    Rebuild master_records with FixedString(16) keys: the first 16 bytes of
+    each hex SHA-256 key, i.e. the key the ingestion writes with
+    --key-format sha256-128. The key is the ORDER BY column, so the table is
+    copied and swapped in rather than altered.
+    """
+    columns = table_columns(client)
+    if columns.get("canonical_key") == BINARY_KEY_TYPE:
+        print("✅ master_records already has binary keys")
+        return
+    converted = [c for c in KEY_COLUMNS if c in columns]
+    definitions = ", ".join(f"`{name}` {BINARY_KEY_TYPE if name in converted else col_type}"
+                            for name, col_type in columns.items())
+    selected = ", ".join(f"toFixedString(unhex(substring(`{name}`, 1, 32)), 16) AS `{name}`" if name in converted
+                         else f"`{name}`" for name in columns)
+    client.command("DROP TABLE IF EXISTS master_records_binary")
+    client.command(f"CREATE TABLE master_records_binary ({definitions}) ENGINE = MergeTree() ORDER BY canonical_key")
+    print("🔑 Copying master_records with binary keys...")
+    client.command(f"INSERT INTO master_records_binary SELECT {selected} FROM master_records")
+    client.command("EXCHANGE TABLES master_records AND master_records_binary")
+    client.command("DROP TABLE master_records_binary")
+    print("✅ master_records now has FixedString(16) keys")
+
+def main(argv=None):
+    args = parse_args(argv)
+
     # Load .env file from api directory
     api_dir = Path(__file__).parent.parent.parent / "api"
     env_path = api_dir / ".env"
@@ -87,10 +261,29 @@ def main():
         secure=clickhouse_secure
     )
 
+    if args.migrate_binary_keys:
+        migrate_binary_keys(client)
+        return
+
+    state = load_state()
+    if args.delta:
+        since_version = args.since_version if args.since_version is not None else state.get("delta_version", -1)
+        changes = delta_changes(DELTA_DIR, since_version)
+        files = changes["files"]
+    else:
+        # Files loaded by earlier runs are skipped; their rows are already in the table
+        loaded = [] if args.reload else state.get("parquet_files", [])
+        changes = parquet_changes(PARQUET_DIR, loaded)
+        changes["truncate"] = changes["truncate"] or args.reload
+        files = changes["files"]
+        if not changes["truncate"]:
+            print(f"🔁 {len(files)} new Parquet file(s); {len(loaded)} already loaded")
+
     # Create table with core columns
-    client.command("""
+    key_type = key_column_type(files)
+    client.command(f"""
     CREATE TABLE IF NOT EXISTS master_records (
-        canonical_key String,
+        canonical_key {key_type},
         name String,
         first_name String,
         last_name String,
@@ -102,45 +295,44 @@ def main():
     ENGINE = MergeTree()
     ORDER BY canonical_key
     """)
+    if files and table_columns(client).get("canonical_key") != key_type:
+        raise ValueError(f"master_records keys are {table_columns(client).get('canonical_key')} but the data has "
+                         f"{key_type} keys; run the loader with --migrate-binary-keys (or truncate the table)")
 
-    # Load files
-    files = [f for f in os.listdir(PARQUET_DIR) if f.endswith(".parquet")]
+    if args.delta:
+        print(f"🔁 Delta changes after version {since_version} (latest: {changes['latest_version']})")
+    if changes["truncate"]:
+        print("  ⚠ Table was fully refreshed; reloading it")
+        client.command("TRUNCATE TABLE master_records")
+        state = dict(state, parquet_files=[])
 
+    if not files and args.delta:
+        print("✅ No new changes to load")
+        save_state(dict(state, delta_version=changes["latest_version"]))
+        return
+    if not files and state.get("parquet_files"):
+        print("✅ No new Parquet files to load")
+        return
     if not files:
         print("❌ No Parquet files found!")
         return
 
-    for file in files:
-        file_path = os.path.join(PARQUET_DIR, file)
+    for file_path, change_feed in files:
         print(f"📤 Loading {file_path}")
 
         try:
-            # Read Parquet → DataFrame
-            table = pq.read_table(file_path)
-            df = table.to_pandas()
-
-            # CAST TYPES CORRECTLY (CRITICAL)
-            df = cast_dataframe(df)
-
-            # Ensure table schema matches data
-            ensure_table_schema(client, df.columns.tolist())
-
-            rows = df.values.tolist()
-            colnames = df.columns.tolist()
-
-            # Insert in batches
-            for i in range(0, len(rows), BATCH_SIZE):
-                batch = rows[i:i+BATCH_SIZE]
-                print(f"  → inserting rows {i} to {i+len(batch)}")
-                try:
-                    client.insert("master_records", batch, column_names=colnames)
-                except Exception as e:
-                    print(f"  ❌ Error inserting batch {i}: {e}")
-                    continue
-                    
+            insert_file(client, file_path, change_feed)
         except Exception as e:
-            print(f"  ❌ Error processing {file}: {e}")
+            print(f"  ❌ Error processing {file_path}: {e}")
             continue
+        if not args.delta:
+            # Saved per file, so a load that dies part way does not insert the same file twice
+            loaded_files = state.get("parquet_files", []) + [os.path.relpath(file_path, PARQUET_DIR)]
+            state = dict(state, parquet_files=loaded_files)
+            save_state(state)
+
+    if args.delta:
+        save_state(dict(state, delta_version=changes["latest_version"]))
 
     print("\n🎉 SUCCESS: All Parquet data inserted into ClickHouse Cloud!")
 
@@ -0,0 +1,23 @@
+import os
+import sys
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# The ingestion modules import each other as top-level modules, as when run from src/ingestion/
+sys.path.insert(0, os.path.join(ROOT, "src", "ingestion"))
+sys.path.insert(0, ROOT)
+
+
+@pytest.fixture(scope="session")
+def spark():
+    """A small local Spark session shared by the tests that need one."""
+    pytest.importorskip("pyspark")
+    from pyspark.sql import SparkSession
+
+    session = SparkSession.builder.appName("IngestionTests").master("local[2]") \
+        .config("spark.sql.shuffle.partitions", "2") \
+        .config("spark.ui.enabled", "false").getOrCreate()
+    session.sparkContext.setLogLevel("ERROR")
+    yield session
+    session.stop()
@@ -0,0 +1,23 @@
+from api.utils.keys import hex_binary_values, key_condition
+
+HEX_KEY = "AB" * 32
+
+
+def test_key_condition_hex_keys_are_passed_through():
+    assert key_condition("anything", "hex") == ("canonical_key = %s", "anything")
+
+
+def test_key_condition_binary_keys():
+    assert key_condition(HEX_KEY[:32], "binary") == ("canonical_key = unhex(%s)", "ab" * 16)
+    # An old 64-character SHA-256 key finds its sha256-128 row
+    assert key_condition(HEX_KEY, "binary") == ("canonical_key = unhex(%s)", "ab" * 16)
+
+
+def test_key_condition_rejects_non_keys():
+    for value in ("", "xyz", "ab" * 17, HEX_KEY[:31], "g" * 32):
+        assert key_condition(value, "binary") is None
+
+
+def test_hex_binary_values():
+    row = {"canonical_key": b"\x00\xff" * 8, "name": "ann", "age": 3}
+    assert hex_binary_values(row) == {"canonical_key": "00ff" * 8, "name": "ann", "age": 3}
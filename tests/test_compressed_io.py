@@ -0,0 +1,47 @@
+import gzip
+
+import pytest
+
+from compressed_io import is_json_lines, rechunk_text
+
+
+def _gzip(tmp_path, name, text):
+    path = tmp_path / name
+    with gzip.open(path, "wt", encoding="utf-8") as f:
+        f.write(text)
+    return str(path)
+
+
+@pytest.mark.parametrize("text, expected", [
+    ('{"a": 1}\n{"a": 2}\n', True),
+    ('\ufeff{"a": 1}\n', True),
+    ('[{"a": 1},\n {"a": 2}]\n', False),
+    ('[{"a": 1}, {"a": 2}]\n', False),
+    ('{\n  "a": 1\n}\n', False),
+])
+def test_is_json_lines(tmp_path, text, expected):
+    assert is_json_lines(_gzip(tmp_path, "data.json.gz", text), "gzip") is expected
+
+
+def test_rechunk_cuts_between_lines(tmp_path):
+    lines = [f'{{"n": {i}}}\n' for i in range(100)]
+    path = _gzip(tmp_path, "data.json.gz", "".join(lines))
+    out = tmp_path / "parts"
+    out.mkdir()
+    parts = rechunk_text(path, "gzip", str(out), suffix=".json", chunk_bytes=100)
+    assert len(parts) > 1
+    assert "".join(open(p).read() for p in parts) == "".join(lines)
+    assert all(open(p).read().endswith("\n") for p in parts)
+
+
+def test_rechunk_csv_repeats_header_and_unsplit_is_one_part(tmp_path):
+    path = _gzip(tmp_path, "data.csv.gz", "id,name\n" + "".join(f"{i},x\n" for i in range(50)))
+    out = tmp_path / "parts"
+    out.mkdir()
+    parts = rechunk_text(path, "gzip", str(out), suffix=".csv", repeat_header=True, chunk_bytes=64)
+    assert len(parts) > 1
+    assert all(open(p).readline() == "id,name\n" for p in parts)
+
+    whole = tmp_path / "whole"
+    whole.mkdir()
+    assert len(rechunk_text(path, "gzip", str(whole), suffix=".csv", split=False, chunk_bytes=64)) == 1
@@ -0,0 +1,85 @@
+import gzip
+
+import pytest
+
+from file_probe import _content_format, probe_file, sniff_dialect
+
+
+def _format(text: str):
+    return _content_format(text.encode("utf-8"), text)
+
+
+@pytest.mark.parametrize("text, delimiter", [
+    ("a,b,c\n1,2,3\n4,5,6\n", ","),
+    ("a;b;c\n1;2,5;3\n4;5;6\n", ";"),
+    ("a\tb\n1\t2\n", "\t"),
+    ("a|b|c\n1|2|3\n", "|"),
+])
+def test_sniff_dialect_delimiter(text, delimiter):
+    assert sniff_dialect(text)["delimiter"] == delimiter
+
+
+def test_sniff_dialect_quotes_and_escapes():
+    dialect = sniff_dialect("id,name\n1,'O\\'Brien'\n2,'Smith'\n")
+    assert dialect["quote"] == "'"
+    assert dialect["escape"] == "\\"
+    dialect = sniff_dialect('id,name\n1,"say ""hi"""\n2,"x"\n')
+    assert dialect["quote"] == '"'
+    assert dialect["escape"] is None
+
+
+def test_sniff_dialect_multiline():
+    assert sniff_dialect('id,note\n1,"two\nlines"\n2,one\n')["multiline"] is True
+    assert sniff_dialect("id,note\n1,one\n")["multiline"] is False
+
+
+def test_sniff_dialect_single_column():
+    assert sniff_dialect("name\nann\nbob\n") is None
+
+
+@pytest.mark.parametrize("head, fmt", [
+    (b"PAR1\x15\x04", "parquet"),
+    (b"\xd0\xcf\x11\xe0\xa1\xb1\x1a\xe1\x00", "excel"),
+    (b"PK\x03\x04....xl/workbook.xml", "excel"),
+    (b"PK\x03\x04....word/document.xml", None),
+])
+def test_content_format_magic_bytes(head, fmt):
+    assert _content_format(head, head.decode("latin-1")) == fmt
+
+
+@pytest.mark.parametrize("text, fmt", [
+    ('\ufeff  {"a": 1}', "json"),
+    ("[1, 2]", "json"),
+    ("<?xml version='1.0'?><rows/>", "xml"),
+    ("-- MySQL dump\n/*!40101 SET NAMES utf8 */;\nDROP TABLE IF EXISTS `t`;", "sql"),
+    ("INSERT INTO t VALUES (1);", "sql"),
+    ("SET NAMES utf8mb4;\nCREATE TABLE t (a int);", "sql"),
+    ("# comment\nuse shop;\n", "sql"),
+    ("name,email\nann,a@x.io\n", None),
+    ("Insert date,Create table\n2024-01-01,yes\n", None),
+    ("Use case;Set value\nx;1\n", None),
+])
+def test_content_format_text(text, fmt):
+    assert _format(text) == fmt
+
+
+def test_probe_extension_wins_over_text_sniff(tmp_path):
+    path = tmp_path / "people.csv"
+    path.write_text("insert into,values\n1,2\n", encoding="utf-8")
+    probe = probe_file(str(path))
+    assert probe["format"] == "csv"
+    assert probe["delimiter"] == ","
+
+
+def test_probe_magic_bytes_win_over_extension(tmp_path):
+    path = tmp_path / "export.csv"
+    path.write_bytes(b"PAR1" + b"\x00" * 16)
+    assert probe_file(str(path))["format"] == "parquet"
+
+
+def test_probe_unknown_extension_uses_content(tmp_path):
+    path = tmp_path / "dump.gzip"
+    path.write_bytes(gzip.compress(b"INSERT INTO t VALUES (1);\n"))
+    probe = probe_file(str(path))
+    assert probe["compression"] == "gzip"
+    assert probe["format"] == "sql"
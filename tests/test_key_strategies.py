@@ -0,0 +1,117 @@
+import json
+
+import pytest
+
+pytest.importorskip("pyspark")
+
+from pyspark.sql.functions import col, lit, xxhash64
+
+from key_strategies import (KEY_BYTES, SURROGATE_COLUMN, XXHASH_SEED, KeyStrategies, effective_strategy,
+                            hash_key, key_column, surrogate_flag)
+
+
+def _keys(df, strategy):
+    return [row[0] for row in df.select(key_column(df, strategy)).collect()]
+
+
+def test_effective_strategy_identity_uses_present_columns(spark):
+    df = spark.createDataFrame([("ann", "a@x.io", "x")], ["name", "email", "other"])
+    assert effective_strategy(df) == {"strategy": "identity", "columns": ["name", "email"]}
+
+
+def test_effective_strategy_falls_back_to_keyless(spark):
+    df = spark.createDataFrame([(1.0, 2.0, "f.csv")], ["magnitude", "depth", "source_file"])
+    assert effective_strategy(df, {"strategy": "identity"}) == \
+        {"strategy": "row_hash", "columns": ["depth", "magnitude"]}
+    assert effective_strategy(df, {"strategy": "columns", "columns": ["missing"], "keyless": "surrogate"}) == \
+        {"strategy": "surrogate", "columns": []}
+
+
+def test_effective_strategy_columns_match_case_insensitively(spark):
+    df = spark.createDataFrame([("1", "2")], ["Event_ID", "depth"])
+    assert effective_strategy(df, {"strategy": "columns", "columns": ["event_id"]})["columns"] == ["Event_ID"]
+
+
+@pytest.mark.parametrize("key_format, length", [("hex", 64), ("sha256-128", KEY_BYTES), ("xxhash-128", KEY_BYTES)])
+def test_hash_key_length(spark, key_format, length):
+    df = spark.createDataFrame([("a",), ("b",), ("",)], ["v"])
+    keys = [row[0] for row in df.select(hash_key(col("v"), key_format)).collect()]
+    assert all(len(key) == length for key in keys)
+    assert len(set(keys)) == 3
+
+
+def test_hash_key_sha256_128_is_hex_prefix(spark):
+    df = spark.createDataFrame([("ann",)], ["v"])
+    hex_key, binary_key = df.select(hash_key(col("v"), "hex"), hash_key(col("v"), "sha256-128")).first()
+    assert bytes(binary_key) == bytes.fromhex(hex_key[:32])
+
+
+def test_hash_key_xxhash_halves_are_eight_bytes(spark):
+    # Enough values that some 64-bit hashes are negative or have leading zero nibbles
+    df = spark.range(200).select(col("id").cast("string").alias("v"))
+    rows = df.select(hash_key(col("v"), "xxhash-128").alias("key"), xxhash64(col("v")).alias("first"),
+                     xxhash64(lit(XXHASH_SEED), col("v")).alias("second")).collect()
+    assert any(row["first"] < 0 for row in rows)
+    for row in rows:
+        key = bytes(row["key"])
+        assert len(key) == 16
+        assert key[:8] == row["first"].to_bytes(8, "big", signed=True)
+        assert key[8:] == row["second"].to_bytes(8, "big", signed=True)
+
+
+def test_keyless_rows_dedup_as_exact_duplicates(spark):
+    df = spark.createDataFrame([(1.0, 2.0), (1.0, 2.0), (1.0, 3.0)], ["magnitude", "depth"])
+    keyed = df.withColumn("canonical_key", key_column(df, {"strategy": "identity"}))
+    assert keyed.dropDuplicates(["canonical_key"]).count() == 2
+
+
+def test_blank_identity_rows_fall_back_per_row(spark):
+    # An executor-parsed group: one file with identity columns, one whose rows leave them empty
+    df = spark.createDataFrame([("ann", "", "1"), ("ann", "", "1"), ("", "", "2"), ("", "", "3")],
+                               ["name", "email", "magnitude"])
+    keys = _keys(df, {"strategy": "identity"})
+    assert keys[0] == keys[1]
+    assert len(set(keys[1:])) == 3
+
+
+def test_surrogate_keys_are_unique_across_sources_and_runs(spark):
+    df = spark.createDataFrame([("1",), ("1",)], ["magnitude"])
+    strategy = {"strategy": "surrogate"}
+    first = _keys(df, {**strategy, "run_id": "run-1", "source": "a.csv"})
+    other_source = _keys(df, {**strategy, "run_id": "run-1", "source": "b.csv"})
+    rerun = _keys(df, {**strategy, "run_id": "run-2", "source": "a.csv"})
+    assert len(set(first + other_source + rerun)) == 6
+
+
+def test_surrogate_flag(spark):
+    df = spark.createDataFrame([("ann", "1"), ("", "2")], ["name", "magnitude"])
+    assert surrogate_flag(df, {"strategy": "identity", "keyless": "row_hash"}) is None
+    flags = [row[0] for row in df.select(surrogate_flag(df, {"strategy": "identity", "keyless": "surrogate"}))
+             .collect()]
+    assert flags == [None, True]
+    assert df.select(surrogate_flag(df, {"strategy": "surrogate"})).first()[0] is True
+    assert SURROGATE_COLUMN not in effective_strategy(df.withColumn(SURROGATE_COLUMN, lit(True)),
+                                                      {"strategy": "row_hash"})["columns"]
+
+
+def test_key_strategies_resolve(tmp_path):
+    path = tmp_path / "key_strategies.json"
+    path.write_text(json.dumps({"keyless": "surrogate",
+                                "sources": [{"pattern": "quakes_*.csv", "strategy": "columns", "columns": ["id"]}]}))
+    strategies = KeyStrategies(str(path), key_format="xxhash-128", run_id="run-1")
+    strategies.alias("pack-1.csv", "/raw/Quakes_2024.csv")
+    resolved = strategies.resolve("pack-1.csv")
+    assert resolved["strategy"] == "columns"
+    assert resolved["keyless"] == "surrogate"
+    assert resolved["run_id"] == "run-1"
+    assert resolved["source"] == "pack-1.csv"
+    assert strategies.resolve("people.csv")["strategy"] == "identity"
+
+
+def test_key_strategies_reject_unknown_entries(tmp_path):
+    path = tmp_path / "key_strategies.json"
+    path.write_text(json.dumps({"sources": [{"pattern": "*.csv", "strategy": "sequence"}]}))
+    with pytest.raises(ValueError):
+        KeyStrategies(str(path))
+    with pytest.raises(ValueError):
+        KeyStrategies(str(tmp_path / "missing.json"), key_format="md5")
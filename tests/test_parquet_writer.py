@@ -0,0 +1,23 @@
+import pytest
+
+pytest.importorskip("pyspark")
+
+from parquet_writer import commit_files, dataset_files, plan_commit
+
+
+def _touch(path):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_bytes(b"x")
+
+
+def test_commit_files_can_be_repeated(tmp_path):
+    staging, dataset = tmp_path / "output", tmp_path / "master"
+    _touch(staging / "ingest_date=2024-01-02" / "part-new.parquet")
+    _touch(dataset / "ingest_date=2024-01-01" / "part-old.parquet")
+    commit = plan_commit(str(staging), str(dataset), replace=True)
+
+    commit_files(commit)
+    commit_files(commit)
+
+    assert dataset_files(str(dataset)) == [str(dataset / "ingest_date=2024-01-02" / "part-new.parquet")]
+    assert not (dataset / "ingest_date=2024-01-01").exists()
@@ -0,0 +1,72 @@
+import threading
+
+import pytest
+
+pytest.importorskip("pyspark")
+
+import ingested_data
+from run_journal import RunJournal
+from run_stats import IngestionStats
+
+
+def _collect(stats: IngestionStats, timeout: float = 60) -> bool:
+    """Run stats.collect() in a thread; False if it is still blocked after timeout seconds."""
+    worker = threading.Thread(target=stats.collect, daemon=True)
+    worker.start()
+    worker.join(timeout)
+    return not worker.is_alive()
+
+
+def test_forget_drops_pending_observation(spark):
+    stats = IngestionStats("test-run")
+    df = stats.observe_source(spark.createDataFrame([("ann",)], ["name"]), "never_run.csv", "csv")
+    assert df is not None
+    stats.forget("never_run.csv")
+    assert _collect(stats)
+    assert "rows" not in stats.files["never_run.csv"]
+
+
+def test_collect_after_a_file_fails_to_stage(spark, tmp_path, monkeypatch):
+    good = tmp_path / "good.csv"
+    good.write_text("name,email\nann,ann@example.com\nbob,bob@example.com\n")
+    bad = tmp_path / "bad.csv"
+    bad.write_text("name,email\ncid,cid@example.com\n")
+
+    journal = RunJournal("test-run", root=str(tmp_path / "runs"))
+    stage = journal.stage
+
+    def stage_or_fail(spark, key, df, paths):
+        if key == str(bad):
+            raise OSError("No space left on device")
+        return stage(spark, key, df, paths)
+
+    monkeypatch.setattr(journal, "stage", stage_or_fail)
+    stats = IngestionStats("test-run")
+    results = [ingested_data._timed_process_file(spark, str(path), journal=journal, stats=stats)
+               for path in (good, bad)]
+
+    assert results[0]["df"] is not None
+    assert results[1]["df"] is None and "No space left" in results[1]["error"]
+    # The failed file's observation never completes; collect() must not wait for it
+    assert _collect(stats)
+    assert stats.files[str(good)]["rows"] == 2
+    assert stats.files[str(bad)]["ok"] is False
+
+
+def test_grouped_source_is_counted_per_file(spark, tmp_path):
+    first = tmp_path / "first file.csv"
+    first.write_text("name,email\nann,ann@example.com\nbob,bob@example.com\n")
+    second = tmp_path / "second+more.csv"
+    second.write_text("name,email\ncid,cid@example.com\n")
+    paths = [str(first), str(second)]
+
+    stats = IngestionStats("test-run")
+    df = stats.observe_source(spark.read.option("header", "true").csv(paths), "2 csv files", "csv",
+                              member_paths=paths)
+    assert df.columns == ["name", "email"]
+    df.write.mode("overwrite").parquet(str(tmp_path / "out"))
+    assert _collect(stats)
+
+    assert stats.files["2 csv files"]["rows"] == 3
+    assert stats.file_rows(str(first)) == 2
+    assert stats.file_rows(str(second)) == 1
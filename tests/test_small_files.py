@@ -0,0 +1,88 @@
+import csv
+import json
+
+from small_files import SOURCE_COLUMN, _lines, classify, pack_small_files, write_pack
+
+
+def _write(directory, name, text):
+    path = directory / name
+    path.write_bytes(text.encode("utf-8"))
+    return str(path)
+
+
+def _read_csv(path):
+    with open(path, newline="", encoding="utf-8") as f:
+        return list(csv.reader(f))
+
+
+def test_lines_split_on_newlines_only():
+    assert _lines("a,b\r\n1,x\x0cy\n\n2, z\n") == ["a,b", "1,x\x0cy", "2, z"]
+
+
+def test_classify(tmp_path):
+    assert classify(_write(tmp_path, "a.csv", "name,email\nann,a@x.io\n")) == ("csv", "name,email")
+    assert classify(_write(tmp_path, "b.jsonl", '{"a": 1}\n{"a": 2}\n')) == ("json",)
+    assert classify(_write(tmp_path, "c.json", '[{"a": 1}]\n')) is None
+    assert classify(_write(tmp_path, "d.csv", f"name,{SOURCE_COLUMN}\nann,x\n")) is None
+    assert classify(_write(tmp_path, "e.csv", "name\nann\n"), small_file_bytes=4) is None
+
+
+def test_pack_small_files_csv(tmp_path):
+    raw = tmp_path / "raw"
+    raw.mkdir()
+    paths = [_write(raw, "a.csv", "name,email\nann,a@x.io\n"),
+             _write(raw, "b.csv", 'name,email\r\n"Lee, Bo",b@x.io\r\n'),
+             _write(raw, "big.csv", "name,email\n" + "cy,c@x.io\n" * 20),
+             _write(raw, "other.csv", "id,value\n1,2\n")]
+    packs, inputs = pack_small_files(paths, {}, small_file_bytes=100, directory=str(tmp_path / "packs"))
+    assert len(packs) == 1
+    assert packs[0]["paths"] == paths[:2]
+    assert inputs == [packs[0]["path"], paths[2], paths[3]]
+    assert _read_csv(packs[0]["path"]) == [["name", "email", SOURCE_COLUMN],
+                                           ["ann", "a@x.io", "a.csv"],
+                                           ["Lee, Bo", "b@x.io", "b.csv"]]
+
+
+def test_pack_small_files_jsonl(tmp_path):
+    paths = [_write(tmp_path, "a.jsonl", '{"a": 1}\n{}\n'), _write(tmp_path, "b.jsonl", '{"a": 2}\n')]
+    packs, inputs = pack_small_files(paths, {}, directory=str(tmp_path / "packs"))
+    assert inputs == [packs[0]["path"]]
+    with open(packs[0]["path"], encoding="utf-8") as f:
+        records = [json.loads(line) for line in f]
+    assert records == [{SOURCE_COLUMN: "a.jsonl", "a": 1}, {SOURCE_COLUMN: "a.jsonl"}, {SOURCE_COLUMN: "b.jsonl", "a": 2}]
+
+
+def test_pack_id_follows_fingerprints(tmp_path):
+    paths = [_write(tmp_path, "a.jsonl", '{"a": 1}\n'), _write(tmp_path, "b.jsonl", '{"a": 2}\n')]
+    first, _ = pack_small_files(paths, {paths[0]: "x"}, directory=str(tmp_path / "packs"))
+    again, _ = pack_small_files(paths, {paths[0]: "x"}, directory=str(tmp_path / "packs"))
+    changed, _ = pack_small_files(paths, {paths[0]: "y"}, directory=str(tmp_path / "packs"))
+    assert first[0]["id"] == again[0]["id"] != changed[0]["id"]
+
+
+def test_pack_small_files_keep_apart(tmp_path):
+    paths = [_write(tmp_path, "a.jsonl", '{"a": 1}\n'), _write(tmp_path, "b.jsonl", '{"a": 2}\n')]
+    packs, inputs = pack_small_files(paths, {}, directory=str(tmp_path / "packs"), keep_apart=lambda p: p)
+    assert packs == []
+    assert inputs == paths
+
+
+def test_write_pack_rejects_multiline_and_ragged_members(tmp_path):
+    dialect = {"delimiter": ",", "quote": '"', "escape": None}
+    good = _write(tmp_path, "good.csv", "name,note\nann,hi\n")
+    multiline = _write(tmp_path, "multiline.csv", 'name,note\nbob,"two\nlines"\n')
+    ragged = _write(tmp_path, "ragged.csv", "name,note\ncy,a,b\n")
+    pack = {"path": str(tmp_path / "packs" / "pack.csv"), "format": "csv", "header": "name,note",
+            "paths": [good, multiline, ragged]}
+    assert write_pack(pack, dialect) == [multiline, ragged]
+    assert _read_csv(pack["path"]) == [["name", "note", SOURCE_COLUMN], ["ann", "hi", "good.csv"]]
+
+
+def test_write_pack_quotes_source_names(tmp_path):
+    dialect = {"delimiter": ";", "quote": "'", "escape": "\\"}
+    member = _write(tmp_path, "o'brien.csv", "name;city\nann;Oslo\n")
+    pack = {"path": str(tmp_path / "pack.csv"), "format": "csv", "header": "name;city", "paths": [member]}
+    assert write_pack(pack, dialect) == []
+    with open(pack["path"], newline="", encoding="utf-8") as f:
+        rows = list(csv.reader(f, delimiter=";", quotechar="'", escapechar="\\", doublequote=False))
+    assert rows == [["name", "city", SOURCE_COLUMN], ["ann", "Oslo", "o'brien.csv"]]
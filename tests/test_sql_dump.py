@@ -0,0 +1,61 @@
+import gzip
+
+from sql_dump import TABLE_COLUMN, iter_dump_records, iter_dump_rows, parse_create_columns, split_values
+
+DUMP = """-- MySQL dump
+/*!40101 SET NAMES utf8mb4 */;
+DROP TABLE IF EXISTS `users`;
+CREATE TABLE `users` (
+  `id` int NOT NULL,
+  `name` varchar(255) DEFAULT 'a,b',
+  `Email Address` varchar(255),
+  PRIMARY KEY (`id`),
+  KEY `idx_name` (`name`(10))
+) ENGINE=InnoDB;
+LOCK TABLES `users` WRITE;
+INSERT INTO `users` VALUES (1,'O\\'Brien','a@x.io'),(2,'it''s ),( fine',NULL);
+INSERT INTO `shop`.`orders` (`id`, `note`) VALUES (7,"semi;colon"),(8,'line\\nbreak');
+UNLOCK TABLES;
+"""
+
+
+def test_split_values():
+    assert split_values("1, 'a,b' ,NULL,\"x\"\"y\",'\\\\',  3.5 ") == ["1", "a,b", None, 'x"y', "\\", "3.5"]
+    assert split_values("'null','',null") == ["null", "", None]
+
+
+def test_parse_create_columns():
+    body = "`id` int, `price` decimal(10,2), name text, PRIMARY KEY (`id`), UNIQUE KEY `u` (`name`), `key` int"
+    assert parse_create_columns(body) == ["id", "price", "name", "key"]
+
+
+def test_iter_dump_rows():
+    rows = list(iter_dump_rows(iter([DUMP])))
+    assert rows == [
+        ("users", ["id", "name", "Email Address"], ["1", "O'Brien", "a@x.io"]),
+        ("users", ["id", "name", "Email Address"], ["2", "it's ),( fine", None]),
+        ("orders", ["id", "note"], ["7", "semi;colon"]),
+        ("orders", ["id", "note"], ["8", "line\nbreak"]),
+    ]
+
+
+def test_iter_dump_rows_across_chunk_boundaries():
+    expected = list(iter_dump_rows(iter([DUMP])))
+    for size in (1, 7, 64):
+        chunks = (DUMP[i:i + size] for i in range(0, len(DUMP), size))
+        assert list(iter_dump_rows(chunks)) == expected
+
+
+def test_iter_dump_rows_without_columns():
+    rows = list(iter_dump_rows(iter(["INSERT INTO t VALUES (1,'a');"])))
+    assert rows == [("t", ["col_1", "col_2"], ["1", "a"])]
+    rows = list(iter_dump_rows(iter(["INSERT INTO t VALUES (1,'a');"]), {"t": ["id", "name"]}))
+    assert rows == [("t", ["id", "name"], ["1", "a"])]
+
+
+def test_iter_dump_records(tmp_path):
+    path = tmp_path / "dump.sql.gz"
+    path.write_bytes(gzip.compress(DUMP.encode("utf-8")))
+    records = list(iter_dump_records(str(path), chunk_size=16, compression="gzip"))
+    assert records[1] == {"id": "2", "name": "it's ),( fine", "email_address": "", TABLE_COLUMN: "users"}
+    assert [r[TABLE_COLUMN] for r in records] == ["users", "users", "orders", "orders"]
@@ -0,0 +1,31 @@
+import io
+
+from xml_reader import iter_xml_batches, iter_xml_records
+
+
+def _records(text, record_path=None):
+    return list(iter_xml_records(io.BytesIO(text.encode("utf-8")), record_path))
+
+
+def test_children_of_the_root_are_records():
+    assert _records("<rows><row><a>1</a><b>x</b></row><row><a>2</a><a>3</a></row></rows>") == \
+        [{"a": "1", "b": "x"}, {"a": ["2", "3"]}]
+
+
+def test_record_path():
+    text = "<export><meta><v>9</v></meta><customers><customer><n>1</n></customer>" \
+           "<customer><n>2</n></customer></customers></export>"
+    assert _records(text, "export/customers/customer") == [{"n": "1"}, {"n": "2"}]
+    assert _records(text, "customer") == [{"n": "1"}, {"n": "2"}]
+
+
+def test_root_is_one_record_when_nothing_matches():
+    assert _records("<person><name>Ann</name><email>a@x.io</email></person>", "customer") == \
+        [{"name": "Ann", "email": "a@x.io"}]
+    assert _records("<person/>") == []
+
+
+def test_batches():
+    text = "<rows>" + "".join(f"<row><a>{i}</a></row>" for i in range(5)) + "</rows>"
+    batches = list(iter_xml_batches(io.BytesIO(text.encode("utf-8")), batch_size=2))
+    assert [len(batch) for batch in batches] == [2, 2, 1]